@@ -1,10 +1,16 @@
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 
-from utils import logger
+from utils import (
+    logger,
+    Esperas,
+    MonitorRede,
+    pagina_carregada,
+    url_mudou,
+    todas,
+    EsperaAdaptativa,
+)
 
-import time
 import os
 
 
@@ -23,7 +29,9 @@ class GoogleMapsAuto:
         self.url = url
         self.endereco = endereco
         self.pasta_download = pasta_download
-        self.wait = WebDriverWait(self.driver, timeout=timeout)
+        self.wait = EsperaAdaptativa(self.driver, "GOOGLE.espera", padrao=timeout)
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.rede = MonitorRede(self.driver)
 
     def _click(self, element):
         """Tenta clicar diretamente, se falhar usa JavaScript."""
@@ -37,7 +45,7 @@ class GoogleMapsAuto:
         try:
             self.driver.get(self.url)
             logger.info(f"Acessando Google Maps")
-            time.sleep(3)
+            self.esperas.ate(pagina_carregada(), teto=6, antes=3)
             return True
         except Exception as e:
             logger.error(f"Erro ao acessar o Google Maps: {e}")
@@ -65,9 +73,14 @@ class GoogleMapsAuto:
             search_button = self.wait.until(
                 EC.element_to_be_clickable((By.ID, "searchbox-searchbutton"))
             )
+            url_busca = self.driver.current_url
             self._click(search_button)
             logger.info("Clique no botão pesquisar")
-            time.sleep(5)
+            self.esperas.ate(
+                todas(url_mudou(url_busca), self.rede.ociosa(quieto=0.8)),
+                teto=8,
+                antes=5,
+            )
         except Exception as e:
             logger.error(f"Erro ao clicar no botão pesquisar: {e}")
             return
@@ -79,7 +92,7 @@ class GoogleMapsAuto:
             )
             self._click(satellite_button)
             logger.info("Visualização satélite ativada")
-            time.sleep(3)
+            self.esperas.ate(self.rede.ociosa(quieto=0.8), teto=8, antes=3)
         except Exception as e:
             logger.warning(f"Não foi possível ativar visualização satélite: {e}")
 
@@ -98,9 +111,14 @@ class GoogleMapsAuto:
             street_view_button = self.wait.until(
                 EC.element_to_be_clickable((By.CSS_SELECTOR, "button.dQDAle"))
             )
+            url_mapa = self.driver.current_url
             self._click(street_view_button)
             logger.info("Street View ativado")
-            time.sleep(5)
+            self.esperas.ate(
+                todas(url_mudou(url_mapa), self.rede.ociosa(quieto=0.8)),
+                teto=10,
+                antes=5,
+            )
         except Exception as e:
             logger.warning(f"Não foi possível clicar no Street View: {e}")
             return
@@ -24,6 +24,32 @@ from reportlab.lib import colors
 from datetime import datetime
 
 
+def classificar_anexo(arq):
+    """
+    Seção do relatório em que entra um anexo, pelo nome já normalizado
+    (`normalizar_nome`).
+
+    Retorna:
+        str: "planta", "projetos", "sisctm", "google" ou "siatu".
+    """
+    if "Planta_Basica" in arq or "alteracoes_siatu" in arq.lower():
+        return "planta"
+    if (
+        "sem_projeto" in arq.lower()
+        or "sem_alvara-baixa" in arq.lower()
+        or "certidao_baixa" in arq.lower()
+        or "alvara_construcao" in arq.lower()
+        or "projeto" in arq.lower()
+        or "prancha" in arq.lower()
+    ):
+        return "projetos"
+    if "CTM" in arq:
+        return "sisctm"
+    if "google" in arq:
+        return "google"
+    return "siatu"
+
+
 def gerar_relatorio(
     indice_cadastral,
     anexos_count=None,
@@ -218,24 +244,13 @@ def gerar_relatorio(
 
             arq = nome_norm
 
-            # Classificação dos anexos
-            if "Planta_Basica" in arq or "alteracoes_siatu" in arq.lower():
-                anexos_planta.append(arq)
-            elif (
-                "sem_projeto" in arq.lower()
-                or "sem_alvara-baixa" in arq.lower()
-                or "certidao_baixa" in arq.lower()
-                or "alvara_construcao" in arq.lower()
-                or "projeto" in arq.lower()
-                or "prancha" in arq.lower()
-            ):
-                anexos_projetos.append(arq)
-            elif "CTM" in arq:
-                anexos_sisctm.append(arq)
-            elif "google" in arq:
-                anexos_google.append(arq)
-            else:
-                anexos_siatu.append(arq)
+            {
+                "planta": anexos_planta,
+                "projetos": anexos_projetos,
+                "sisctm": anexos_sisctm,
+                "google": anexos_google,
+                "siatu": anexos_siatu,
+            }[classificar_anexo(arq)].append(arq)
 
     logger.info("Criando relatório PDF")
 
@@ -374,12 +389,19 @@ def gerar_relatorio(
             "tipo": "Tipo",
             "area_lotes": "Área do(s) lote(s)",
             "area_construida": "Área Construída",
+            "fonte": "Fonte",
         }
         dados_projeto_temp = dados_projeto if dados_projeto else {}
+        # Resultado da API do Urbano: sem os prints da pesquisa
+        if dados_projeto_temp.get("fonte"):
+            chaves_projeto.append("fonte")
 
         if dados_projeto_temp["tipo"] == "Não informado":
             gerar_tabela_secao(
                 "6. Projeto, Alvará e Baixa de Construção",
+                dados_projeto_temp,
+                [c for c in chaves_projeto if c == "fonte"],
+                nomes_legiveis_projeto,
                 anexos=anexos_projetos,
             )
 
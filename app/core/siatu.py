@@ -1,14 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from urllib.parse import urljoin
+
 import os
-import time
 import re
-
-from utils import logger
+import unicodedata
+
+from utils import (
+    logger,
+    aguardar_autenticacao,
+    Esperas,
+    dom_estavel,
+    nova_janela,
+    rastreador_downloads,
+    EsperaAdaptativa,
+    ManifestoAnexos,
+    Campo,
+    TEXTOS,
+    extrair,
+    clientes_http,
+    SessaoExpirada,
+    normalizar_nome,
+)
+from utils.config import SIATU_DOWNLOAD_HTTP, HTTP_CONEXOES_POR_HOST
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+XPATH_ANEXOS_PDF = (
+    "//table[.//b[text()='Imagens anexadas']]/preceding::table[1]//tr/td[1]/a"
+    "[contains(@onclick, 'exibeDocumento') and "
+    "contains(translate(text(), 'PDF','pdf'), '.pdf')]"
+)
+
+# Chamadas que abrem uma URL: window.open(url, ...), location = url,
+# location.href = url, location.assign(url) e location.replace(url)
+_ABRE_URL = re.compile(
+    r"(?:window\.open\s*\(|location(?:\.href)?\s*=(?!=)|location\.(?:assign|replace)\s*\()"
+)
+_CHAMADA = re.compile(r"^\s*(?:return\s+)?([A-Za-z_$][\w$]*)\s*\((.*)\)\s*;?")
+_PARAMETROS = re.compile(r"function\s*[\w$]*\s*\(([^)]*)\)")
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_$][\w$]*$")
+_NUMERO = re.compile(r"^-?\d+(?:\.\d+)?$")
+
+
+# Campos da página do imóvel, extraídos em uma única chamada ao navegador
+CAMPOS_IMOVEL = {
+    "exercicio": Campo(
+        "(//table[contains(@class,'table_item')][.//td[text()='Exercício']]//tr)[2]/td[@class='valor_campo']"
+    ),
+    "patrimonio": Campo(
+        "//td[@class='label_campo' and normalize-space(text())='Patrimônio']/following::td[@class='valor_campo'][1]"
+    ),
+    "endereco_imovel": Campo(
+        "//table[contains(@class,'table_item')][.//td[text()='Endereço do Imóvel']]//tr[2]/td[@class='valor_campo']"
+    ),
+    "areas_construidas": Campo(
+        "//table[contains(@class,'table_grid2')]//tr/td[3]", TEXTOS
+    ),
+    "matricula_registro": Campo(
+        "//table[contains(@class,'table_item')][.//td[text()='Matrícula de Registro']]//tr[2]/td[@class='valor_campo']"
+    ),
+    "cartorio": Campo(
+        "//table[contains(@class,'table_item')][.//td[text()='Cartório']]//tr[2]/td[@class='valor_campo']"
+    ),
+}
 
 
 class SiatuAuto:
@@ -29,7 +86,28 @@ class SiatuAuto:
         self.usuario = usuario
         self.senha = senha
         self.pasta_download = pasta_download
-        self.wait = WebDriverWait(self.driver, timeout=5)
+        self.wait = EsperaAdaptativa(self.driver, "SIATU.espera", padrao=5)
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.arquivos = []
+        self.downloads = rastreador_downloads(self.driver, pasta_download)
+        # Página de consulta, para voltar a ela entre ICs sem novo login
+        self.url_consulta = None
+
+    def preparar(self, pasta_download):
+        """
+        Prepara uma sessão já aberta para o próximo IC: troca a pasta de
+        downloads e zera os arquivos do IC anterior.
+        """
+        self.pasta_download = pasta_download
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.arquivos = []
+        self.downloads = rastreador_downloads(self.driver, pasta_download)
+
+    def _guardar(self, caminho):
+        """Anota um arquivo gerado por este sistema (usado pelo cache de ICs)."""
+        if caminho:
+            self.arquivos.append(caminho)
+        return caminho
 
     def _click(self, element):
         """
@@ -39,6 +117,75 @@ class SiatuAuto:
         except Exception:
             self.driver.execute_script("arguments[0].click();", element)
 
+    def _cliente_http(self):
+        """Cliente HTTP autenticado do SIATU, se o download direto estiver ativo."""
+        if not SIATU_DOWNLOAD_HTTP:
+            return None
+        return clientes_http.obter(self.driver, "SIATU")
+
+    def _resolver_url(self, elemento):
+        """
+        URL do documento aberto pelo link, ou None se não puder ser
+        resolvida. Só lê atributos e o código das funções chamadas; o
+        onclick não é executado.
+        """
+
+        def fonte_da_funcao(nome):
+            return self.driver.execute_script(
+                "var f = window[arguments[0]];"
+                "return typeof f === 'function' ? String(f) : null;",
+                nome,
+            )
+
+        try:
+            return _url_do_link(
+                elemento.get_dom_attribute("href"),
+                elemento.get_dom_attribute("onclick"),
+                self.driver.current_url,
+                fonte_da_funcao,
+            )
+        except Exception as e:
+            logger.debug("URL do link não resolvida: %s", e)
+            return None
+
+    def _baixar_http(self, itens):
+        """
+        Baixa documentos diretamente pela sessão HTTP, vários ao mesmo tempo.
+
+        Parâmetros:
+            itens (list): Tuplas (chave, url, nome do arquivo).
+
+        Retorna:
+            dict: chave -> caminho, apenas dos downloads concluídos.
+        """
+        cliente = self._cliente_http()
+        if not cliente or not itens:
+            return {}
+
+        baixados, expirou = {}, False
+        with ThreadPoolExecutor(max_workers=HTTP_CONEXOES_POR_HOST) as executor:
+            futuros = {
+                executor.submit(cliente.baixar, url, self.pasta_download, nome): chave
+                for chave, url, nome in itens
+            }
+            for futuro in as_completed(futuros):
+                try:
+                    baixados[futuros[futuro]] = futuro.result()
+                except SessaoExpirada:
+                    expirou = True
+                except Exception as e:
+                    logger.warning(
+                        "Download direto falhou (%s): %s", futuros[futuro], e
+                    )
+
+        if expirou:
+            # O navegador continua autenticado: renova os cookies do cliente
+            clientes_http.sincronizar(self.driver, "SIATU")
+        else:
+            # Cookies renovados pelo servidor nos downloads voltam ao navegador
+            cliente.devolver_ao_driver(self.driver)
+        return baixados
+
     def acessar(self):
         """
         Aceessa a página inicial do sistema Siatu.
@@ -69,6 +216,14 @@ class SiatuAuto:
             logger.error("Erro no login: %s", e)
             raise
 
+    def sessao_ativa(self):
+        """
+        Indica se a página atual já está autenticada (sessão reaproveitada).
+        """
+        return aguardar_autenticacao(
+            self.driver, logado=(By.NAME, "iframe"), formulario=(By.ID, "usuario")
+        )
+
     def navegar(self):
         """
         Inicia a navegação até a página de consulta de índice cadastral.
@@ -95,6 +250,13 @@ class SiatuAuto:
             self._click(link_consulta)
 
             self.driver.switch_to.default_content()
+            try:
+                self.wait.until(
+                    EC.presence_of_element_located((By.ID, "indiceCadastral"))
+                )
+            except TimeoutException:
+                logger.debug("Formulário de consulta ainda não carregado")
+            self.url_consulta = self.driver.current_url
             return True
         except Exception as e:
             logger.error("Erro durante a navegação: %s", e)
@@ -104,6 +266,32 @@ class SiatuAuto:
                 raise
             return False
 
+    def sessao_pronta(self):
+        """
+        Volta ao formulário de consulta de índice cadastral sem novo login:
+        pela URL guardada em `navegar` ou, se ela não abrir o formulário,
+        pelo menu. Retorna False se o servidor encerrou a sessão.
+        """
+        if not self.url_consulta:
+            return False
+        try:
+            self.driver.switch_to.default_content()
+            self.driver.get(self.url_consulta)
+            if aguardar_autenticacao(
+                self.driver,
+                logado=(By.ID, "indiceCadastral"),
+                formulario=(By.ID, "usuario"),
+                timeout=10,
+            ):
+                return True
+            if self.driver.find_elements(By.ID, "usuario"):
+                return False
+            self.acessar()
+            return self.sessao_ativa() and self.navegar()
+        except Exception as e:
+            logger.warning("Não foi possível voltar à consulta do SIATU: %s", e)
+            return False
+
     def planta_basica(self, indice_cadastral: str):
         """
         Consulta índice e obtem a planta básica resumida (PDF).
@@ -125,12 +313,9 @@ class SiatuAuto:
                 EC.presence_of_element_located((By.ID, "exercicio"))
             )
 
-            # Diminui timeout devido ao travamento do SIATU em algumas ocasiões
-            RemoteConnection.set_timeout(10)
-
             self._click(campo_exercicio)
             logger.info("Exercício clicado")
-            time.sleep(2)
+            self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
             # Clica no botão "planta básica"
             btn_planta = self.wait.until(
@@ -140,7 +325,7 @@ class SiatuAuto:
             )
             self._click(btn_planta)
             logger.info("Botão 'planta básica' clicado")
-            time.sleep(2)
+            self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
             # Links que podem existir
             links_xpaths = {
@@ -159,7 +344,7 @@ class SiatuAuto:
                     )
                     self._click(link)
                     logger.info(f"Link '{nome}' clicado")
-                    time.sleep(2)
+                    self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
                     # Após clicar no link, dispara o download
                     link_planta_resumida = self.wait.until(
@@ -171,10 +356,26 @@ class SiatuAuto:
                         )
                     )
 
+                    # Download direto, sem abrir a janela do PDF
+                    url = None
+                    if self._cliente_http():
+                        url = self._resolver_url(link_planta_resumida)
+                    if url:
+                        nome_pb = _nome_planta_basica(nome)
+                        caminho = self._baixar_http([(nome, url, nome_pb)]).get(nome)
+                        if caminho:
+                            self._guardar(caminho)
+                            logger.info(f"PB baixada via HTTP após '{nome}'")
+                            continue
+
                     janela_principal = self.driver.current_window_handle
+                    qtd_janelas = len(self.driver.window_handles)
+                    download = self.downloads.registrar()
                     self._click(link_planta_resumida)
                     logger.info(f"Download da PB disparado após '{nome}'")
-                    time.sleep(2)
+                    self.esperas.ate(nova_janela(qtd_janelas), teto=5, antes=2)
+                    # Fecha a janela só depois do PDF gravado em disco
+                    self._guardar(self.downloads.aguardar(download, timeout=10))
 
                     # Fecha qualquer janela nova aberta
                     janelas_atuais = self.driver.window_handles
@@ -184,7 +385,7 @@ class SiatuAuto:
                             self.driver.close()
 
                     self.driver.switch_to.window(janela_principal)
-                    time.sleep(2)
+                    self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
                 except TimeoutException:
                     logger.info(f"Link '{nome}' não encontrado, seguindo...")
@@ -206,10 +407,11 @@ class SiatuAuto:
     def download_anexos(self, indice_cadastral: str):
         """
         Faz o download dos arquivos da seção anexos (apenas PDFs) do Siatu.
+        Anexos já baixados em execuções anteriores (mesma linha na tabela)
+        são restaurados do armazém, sem novo download.
         """
-
-        # Normaliza timeout
-        RemoteConnection.set_timeout(120)
+        manifesto = ManifestoAnexos("SIATU", indice_cadastral)
+        completo = False
 
         try:
             logger.info(
@@ -223,33 +425,71 @@ class SiatuAuto:
             )
             self._click(link_anexos)
             logger.info("Link 'Anexos' clicado")
-            time.sleep(2)
+            self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
             # Janela principal
             janela_principal = self.driver.current_window_handle
 
             # Busca todos os PDFs na primeira tabela
-            anexos_pdf = self.driver.find_elements(
-                By.XPATH,
-                "//table[.//b[text()='Imagens anexadas']]/preceding::table[1]//tr/td[1]/a"
-                "[contains(@onclick, 'exibeDocumento') and "
-                "contains(translate(text(), 'PDF','pdf'), '.pdf')]",
-            )
+            anexos_pdf = self.driver.find_elements(By.XPATH, XPATH_ANEXOS_PDF)
 
             if not anexos_pdf:
                 logger.info("Nenhum PDF disponível para download")
+                completo = True
                 return 0
 
             logger.info("Número de PDFs encontrados inicialmente: %d", len(anexos_pdf))
             qtd_anexos = 0
 
-            for i, _ in enumerate(anexos_pdf, start=1):
+            # Primeiro passo: restaura os anexos inalterados e resolve a URL
+            # dos demais para o download direto
+            usar_http = self._cliente_http() is not None
+            pendentes, nomes_usados = {}, set()
+            for i, anexo in enumerate(anexos_pdf, start=1):
+                nome_arquivo_raw = anexo.text.strip()
+                nome_arquivo = self._sanitize_filename(nome_arquivo_raw)
+
+                # Anexo inalterado desde a última execução: restaura do armazém
+                linha = anexo.find_element(By.XPATH, "./ancestor::tr[1]")
+                assinatura = ManifestoAnexos.assinatura(
+                    linha.text, anexo.get_attribute("onclick") or ""
+                )
+                restaurado = manifesto.restaurar(assinatura, self.pasta_download)
+                if restaurado:
+                    self._guardar(restaurado)
+                    nomes_usados.add(os.path.basename(restaurado).lower())
+                    logger.info("PDF inalterado, reaproveitado: %s", nome_arquivo_raw)
+                    qtd_anexos += 1
+                    continue
+
+                url = self._resolver_url(anexo) if usar_http else None
+                pendentes[i] = (nome_arquivo_raw, assinatura, url, nome_arquivo)
+
+            # Nomes dos pendentes só depois de conhecidos todos os
+            # restaurados, para que nenhum download sobrescreva um deles
+            for i, (nome_arquivo_raw, assinatura, url, nome_arquivo) in list(
+                pendentes.items()
+            ):
+                nome_arquivo = _nome_livre(nome_arquivo, nomes_usados)
+                pendentes[i] = (nome_arquivo_raw, assinatura, url, nome_arquivo)
+
+            # Segundo passo: downloads diretos em paralelo
+            baixados = self._baixar_http(
+                [(i, url, nome) for i, (_, _, url, nome) in pendentes.items() if url]
+            )
+            for i, caminho in baixados.items():
+                nome_arquivo_raw, assinatura, _, _ = pendentes.pop(i)
+                self._guardar(caminho)
+                manifesto.registrar(assinatura, caminho)
+                logger.info("PDF baixado via HTTP: %s", nome_arquivo_raw)
+                qtd_anexos += 1
+
+            # Terceiro passo: o que não pôde ser baixado diretamente é
+            # baixado pelo clique no link
+            for i, (nome_arquivo_raw, assinatura, _, _) in pendentes.items():
                 # Refetch para evitar StaleElementReference (perda da referência dos dados)
                 anexos_pdf_refetch = self.driver.find_elements(
-                    By.XPATH,
-                    "//table[.//b[text()='Imagens anexadas']]/preceding::table[1]//tr/td[1]/a"
-                    "[contains(@onclick, 'exibeDocumento') and "
-                    "contains(translate(text(), 'PDF','pdf'), '.pdf')]",
+                    By.XPATH, XPATH_ANEXOS_PDF
                 )
 
                 if i - 1 >= len(anexos_pdf_refetch):
@@ -257,23 +497,25 @@ class SiatuAuto:
                     continue
 
                 anexo = anexos_pdf_refetch[i - 1]
-                nome_arquivo_raw = anexo.text.strip()
                 nome_arquivo = self._sanitize_filename(nome_arquivo_raw)
-                arquivo_caminho = os.path.join(self.pasta_download, nome_arquivo)
 
                 logger.info("Processando PDF %d/%d", i, len(anexos_pdf))
+
+                download = self.downloads.registrar(nome_arquivo)
                 self._click(anexo)
                 logger.info("Clique realizado no PDF")
 
                 # Espera o download concluir
-                if self._esperar_download_concluir(arquivo_caminho, timeout=120):
+                caminho = self._guardar(self.downloads.aguardar(download, timeout=120))
+                if caminho:
                     logger.info("Download concluído")
+                    manifesto.registrar(assinatura, caminho)
                 else:
                     logger.warning(
                         "Download NÃO concluído no tempo limite: %s", nome_arquivo_raw
                     )
 
-                time.sleep(1)
+                self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=1)
                 # Fecha janelas extras
                 for janela in self.driver.window_handles:
                     if janela != janela_principal:
@@ -289,6 +531,7 @@ class SiatuAuto:
                 "Download de anexos finalizado. Total de PDFs processados: %d",
                 qtd_anexos,
             )
+            completo = True
             return qtd_anexos
 
         except TimeoutException as e:
@@ -300,6 +543,8 @@ class SiatuAuto:
         except Exception as e:
             logger.error("Erro inesperado em download_anexos: %s", e)
             raise
+        finally:
+            manifesto.salvar(completo=completo)
 
     def _capturar_dados_imovel(self):
         """
@@ -309,136 +554,38 @@ class SiatuAuto:
         """
 
         logger.info("Capturando dados do imóvel na página.")
-        dados = {}
-
-        # EXERCÍCIO
-        try:
-            exercicio_elem = self.driver.find_element(
-                By.XPATH,
-                "(//table[contains(@class,'table_item')][.//td[text()='Exercício']]//tr)[2]/td[@class='valor_campo']",
-            )
-            dados["exercicio"] = exercicio_elem.text.strip()
-        except Exception:
-            dados["exercicio"] = "Não informado"
-
-        # PATRIMÔNIO
         try:
-            patrimonio_elem = self.driver.find_element(
-                By.XPATH,
-                "//td[@class='label_campo' and normalize-space(text())='Patrimônio']/following::td[@class='valor_campo'][1]",
-            )
-            dados["patrimonio"] = patrimonio_elem.text.strip()
-        except Exception:
-            dados["patrimonio"] = "Não informado"
-
-        # ENDEREÇO DO IMÓVEL
-        try:
-            endereco_elem = self.driver.find_element(
-                By.XPATH,
-                "//table[contains(@class,'table_item')][.//td[text()='Endereço do Imóvel']]//tr[2]/td[@class='valor_campo']",
-            )
-            valor = endereco_elem.text.strip()
-            dados["endereco_imovel"] = valor if valor else "Não informado"
-        except Exception:
-            dados["endereco_imovel"] = "Não informado"
+            valores = extrair(self.driver, CAMPOS_IMOVEL)
+        except Exception as e:
+            logger.warning("Falha ao extrair os dados do imóvel: %s", e)
+            valores = {nome: None for nome in CAMPOS_IMOVEL}
 
-        # CAPTURA TODOS OS VALORES DE ÁREA CONSTRUÍDA
-        try:
-            area_elems = self.driver.find_elements(
-                By.XPATH, "//table[contains(@class,'table_grid2')]//tr/td[3]"
-            )
-            areas = []
-            for elem in area_elems:
-                txt = elem.text.strip()
-                if txt:
-                    try:
-                        areas.append(float(txt.replace(",", ".")))
-                    except ValueError:
-                        pass
-
-            if areas:
-                soma_areas = sum(areas)
-                dados["area_construida"] = "{:.2f}".format(soma_areas)
-            else:
-                dados["area_construida"] = "Não informado"
-        except Exception:
+        dados = {}
+        for nome in ("exercicio", "patrimonio"):
+            valor = valores[nome]
+            dados[nome] = "Não informado" if valor is None else valor
+        for nome in ("endereco_imovel", "matricula_registro"):
+            dados[nome] = valores[nome] or "Não informado"
+        cartorio = valores["cartorio"]
+        dados["cartorio"] = (
+            cartorio if cartorio not in (None, "", "-") else "Não informado"
+        )
+
+        # Soma todos os valores de área construída
+        areas = []
+        for txt in valores["areas_construidas"] or []:
+            if txt:
+                try:
+                    areas.append(float(txt.replace(",", ".")))
+                except ValueError:
+                    pass
+        if areas:
+            dados["area_construida"] = "{:.2f}".format(sum(areas))
+        else:
             dados["area_construida"] = "Não informado"
 
-        # MATRÍCULA DE REGISTRO
-        try:
-            matricula_elem = self.driver.find_element(
-                By.XPATH,
-                "//table[contains(@class,'table_item')][.//td[text()='Matrícula de Registro']]//tr[2]/td[@class='valor_campo']",
-            )
-            valor = matricula_elem.text
-            if valor and valor.strip():
-                dados["matricula_registro"] = valor.strip()
-            else:
-                dados["matricula_registro"] = "Não informado"
-        except Exception:
-            dados["matricula_registro"] = "Não informado"
-
-        # CARTÓRIO
-        try:
-            cartorio_elem = self.driver.find_element(
-                By.XPATH,
-                "//table[contains(@class,'table_item')][.//td[text()='Cartório']]//tr[2]/td[@class='valor_campo']",
-            )
-            dados["cartorio"] = (
-                cartorio_elem.text.strip()
-                if cartorio_elem.text.strip() not in [None, "", "-"]
-                else "Não informado"
-            )
-        except Exception:
-            dados["cartorio"] = "Não informado"
-
         return dados
 
-    def _esperar_download_concluir(self, caminho_arquivo, timeout=120):
-        """
-        Espera até que o arquivo seja completamente baixado na pasta de destino.
-        Funciona mesmo que o navegador use nomes temporários diferentes.
-        """
-        pasta = os.path.dirname(caminho_arquivo)
-        nome_base = self._sanitize_filename(os.path.basename(caminho_arquivo))
-        temporarios = (".crdownload", ".part", ".tmp")
-        inicio = time.time()
-
-        # Mapeia arquivos existentes e seus tamanhos
-        try:
-            arquivos_anteriores = {
-                f: os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta)
-            }
-        except FileNotFoundError:
-            arquivos_anteriores = {}
-
-        while True:
-            try:
-                arquivos_atuais = {
-                    f: os.path.getsize(os.path.join(pasta, f))
-                    for f in os.listdir(pasta)
-                }
-            except FileNotFoundError:
-                arquivos_atuais = {}
-
-            for f, tamanho in arquivos_atuais.items():
-                if f.endswith(temporarios):
-                    continue
-                sanitized = self._sanitize_filename(f)
-                # Detecta se é novo ou mudou de tamanho
-                if (
-                    sanitized == nome_base
-                    or (f not in arquivos_anteriores)
-                    or (arquivos_anteriores.get(f) != tamanho)
-                ):
-                    return True
-
-            if time.time() - inicio > timeout:
-                logger.warning("Timeout aguardando download: %s", caminho_arquivo)
-                return False
-
-            time.sleep(0.2)
-
     def _print_alteracoes(self):
         try:
             # Clica na aba do menu "Alterações"
@@ -449,15 +596,16 @@ class SiatuAuto:
             alteracoes_link.click()
             logger.info("Aba 'Alterações' acessada com sucesso.")
 
-            time.sleep(2)
+            self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
             # Aumenta o zoom antes do print
             self.driver.execute_script("document.body.style.zoom='150%'")
-            time.sleep(1)
+            self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=1)
 
             # Print da tela
             screenshot_path = os.path.join(self.pasta_download, "alteracoes_siatu.png")
             self.driver.save_screenshot(screenshot_path)
+            self._guardar(screenshot_path)
             logger.info(f"Print da aba Alterações salvo.")
 
             # Restaura o zoom original
@@ -469,3 +617,135 @@ class SiatuAuto:
     def _sanitize_filename(self, nome):
         """Remove caracteres inválidos em nomes de arquivos no Windows."""
         return re.sub(r'[<>:"/\\|?*]', "_", nome)
+
+
+def _nome_livre(nome, usados):
+    """Evita que dois anexos com o mesmo nome se sobrescrevam na pasta."""
+    base, extensao = os.path.splitext(nome)
+    candidato, n = nome, 1
+    while candidato.lower() in usados:
+        candidato = f"{base} ({n}){extensao}"
+        n += 1
+    usados.add(candidato.lower())
+    return candidato
+
+
+def _nome_planta_basica(rotulo):
+    """
+    Nome ASCII da PB baixada por HTTP, no mesmo padrão do download pelo
+    clique ("Planta_Basica..."), que o relatório reconhece como planta.
+    """
+    sem_acento = (
+        unicodedata.normalize("NFKD", rotulo).encode("ascii", "ignore").decode()
+    )
+    return normalizar_nome(f"Planta_Basica_Resumida_{sem_acento}.pdf")
+
+
+def _dividir(expressao, separador):
+    """Divide a expressão JS no separador, fora de aspas e parênteses."""
+    partes, atual, aspas, nivel = [], "", None, 0
+    for caractere in expressao:
+        if aspas:
+            atual += caractere
+            if caractere == aspas and not atual.endswith("\\" + aspas):
+                aspas = None
+            continue
+        if caractere in "'\"":
+            aspas = caractere
+        elif caractere in "([":
+            nivel += 1
+        elif caractere in ")]":
+            nivel -= 1
+        elif caractere == separador and nivel == 0:
+            partes.append(atual.strip())
+            atual = ""
+            continue
+        atual += caractere
+    partes.append(atual.strip())
+    return partes
+
+
+def _primeiro_argumento(codigo):
+    """Trecho até a primeira vírgula, ";" ou ")" sem par, fora de aspas."""
+    aspas, nivel = None, 0
+    for posicao, caractere in enumerate(codigo):
+        if aspas:
+            if caractere == aspas and codigo[posicao - 1] != "\\":
+                aspas = None
+        elif caractere in "'\"":
+            aspas = caractere
+        elif caractere in "([":
+            nivel += 1
+        elif caractere in ")]" and nivel:
+            nivel -= 1
+        elif caractere in ",;)]" and nivel == 0:
+            return codigo[:posicao].strip()
+    return codigo.strip()
+
+
+def _valor_literal(termo, variaveis):
+    """Valor de uma string, número ou variável conhecida; None se outra coisa."""
+    if len(termo) >= 2 and termo[0] == termo[-1] and termo[0] in "'\"":
+        return termo[1:-1].replace("\\" + termo[0], termo[0])
+    if _NUMERO.match(termo):
+        return termo
+    return variaveis.get(termo)
+
+
+def _url_aberta(codigo, variaveis=None):
+    """
+    URL aberta pelo código JS, se ela for montada só com strings, números
+    e variáveis conhecidas (ex.: "pagina.do?id=" + id).
+    """
+    variaveis = variaveis or {}
+    encontrado = _ABRE_URL.search(codigo)
+    if not encontrado:
+        return None
+    argumento = _primeiro_argumento(codigo[encontrado.end() :])
+    partes = [_valor_literal(t, variaveis) for t in _dividir(argumento, "+")]
+    if not partes or any(p is None for p in partes):
+        return None
+    return "".join(partes)
+
+
+def _url_do_link(href, onclick, base, fonte_da_funcao=None):
+    """
+    URL que um link abriria, lida no href ou no onclick sem executar nada
+    na página.
+
+    O onclick pode abrir a URL diretamente (window.open/location) ou chamar
+    uma função da página com argumentos literais; nesse caso o código da
+    função é lido por `fonte_da_funcao` e os argumentos, substituídos.
+
+    Parâmetros:
+        href (str | None): Atributo href como está no HTML.
+        onclick (str | None): Atributo onclick.
+        base (str): URL da página, para resolver endereços relativos.
+        fonte_da_funcao (callable, opcional): Recebe o nome de uma função
+            global e retorna o seu código-fonte (ou None).
+
+    Retorna:
+        str | None: URL absoluta, ou None se não puder ser determinada.
+    """
+    if href and not re.match(r"\s*(#|javascript:)", href, re.IGNORECASE):
+        return urljoin(base, href.strip())
+
+    codigo = onclick or re.sub(r"^\s*javascript:", "", href or "", flags=re.I)
+    if not codigo:
+        return None
+
+    url = _url_aberta(codigo)
+    if url is None and fonte_da_funcao:
+        chamada = _CHAMADA.match(codigo)
+        if chamada:
+            nome, argumentos = chamada.groups()
+            fonte = fonte_da_funcao(nome) or ""
+            parametros = _PARAMETROS.search(fonte)
+            valores = [_valor_literal(a, {}) for a in _dividir(argumentos, ",") if a]
+            if parametros and None not in valores:
+                nomes = [n.strip() for n in parametros.group(1).split(",") if n.strip()]
+                if all(_IDENTIFICADOR.match(n) for n in nomes):
+                    url = _url_aberta(
+                        fonte[parametros.end() :], dict(zip(nomes, valores))
+                    )
+    return urljoin(base, url) if url else None
@@ -1,14 +1,36 @@
-import time
 import os
 import re
 
-from utils import logger
+from utils import (
+    logger,
+    aguardar_autenticacao,
+    Esperas,
+    dom_estavel,
+    xhr_ocioso,
+    url_mudou,
+    conteudo_atualizado,
+    todas,
+    rastreador_downloads,
+    EsperaAdaptativa,
+    Campo,
+    LINHAS,
+    extrair,
+)
 
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+# Linhas da primeira tabela do painel (resultado da pesquisa e aba
+# 'Índice Cadastral'), lidas em uma única chamada ao navegador
+CAMPOS_TABELA = {"linhas": Campo("((.//table)[1]//tbody)[1]//tr", LINHAS)}
+
+XPATH_SISCOP = "//a[@href='/sigede/siscop' and contains(text(), 'SisCop - Web')]"
+
+# Painel com a tabela de resultados da pesquisa
+PAINEL_RESULTADO = (By.ID, "generic")
+
 
 class SigedeAuto:
     """
@@ -28,7 +50,46 @@ class SigedeAuto:
         self.usuario = usuario
         self.senha = senha
         self.pasta_download = pasta_download
-        self.wait = WebDriverWait(self.driver, timeout=5)
+        self.wait = EsperaAdaptativa(self.driver, "SIGEDE.espera", padrao=5)
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.downloads = rastreador_downloads(self.driver, pasta_download)
+        self.arquivos = []
+        # Página do SisCop e tipo de pesquisa padrão (protocolo), guardados
+        # para as próximas pesquisas na mesma sessão
+        self.url_siscop = None
+        self.tipo_protocolo = None
+
+    def preparar(self, pasta_download):
+        """Prepara uma sessão já aberta para o próximo protocolo."""
+        self.pasta_download = pasta_download
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.downloads = rastreador_downloads(self.driver, pasta_download)
+        self.arquivos = []
+
+    def _guardar(self, caminho):
+        """Anota um arquivo gerado por este sistema (usado pelo cache)."""
+        if caminho:
+            self.arquivos.append(caminho)
+        return caminho
+
+    def sessao_pronta(self):
+        """
+        Reabre o SisCop numa sessão mantida entre protocolos. Retorna False
+        se o CAS pediu novo login.
+        """
+        if not self.url_siscop:
+            return False
+        try:
+            self.driver.get(self.url_siscop)
+            return aguardar_autenticacao(
+                self.driver,
+                logado=(By.ID, "searchkey"),
+                formulario=(By.ID, "username"),
+                timeout=10,
+            )
+        except Exception as e:
+            logger.warning("Não foi possível reabrir o SisCop: %s", e)
+            return False
 
     def _click(self, element):
         """
@@ -64,18 +125,31 @@ class SigedeAuto:
             ).send_keys(self.senha)
 
             # Busca pelo botão pelo value "ENTRAR"
+            url_login = self.driver.current_url
             self.wait.until(
                 EC.element_to_be_clickable((By.XPATH, "//button[@value='ENTRAR']"))
             ).click()
 
             logger.info("Login realizado com sucesso")
 
-            time.sleep(5)
+            self.esperas.ate(
+                todas(url_mudou(url_login), dom_estavel()), teto=10, antes=5
+            )
             return True
         except Exception as e:
             logger.error("Erro no login: %s", e)
             return False
 
+    def sessao_ativa(self):
+        """
+        Indica se a página atual já está autenticada (sessão reaproveitada).
+        """
+        return aguardar_autenticacao(
+            self.driver,
+            logado=(By.XPATH, XPATH_SISCOP),
+            formulario=(By.ID, "username"),
+        )
+
     def navegar(self, protocolo):
         """
         Navega até o módulo SisCop e realiza uma busca pelo protocolo fornecido.
@@ -84,44 +158,78 @@ class SigedeAuto:
             protocolo (str): Valor a ser pesquisado no SisCop.
         """
         try:
-            logger.info("Navegando para o SisCop")
-
-            # Clica no elemento SisCop
-            siscop_btn = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//a[@href='/sigede/siscop' and contains(text(), 'SisCop - Web')]",
-                    )
-                )
-            )
-            self._click(siscop_btn)
-            time.sleep(3)
-
-            # Preenche o campo de pesquisa com o protocolo
-            search_input = self.wait.until(
-                EC.presence_of_element_located((By.ID, "searchkey"))
-            )
-            search_input.clear()
-            search_input.send_keys(protocolo)
+            self._abrir_siscop()
+            self._pesquisar(protocolo, self.tipo_protocolo)
             logger.info("Protocolo informado: %s", protocolo)
-
-            # Clica no botão pesquisar
-            pesquisar_btn = self.wait.until(
-                EC.element_to_be_clickable(
-                    (By.XPATH, "//button[@onclick='pesquisar();']")
-                )
-            )
-            self._click(pesquisar_btn)
             logger.info("Pesquisa realizada com sucesso")
-
-            time.sleep(5)
             return True
 
         except (TimeoutException, NoSuchElementException) as e:
             logger.error("Erro ao navegar no SisCop: %s", e)
             return False
 
+    def _abrir_siscop(self):
+        """
+        Abre o SisCop pelo menu, a menos que o formulário de pesquisa já
+        esteja na página (pesquisas seguidas na mesma sessão).
+        """
+        if self.driver.find_elements(By.ID, "searchkey"):
+            return
+
+        logger.info("Navegando para o SisCop")
+        siscop_btn = self.wait.until(
+            EC.element_to_be_clickable((By.XPATH, XPATH_SISCOP))
+        )
+        self._click(siscop_btn)
+        self.esperas.ate(
+            EC.presence_of_element_located((By.ID, "searchkey")), teto=6, antes=3
+        )
+        self.url_siscop = self.url_siscop or self.driver.current_url
+        if self.tipo_protocolo is None:
+            tipo = Select(self.driver.find_element(By.ID, "searchKeyType"))
+            self.tipo_protocolo = tipo.first_selected_option.text.strip()
+
+    def _pesquisar(self, valor, tipo):
+        """
+        Pesquisa `valor` no SisCop e aguarda a tabela de resultados ser
+        atualizada.
+
+        Parâmetros:
+            valor (str): Protocolo ou índice cadastral.
+            tipo (str): Texto da opção de `searchKeyType` (ex. 'Índice Cadastral').
+        """
+        if tipo:
+            select_element = self.wait.until(
+                EC.element_to_be_clickable((By.ID, "searchKeyType"))
+            )
+            for option in select_element.find_elements(By.TAG_NAME, "option"):
+                if option.text.strip() == tipo:
+                    if not option.is_selected():
+                        option.click()
+                    break
+
+        search_input = self.wait.until(
+            EC.presence_of_element_located((By.ID, "searchkey"))
+        )
+        search_input.clear()
+        search_input.send_keys(valor)
+        self.esperas.ate(
+            EC.text_to_be_present_in_element_value((By.ID, "searchkey"), valor),
+            teto=2,
+            antes=1,
+        )
+
+        anterior = next(iter(self.driver.find_elements(*PAINEL_RESULTADO)), None)
+        pesquisar_btn = self.wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//button[@onclick='pesquisar();']"))
+        )
+        self._click(pesquisar_btn)
+        self.esperas.ate(
+            todas(conteudo_atualizado(PAINEL_RESULTADO, anterior), xhr_ocioso()),
+            teto=10,
+            antes=5,
+        )
+
     def verificar_tabela(self):
         """
         Verifica a tabela de resultados do SisCop.
@@ -141,33 +249,37 @@ class SigedeAuto:
                 self.pasta_download, "pesquisa_protocolo.png"
             )
             self.driver.save_screenshot(screenshot_path)
+            self._guardar(screenshot_path)
             logger.info("Print da tela salvo.")
 
-            # Procura a tabela dentro da div
-            table = panel.find_element(By.TAG_NAME, "table")
-            tbody = table.find_element(By.TAG_NAME, "tbody")
-            rows = tbody.find_elements(By.TAG_NAME, "tr")
+            # Lê a tabela inteira de uma vez
+            linhas = extrair(self.driver, CAMPOS_TABELA, raiz=panel)["linhas"]
 
-            if not rows:
+            if not linhas:
                 logger.info("Nenhum processo encontrado. Encerrando fluxo.")
                 return False
 
             # Itera pelas linhas para encontrar valor desejada na coluna Situação
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
+            for posicao, cols in enumerate(linhas, start=1):
                 if len(cols) < 5:
                     continue
 
-                situacao = cols[4].text.strip()
+                situacao = cols[4]
                 if (
                     situacao == "Executando"
                     or situacao == "Executando Siafim"
                     or situacao == "Não Iniciado"
                 ):
                     # Clica no link dentro da coluna Situação
-                    link = cols[4].find_element(By.TAG_NAME, "a")
+                    link = panel.find_element(
+                        By.XPATH,
+                        f"({CAMPOS_TABELA['linhas'].xpath})[{posicao}]/descendant::td[5]//a",
+                    )
+                    url_tabela = self.driver.current_url
                     self._click(link)
-                    time.sleep(5)
+                    self.esperas.ate(
+                        todas(url_mudou(url_tabela), dom_estavel()), teto=10, antes=5
+                    )
                     logger.info(
                         f"Processo com situação ({situacao}) encontrado e clicado"
                     )
@@ -202,21 +314,16 @@ class SigedeAuto:
             # Recupera o href para construir o nome do arquivo esperado
             href = link.get_attribute("href")
             nome_arquivo = os.path.basename(href) + ".pdf"
-            caminho_arquivo = os.path.join(self.pasta_download, nome_arquivo)
 
-            # Clica no link para iniciar o download
+            # Registra o download esperado e clica no link para iniciá-lo
+            download = self.downloads.registrar(nome_arquivo)
             self._click(link)
 
             # Aguarda o download ser concluído
-            if self._esperar_download_concluir(caminho_arquivo):
+            caminho_arquivo = self._guardar(self.downloads.aguardar(download))
+            if caminho_arquivo:
                 logger.info("Download concluído")
-                return caminho_arquivo
-            else:
-                logger.warning(
-                    "Download não foi concluído dentro do tempo limite: %s",
-                    caminho_arquivo,
-                )
-                return None
+            return caminho_arquivo
 
         except Exception as e:
             logger.error("Erro ao tentar baixar o Inteiro Teor: %s", e)
@@ -239,23 +346,18 @@ class SigedeAuto:
                 )
             )
             self._click(aba)
-            time.sleep(1)
+            self.esperas.ate(
+                EC.visibility_of_element_located((By.ID, "indiceCadastral")),
+                teto=3,
+                antes=1,
+            )
 
             # Localiza a tabela dentro da aba
             tab_panel = self.wait.until(
                 EC.presence_of_element_located((By.ID, "indiceCadastral"))
             )
-            table = tab_panel.find_element(By.TAG_NAME, "table")
-            tbody = table.find_element(By.TAG_NAME, "tbody")
-            rows = tbody.find_elements(By.TAG_NAME, "tr")
-
-            indices = []
-            for row in rows:
-                cols = row.find_elements(By.TAG_NAME, "td")
-                if cols:
-                    indice = cols[0].text.strip()
-                    if indice:
-                        indices.append(indice)
+            linhas = extrair(self.driver, CAMPOS_TABELA, raiz=tab_panel)["linhas"]
+            indices = [cols[0] for cols in linhas if cols and cols[0]]
 
             logger.info("Índices capturados: %s", indices)
             return indices
@@ -275,20 +377,6 @@ class SigedeAuto:
                     f"Buscando índice: {indice} no Sigede (Zona, Quadra e Lote)"
                 )
 
-                # Clica no elemento SisCop
-                siscop_btn = self.wait.until(
-                    EC.element_to_be_clickable(
-                        (
-                            By.XPATH,
-                            "//a[@href='/sigede/siscop' and contains(text(), 'SisCop - Web')]",
-                        )
-                    )
-                )
-                self._click(siscop_btn)
-                logger.info("Acessando SisCop")
-
-                time.sleep(3)
-
                 # Formata o índice
                 indice = (
                     indice.strip().replace("-", "").replace(".", "").replace("/", "")
@@ -299,43 +387,16 @@ class SigedeAuto:
                 indice_formatado = indice[0:11]
                 logger.info("Índice formatado para pesquisa: %s", indice_formatado)
 
-                # Seleciona a opção 'Índice Cadastral' no select
-                select_element = self.wait.until(
-                    EC.element_to_be_clickable((By.ID, "searchKeyType"))
-                )
-
-                logger.info("Selecionando opção 'Índice Cadastral' para pesquisa")
-                for option in select_element.find_elements(By.TAG_NAME, "option"):
-                    if option.text.strip() == "Índice Cadastral":
-                        option.click()
-                        break
-
-                # Insere o índice no campo de pesquisa
-                logger.info("Inserindo índice no campo de pesquisa")
-                search_input = self.wait.until(
-                    EC.presence_of_element_located((By.ID, "searchkey"))
-                )
-                search_input.clear()
-                search_input.send_keys(indice_formatado)
-
-                time.sleep(1)
-
-                # Clica no botão pesquisar
-                logger.info("Clicando no botão pesquisar")
-                pesquisar_btn = self.wait.until(
-                    EC.element_to_be_clickable(
-                        (By.XPATH, "//button[@onclick='pesquisar();']")
-                    )
-                )
-                self._click(pesquisar_btn)
-
-                time.sleep(2)
+                # O formulário continua na página entre um índice e outro
+                self._abrir_siscop()
+                self._pesquisar(indice_formatado, "Índice Cadastral")
 
                 # Salva print da tela
                 screenshot_path = os.path.join(
                     self.pasta_download, f"pesquisa_indice_{indice}.png"
                 )
                 self.driver.save_screenshot(screenshot_path)
+                self._guardar(screenshot_path)
                 logger.info("Print da tela salvo")
 
             return True
@@ -344,51 +405,6 @@ class SigedeAuto:
             logger.error("Erro ao pesquisar índice cadastral: %s", e)
             return False
 
-    def _esperar_download_concluir(self, caminho_arquivo, timeout=120):
-        """
-        Espera até que o arquivo seja completamente baixado na pasta de destino.
-        Funciona mesmo que o navegador use nomes temporários diferentes.
-        """
-        pasta = os.path.dirname(caminho_arquivo)
-        nome_base = self._sanitize_filename(os.path.basename(caminho_arquivo))
-        temporarios = (".crdownload", ".part", ".tmp")
-        inicio = time.time()
-
-        # Mapeia arquivos existentes e seus tamanhos
-        try:
-            arquivos_anteriores = {
-                f: os.path.getsize(os.path.join(pasta, f)) for f in os.listdir(pasta)
-            }
-        except FileNotFoundError:
-            arquivos_anteriores = {}
-
-        while True:
-            try:
-                arquivos_atuais = {
-                    f: os.path.getsize(os.path.join(pasta, f))
-                    for f in os.listdir(pasta)
-                }
-            except FileNotFoundError:
-                arquivos_atuais = {}
-
-            for f, tamanho in arquivos_atuais.items():
-                if f.endswith(temporarios):
-                    continue
-                sanitized = self._sanitize_filename(f)
-                # Detecta se é novo ou mudou de tamanho
-                if (
-                    sanitized == nome_base
-                    or (f not in arquivos_anteriores)
-                    or (arquivos_anteriores.get(f) != tamanho)
-                ):
-                    return True
-
-            if time.time() - inicio > timeout:
-                logger.warning("Timeout aguardando download: %s", caminho_arquivo)
-                return False
-
-            time.sleep(0.2)
-
     def _sanitize_filename(self, nome):
         """Remove caracteres inválidos em nomes de arquivos no Windows."""
         return re.sub(r'[<>:"/\\|?*]', "_", nome)
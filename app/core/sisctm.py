@@ -1,8 +1,24 @@
 import traceback
-import time
 import os
-
-from utils import logger
+from urllib.parse import urlparse
+
+from utils import (
+    logger,
+    aguardar_autenticacao,
+    Esperas,
+    pagina_carregada,
+    dom_estavel,
+    xhr_ocioso,
+    url_mudou,
+    todas,
+    MonitorRede,
+    EsperaAdaptativa,
+    Campo,
+    extrair,
+    clientes_http,
+    SessaoExpirada,
+)
+from .sisctm_wfs import servico_feicoes
 
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
@@ -16,6 +32,40 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+# Campos do endereço na tabela da camada IPTU CTM GEO
+CAMPOS_ENDERECO = {
+    "tipo_logradouro": Campo(".//table//tr[24]/td[2]"),
+    "nome_logradouro": Campo(".//table//tr[25]/td[2]"),
+    "numero_imovel": Campo(".//table//tr[26]/td[2]"),
+    "complemento": Campo(".//table//tr[27]/td[2]"),
+    "cep": Campo(".//table//tr[28]/td[2]"),
+}
+
+# Campos das camadas do painel lateral, extraídos em uma única chamada
+# ao navegador (XPaths relativos ao item da camada)
+CAMPOS_IPTU_CTM_GEO = {
+    "iptu_ctm_geo_area": Campo(".//table//tr[td[contains(text(),'ÁREA')]]/td[2]"),
+    "iptu_ctm_geo_area_terreno": Campo(
+        ".//table//tr[td[contains(text(),'AREA_TERRENO')]]/td[2]"
+    ),
+    **CAMPOS_ENDERECO,
+}
+
+CAMPOS_LOTE_CP = {
+    "lote_cp_ativo_area_informada": Campo("((.//table)[1]//tr)[6]/td[2]"),
+}
+
+
+def _montar_endereco(valores):
+    """Endereço no formato desejado (padrão Google, sem formatar CEP)."""
+    valores = {chave: valores.get(chave) or "" for chave in CAMPOS_ENDERECO}
+    valores["numero_imovel"] = valores["numero_imovel"].replace(".", "")
+    endereco = f"{valores['tipo_logradouro']} {valores['nome_logradouro']}, {valores['numero_imovel']}"
+    if valores["complemento"]:
+        endereco += f" {valores['complemento']}"
+    endereco += f" - Belo Horizonte - MG, {valores['cep']}"
+    return endereco
+
 
 class SisctmAuto:
     """
@@ -45,7 +95,23 @@ class SisctmAuto:
         self.usuario = usuario
         self.senha = senha
         self.pasta_download = pasta_download
-        self.wait = WebDriverWait(self.driver, timeout=timeout)
+        self.wait = EsperaAdaptativa(self.driver, "SISCTM.espera", padrao=timeout)
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.arquivos = []
+        self.rede = MonitorRede(self.driver)
+        # Valores brutos do painel lateral (confirmam os atributos do WFS)
+        self.valores_painel = {}
+        # Estado do mapa mantido entre ICs de uma sessão quente
+        self.camadas_ativas = False
+        self.filtro_criado = False
+        self.navegado = False
+        self.etapa = None
+
+    def _guardar(self, caminho):
+        """Anota um arquivo gerado por este sistema (usado pelo cache de ICs)."""
+        if caminho:
+            self.arquivos.append(caminho)
+        return caminho
 
     def _click(self, element):
         """Tenta clicar diretamente, se falhar usa JavaScript."""
@@ -54,13 +120,31 @@ class SisctmAuto:
         except Exception:
             self.driver.execute_script("arguments[0].click();", element)
 
+    def acessar(self) -> bool:
+        """Abre o mapa do SISCTM (ou o login do Keycloak, sem sessão)."""
+        try:
+            logger.info("Acessando o sistema 3: SISCTM")
+            self.driver.get(self.url)
+            return True
+        except Exception as e:
+            logger.error("Erro ao acessar o SISCTM: %s", e)
+            return False
+
+    def sessao_ativa(self) -> bool:
+        """Indica se a página atual já está autenticada (sessão reaproveitada)."""
+        return aguardar_autenticacao(
+            self.driver,
+            logado=(By.ID, "olmap"),
+            formulario=(By.ID, "kc-form-servidor-login"),
+        )
+
     def login(self) -> bool:
         """Realiza login no Keycloak PBH em páginas Vue.js."""
         try:
             logger.info("Iniciando login no SISCTM")
             self.driver.get(self.url)
 
-            time.sleep(3)
+            self.esperas.ate(pagina_carregada(), teto=10, antes=3)
 
             # Espera o formulário completo aparecer
             self.wait.until(
@@ -87,10 +171,19 @@ class SisctmAuto:
 
             # Clica no botão via JS
             btn_login = self.driver.find_element(By.ID, "kc-login")
+            url_login = self.driver.current_url
             self.driver.execute_script("arguments[0].click();", btn_login)
             logger.info("Login realizado com sucesso")
 
-            time.sleep(10)
+            self.esperas.ate(
+                todas(
+                    url_mudou(url_login),
+                    EC.presence_of_element_located((By.ID, "olmap")),
+                    xhr_ocioso(),
+                ),
+                teto=20,
+                antes=10,
+            )
 
             return True
 
@@ -98,190 +191,269 @@ class SisctmAuto:
             logger.error("Erro no login do Keycloak PBH: %s", e)
             return False
 
-    def ativar_camadas(self, indice_cadastral) -> bool:
-        """Navega pelo menu do sistema Sisctm PBH."""
-        etapa = "início"
+    def preparar(self, pasta_download):
+        """
+        Prepara uma sessão já aberta para o próximo IC: troca a pasta de
+        downloads e zera os arquivos e valores do IC anterior. Login e
+        camadas configuradas são mantidos.
+        """
+        self.pasta_download = pasta_download
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.arquivos = []
+        self.valores_painel = {}
+
+    def sessao_pronta(self) -> bool:
+        """Indica se o mapa continua aberto e logado (sem tela do Keycloak)."""
+        try:
+            return bool(
+                self.driver.find_elements(By.ID, "olmap")
+                and not self.driver.find_elements(By.ID, "kc-form-servidor-login")
+            )
+        except WebDriverException:
+            return False
+
+    def ativar_camadas(self, indice_cadastral, prints=True) -> bool:
+        """
+        Navega pelo menu do sistema Sisctm PBH.
+
+        Na primeira chamada de uma sessão, ativa as camadas; nas seguintes,
+        apenas troca o valor do filtro `_INDICE_CADASTRAL`. Se a troca
+        falhar, o mapa é recarregado e as camadas, ativadas de novo.
+
+        Parâmetros:
+            indice_cadastral (str): Índice filtrado na camada IPTU CTM GEO.
+            prints (bool): Captura os prints aéreos ao final.
+        """
+        if self.camadas_ativas:
+            if self._navegar(indice_cadastral, prints):
+                return True
+            logger.warning("Estado do mapa perdido, recarregando o SISCTM")
+            if not self.recarregar():
+                return False
+        elif self.navegado:
+            # Falha anterior deixou o mapa em estado desconhecido
+            if not self.recarregar():
+                return False
+        return self._navegar(indice_cadastral, prints)
+
+    def recarregar(self) -> bool:
+        """Reabre o mapa, descartando camadas e filtro da sessão."""
+        self.camadas_ativas = False
+        self.filtro_criado = False
+        self.navegado = False
+        return self.acessar() and self.sessao_ativa()
+
+    def _navegar(self, indice_cadastral, prints):
+        self.etapa = "início"
+        self.navegado = True
         try:
             logger.info("Iniciando navegação pelo sistema SISCTM PBH")
+            if not self.camadas_ativas:
+                self._configurar_camadas()
+                self.camadas_ativas = True
 
-            # Expande o menu
-            etapa = "expandir menu"
-            logger.debug("Tentando localizar botão de menu (expand_more)...")
-            btn_menu = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//i[@class='q-icon on-right notranslate material-icons' and text()='expand_more']",
-                    )
-                )
+            self._filtrar(indice_cadastral)
+
+            if prints:
+                self.etapa = "prints aéreos"
+                self._prints_aereo()
+                logger.info("Prints aéreos capturados")
+
+            logger.info("Navegação concluída com sucesso")
+            return True
+
+        except Exception as e:
+            logger.error(
+                "Erro na etapa '%s': %s\n%s",
+                self.etapa,
+                repr(e),
+                traceback.format_exc(),
             )
-            self._click(btn_menu)
-            logger.info("Menu expandido com sucesso")
-            time.sleep(1)
-
-            # Clica no item Fazenda
-            etapa = "selecionar Fazenda"
-            logger.debug("Localizando item 'Fazenda'...")
-            item_fazenda = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//div[contains(@class,'q-item__section') and contains(text(),'Fazenda')]",
-                    )
+            return False
+
+    def _configurar_camadas(self):
+        """Ativa as camadas usadas na triagem (feito uma vez por sessão)."""
+        # Expande o menu
+        self.etapa = "expandir menu"
+        logger.debug("Tentando localizar botão de menu (expand_more)...")
+        btn_menu = self.wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//i[@class='q-icon on-right notranslate material-icons' and text()='expand_more']",
                 )
             )
-            self._click(item_fazenda)
-            logger.info("Item 'Fazenda' marcado")
-            time.sleep(0.5)
-
-            # Desativa IDE-BHGeo
-            etapa = "desativar IDE-BHGeo"
-            logger.debug("Localizando item 'IDE-BHGeo'...")
-            item_idebhgeo = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//div[contains(@class,'q-item__section') and contains(text(),'IDE-BHGeo')]",
-                    )
+        )
+        self._click(btn_menu)
+        logger.info("Menu expandido com sucesso")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=3, antes=1)
+
+        # Clica no item Fazenda
+        self.etapa = "selecionar Fazenda"
+        logger.debug("Localizando item 'Fazenda'...")
+        item_fazenda = self.wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//div[contains(@class,'q-item__section') and contains(text(),'Fazenda')]",
                 )
             )
-            self._click(item_idebhgeo)
-            logger.info("Item 'IDE-BHGeo' desativado")
-            time.sleep(0.5)
-
-            # Abre camadas
-            etapa = "abrir camadas"
-            logger.debug("Localizando botão de camadas...")
-            btn_camadas = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//i[@class='q-icon notranslate material-icons' and text()='layers']",
-                    )
+        )
+        self._click(item_fazenda)
+        logger.info("Item 'Fazenda' marcado")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        # Desativa IDE-BHGeo
+        self.etapa = "desativar IDE-BHGeo"
+        logger.debug("Localizando item 'IDE-BHGeo'...")
+        item_idebhgeo = self.wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//div[contains(@class,'q-item__section') and contains(text(),'IDE-BHGeo')]",
                 )
             )
-            self._click(btn_camadas)
-            logger.info("Menu de camadas aberto")
-            time.sleep(1)
-
-            # CAMADA ENDEREÇO
-            etapa = "selecionar Endereço"
-            logger.debug("Localizando item 'Endereço'...")
-            menu_endereco = self.wait.until(
-                EC.presence_of_element_located((By.XPATH, "//div[text()='Endereço']"))
-            )
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", menu_endereco
-            )
-            self._click(menu_endereco)
-            logger.info("Menu 'Endereço' selecionado")
-            time.sleep(0.5)
-
-            etapa = "marcar Endereço PBH"
-            logger.debug("Localizando container da camada 'Endereço'...")
-            container_endereco = self.wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[text()='Endereço']/ancestor::div[contains(@class,'q-tree__node')]",
-                    )
+        )
+        self._click(item_idebhgeo)
+        logger.info("Item 'IDE-BHGeo' desativado")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        # Abre camadas
+        self.etapa = "abrir camadas"
+        logger.debug("Localizando botão de camadas...")
+        btn_camadas = self.wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//i[@class='q-icon notranslate material-icons' and text()='layers']",
                 )
             )
-            logger.debug("Localizando checkbox 'Endereço PBH'...")
-            endereco_pbh_checkbox = container_endereco.find_element(
-                By.XPATH,
-                ".//div[contains(@class,'q-tree__node--child')][.//img[contains(@src,'FazendaEnderecoPBH')]]//div[contains(@class,'q-checkbox')]",
-            )
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", endereco_pbh_checkbox
-            )
-            self._click(endereco_pbh_checkbox)
-            logger.info("Camada 'Endereço PBH' marcada")
-            time.sleep(0.5)
-
-            # CAMADA PARCELAMENTO DO SOLO
-            etapa = "selecionar Parcelamento do Solo"
-            logger.debug("Localizando item 'Parcelamento do Solo'...")
-            menu_parcelamento = self.wait.until(
-                EC.presence_of_element_located(
-                    (By.XPATH, "//div[text()='Parcelamento do Solo']")
+        )
+        self._click(btn_camadas)
+        logger.info("Menu de camadas aberto")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=3, antes=1)
+
+        # CAMADA ENDEREÇO
+        self.etapa = "selecionar Endereço"
+        logger.debug("Localizando item 'Endereço'...")
+        menu_endereco = self.wait.until(
+            EC.presence_of_element_located((By.XPATH, "//div[text()='Endereço']"))
+        )
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block: 'center'});", menu_endereco
+        )
+        self._click(menu_endereco)
+        logger.info("Menu 'Endereço' selecionado")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        self.etapa = "marcar Endereço PBH"
+        logger.debug("Localizando container da camada 'Endereço'...")
+        container_endereco = self.wait.until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//div[text()='Endereço']/ancestor::div[contains(@class,'q-tree__node')]",
                 )
             )
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", menu_parcelamento
+        )
+        logger.debug("Localizando checkbox 'Endereço PBH'...")
+        endereco_pbh_checkbox = container_endereco.find_element(
+            By.XPATH,
+            ".//div[contains(@class,'q-tree__node--child')][.//img[contains(@src,'FazendaEnderecoPBH')]]//div[contains(@class,'q-checkbox')]",
+        )
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block: 'center'});", endereco_pbh_checkbox
+        )
+        self._click(endereco_pbh_checkbox)
+        logger.info("Camada 'Endereço PBH' marcada")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        # CAMADA PARCELAMENTO DO SOLO
+        self.etapa = "selecionar Parcelamento do Solo"
+        logger.debug("Localizando item 'Parcelamento do Solo'...")
+        menu_parcelamento = self.wait.until(
+            EC.presence_of_element_located(
+                (By.XPATH, "//div[text()='Parcelamento do Solo']")
             )
-            self._click(menu_parcelamento)
-            logger.info("Menu 'Parcelamento do Solo' selecionado")
-            time.sleep(0.5)
-
-            etapa = "marcar Lote CP - ATIVO"
-            logger.debug("Localizando container da camada 'Parcelamento do Solo'...")
-            container_parcelamento = self.wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[text()='Parcelamento do Solo']/ancestor::div[contains(@class,'q-tree__node')]",
-                    )
+        )
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block: 'center'});", menu_parcelamento
+        )
+        self._click(menu_parcelamento)
+        logger.info("Menu 'Parcelamento do Solo' selecionado")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        self.etapa = "marcar Lote CP - ATIVO"
+        logger.debug("Localizando container da camada 'Parcelamento do Solo'...")
+        container_parcelamento = self.wait.until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//div[text()='Parcelamento do Solo']/ancestor::div[contains(@class,'q-tree__node')]",
                 )
             )
-            logger.debug("Localizando checkbox 'Lote CP - ATIVO'...")
-            lote_cp_checkbox = container_parcelamento.find_element(
-                By.XPATH,
-                ".//div[contains(@class,'q-tree__node--child')][.//img[contains(@src,'FazendaLoteCP')]]//div[contains(@class,'q-checkbox')]",
-            )
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", lote_cp_checkbox
-            )
-            self._click(lote_cp_checkbox)
-            logger.info("Camada 'Lote CP - ATIVO' marcada")
-            time.sleep(0.5)
-
-            # CAMADA TRIBUTÁRIO E FILTRO
-            etapa = "selecionar Tributário"
-            logger.debug("Localizando item 'Tributário'...")
-            camada_tributario = self.wait.until(
-                EC.presence_of_element_located((By.XPATH, "//div[text()='Tributário']"))
-            )
-            self.driver.execute_script(
-                "arguments[0].scrollIntoView({block: 'center'});", camada_tributario
-            )
-            self._click(camada_tributario)
-            logger.info("Camada 'Tributário' selecionada")
-            time.sleep(0.5)
-
-            etapa = "abrir menu CTM GEO"
-            logger.debug("Localizando container da camada 'Tributário'...")
-            camada_tributario_container = self.wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        "//div[text()='Tributário']/ancestor::div[contains(@class,'q-tree__node')]",
-                    )
+        )
+        logger.debug("Localizando checkbox 'Lote CP - ATIVO'...")
+        lote_cp_checkbox = container_parcelamento.find_element(
+            By.XPATH,
+            ".//div[contains(@class,'q-tree__node--child')][.//img[contains(@src,'FazendaLoteCP')]]//div[contains(@class,'q-checkbox')]",
+        )
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block: 'center'});", lote_cp_checkbox
+        )
+        self._click(lote_cp_checkbox)
+        logger.info("Camada 'Lote CP - ATIVO' marcada")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+        # CAMADA TRIBUTÁRIO
+        self.etapa = "selecionar Tributário"
+        logger.debug("Localizando item 'Tributário'...")
+        camada_tributario = self.wait.until(
+            EC.presence_of_element_located((By.XPATH, "//div[text()='Tributário']"))
+        )
+        self.driver.execute_script(
+            "arguments[0].scrollIntoView({block: 'center'});", camada_tributario
+        )
+        self._click(camada_tributario)
+        logger.info("Camada 'Tributário' selecionada")
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=2, antes=0.5)
+
+    def _filtrar(self, indice_cadastral):
+        """Aplica o filtro do índice na camada IPTU CTM GEO e clica no lote."""
+        self.etapa = "abrir menu CTM GEO"
+        logger.debug("Localizando container da camada 'Tributário'...")
+        camada_tributario_container = self.wait.until(
+            EC.presence_of_element_located(
+                (
+                    By.XPATH,
+                    "//div[text()='Tributário']/ancestor::div[contains(@class,'q-tree__node')]",
                 )
             )
-            more_vert_icons = camada_tributario_container.find_elements(
-                By.XPATH,
-                ".//i[@class='q-icon notranslate material-icons' and text()='more_vert']",
+        )
+        more_vert_icons = camada_tributario_container.find_elements(
+            By.XPATH,
+            ".//i[@class='q-icon notranslate material-icons' and text()='more_vert']",
+        )
+        if len(more_vert_icons) >= 4:
+            self._click(more_vert_icons[3])
+            logger.info("Menu do item 'IPTU CTM GEO' aberto")
+        else:
+            raise NoSuchElementException(
+                "Não foi encontrado o quarto ícone 'more_vert' dentro da camada Tributário"
             )
-            if len(more_vert_icons) >= 4:
-                self._click(more_vert_icons[3])
-                logger.info("Menu do item 'IPTU CTM GEO' aberto")
-            else:
-                logger.error(
-                    "Não foi encontrado o quarto ícone 'more_vert' dentro da camada Tributário"
-                )
-                return False
 
-            # Filtro
-            etapa = "abrir filtro"
-            logger.debug("Localizando botão 'Filtro'...")
-            btn_filtro = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//span[text()='Filtro']"))
-            )
-            self._click(btn_filtro)
-            logger.info("Filtro aberto")
+        # Filtro
+        self.etapa = "abrir filtro"
+        logger.debug("Localizando botão 'Filtro'...")
+        btn_filtro = self.wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//span[text()='Filtro']"))
+        )
+        self._click(btn_filtro)
+        logger.info("Filtro aberto")
 
-            etapa = "selecionar opção de fazer filtro"
+        # A condição _INDICE_CADASTRAL é criada uma vez por sessão
+        if not self.filtro_criado:
+            self.etapa = "selecionar opção de fazer filtro"
             btn_fazer_filtro = self.wait.until(
                 EC.element_to_be_clickable(
                     (By.XPATH, "//span/i[contains(@class,'mdi-filter-plus')]")
@@ -290,7 +462,7 @@ class SisctmAuto:
             self._click(btn_fazer_filtro)
             logger.info("Opção de fazer filtro selecionada")
 
-            etapa = "selecionar _INDICE_CADASTRAL"
+            self.etapa = "selecionar _INDICE_CADASTRAL"
             item_indice = self.wait.until(
                 EC.element_to_be_clickable(
                     (
@@ -302,56 +474,46 @@ class SisctmAuto:
             self._click(item_indice)
             logger.info("Item '_INDICE_CADASTRAL' selecionado")
 
-            etapa = "inserir índice cadastral"
-            campo_busca = self.wait.until(
-                EC.element_to_be_clickable(
-                    (
-                        By.XPATH,
-                        "//input[@type='search' and contains(@aria-label,'Valor')]",
-                    )
+        self.etapa = "inserir índice cadastral"
+        campo_busca = self.wait.until(
+            EC.element_to_be_clickable(
+                (
+                    By.XPATH,
+                    "//input[@type='search' and contains(@aria-label,'Valor')]",
                 )
             )
-            campo_busca.clear()
-            campo_busca.send_keys(indice_cadastral)
-            logger.info("Índice cadastral inserido: %s", indice_cadastral)
-
-            etapa = "aplicar filtro"
-            btn_aplicar = self.wait.until(
-                EC.element_to_be_clickable((By.XPATH, "//span[text()='Aplicar']"))
-            )
-            self._click(btn_aplicar)
-            logger.info("Filtro aplicado com sucesso")
-            time.sleep(5)
-
-            etapa = "fechar janela filtro"
-            self.driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
-            logger.info("Janela do filtro fechada")
-            time.sleep(5)
-
-            etapa = "clique centro do mapa"
-            self._clique_centro_mapa()
-
-            etapa = "prints aéreos"
-            self._prints_aereo()
-            logger.info("Prints aéreos capturados")
+        )
+        # Com o filtro já criado, só o valor é substituído
+        campo_busca.send_keys(Keys.CONTROL, "a")
+        campo_busca.send_keys(indice_cadastral)
+        logger.info("Índice cadastral inserido: %s", indice_cadastral)
+
+        self.etapa = "aplicar filtro"
+        btn_aplicar = self.wait.until(
+            EC.element_to_be_clickable((By.XPATH, "//span[text()='Aplicar']"))
+        )
+        self._click(btn_aplicar)
+        self.filtro_criado = True
+        logger.info("Filtro aplicado com sucesso")
+        self.esperas.ate(xhr_ocioso(), teto=10, antes=5)
 
-            logger.info("Navegação concluída com sucesso")
-            return True
+        self.etapa = "fechar janela filtro"
+        self.driver.find_element(By.TAG_NAME, "body").send_keys(Keys.ESCAPE)
+        logger.info("Janela do filtro fechada")
+        self.esperas.ate(todas(xhr_ocioso(), dom_estavel()), teto=10, antes=5)
 
-        except Exception as e:
-            logger.error(
-                "Erro na etapa '%s': %s\n%s", etapa, repr(e), traceback.format_exc()
-            )
-            return False
+        self.etapa = "clique centro do mapa"
+        self._clique_centro_mapa()
 
     def _prints_aereo(self) -> None:
         """
         Realiza captura de tela.
         """
-        # Print AEREO CTM
-        time.sleep(15)
+        # Print AEREO CTM, assim que os tiles terminam de carregar
+        self.esperas.ate(self.rede.ociosa(quieto=1), teto=20, antes=15)
         screenshot_path = os.path.join(self.pasta_download, "CTM_Aereo.png")
         self.driver.save_screenshot(screenshot_path)
+        self._guardar(screenshot_path)
         logger.info("Print da tela salvo")
 
         # Clica no elemento "BHMap"
@@ -365,7 +527,7 @@ class SisctmAuto:
         )
         self._click(elemento_bhmap)
         logger.info("Elemento 'BHMap' clicado")
-        time.sleep(2)
+        self.esperas.ate(dom_estavel(quieto=0.3), teto=4, antes=2)
 
         # Seleciona a ortofoto 2015
         elemento_ortofoto = self.wait.until(
@@ -378,14 +540,39 @@ class SisctmAuto:
         )
         self._click(elemento_ortofoto)
         logger.info("Ortofoto selecionada")
-        time.sleep(10)
+        self.esperas.ate(self.rede.ociosa(quieto=1), teto=15, antes=10)
 
         # Print AEREO ORTO
         screenshot_path_orto = os.path.join(self.pasta_download, "CTM_Orto.png")
         self.driver.save_screenshot(screenshot_path_orto)
+        self._guardar(screenshot_path_orto)
         logger.info("Print da tela salvo")
 
-        return
+        self._restaurar_mapa_base()
+
+    def _restaurar_mapa_base(self):
+        """
+        Volta ao mapa base BHMap (caminho inverso da troca para a ortofoto),
+        deixando o mapa pronto para o próximo IC da sessão. Se falhar, o
+        mapa é recarregado no próximo IC.
+        """
+        try:
+            for titulo in ("Ortofoto 2015", "BHMap"):
+                elemento = self.wait.until(
+                    EC.element_to_be_clickable(
+                        (
+                            By.XPATH,
+                            "//div[@class='q-img__content absolute-full']"
+                            f"//div[contains(@class,'ellipsis') and text()='{titulo}']",
+                        )
+                    )
+                )
+                self._click(elemento)
+                self.esperas.ate(dom_estavel(quieto=0.3), teto=4, antes=2)
+            logger.info("Mapa base BHMap restaurado")
+        except Exception as e:
+            logger.warning(f"Não foi possível restaurar o mapa base: {e}")
+            self.camadas_ativas = False
 
     def _clique_centro_mapa(self):
         """
@@ -405,7 +592,7 @@ class SisctmAuto:
             action.move_to_element(viewport).click().perform()
             logger.info("Clique no centro do mapa realizado")
 
-            time.sleep(5)
+            self.esperas.ate(todas(xhr_ocioso(), dom_estavel()), teto=10, antes=5)
 
         except NoSuchElementException as e:
             logger.error(f"Elemento do mapa não encontrado: {e}")
@@ -443,7 +630,7 @@ class SisctmAuto:
                             lambda x: x.get_attribute("aria-expanded") == "true"
                         )
                         logger.info(f"{nome_item} ativado")
-                        time.sleep(3)
+                        self.esperas.ate(dom_estavel(), teto=5, antes=3)
                     else:
                         logger.info(f"{nome_item} já está ativo")
                     return item
@@ -454,85 +641,50 @@ class SisctmAuto:
 
             # IPTU CTM GEO
             iptu_item = ativar_item("IPTU CTM GEO")
-            time.sleep(2)
-            # Aguarda a linha com "ÁREA" existir
+            self.esperas.ate(dom_estavel(), teto=4, antes=2)
+            # Aguarda a linha com "ÁREA" existir; o restante da tabela é
+            # extraído de uma vez
             try:
-                linha_area = WebDriverWait(iptu_item, 5).until(
+                WebDriverWait(iptu_item, 5).until(
                     EC.presence_of_element_located(
-                        (By.XPATH, ".//table//tr[td[contains(text(),'ÁREA')]]/td[2]")
+                        (By.XPATH, CAMPOS_IPTU_CTM_GEO["iptu_ctm_geo_area"].xpath)
                     )
                 )
-                resultado["iptu_ctm_geo_area"] = linha_area.text.strip()
             except TimeoutException:
-                logger.warning("Não foi possível capturar área IPTU CTM GEO")
-                resultado["iptu_ctm_geo_area"] = None
-
-            # Aguarda a linha com "AREA_TERRENO" existir
+                logger.warning("Tabela IPTU CTM GEO não carregada")
             try:
-                linha_area_terreno = WebDriverWait(iptu_item, 5).until(
-                    EC.presence_of_element_located(
-                        (
-                            By.XPATH,
-                            ".//table//tr[td[contains(text(),'AREA_TERRENO')]]/td[2]",
-                        )
-                    )
-                )
-                resultado["iptu_ctm_geo_area_terreno"] = linha_area_terreno.text.strip()
-            except TimeoutException:
-                logger.warning("Não foi possível capturar AREA TERRENO")
-                resultado["iptu_ctm_geo_area_terreno"] = None
-
-            # Captura campos do endereço
-            try:
-                campos = {
-                    "tipo_logradouro": ".//table//tr[24]/td[2]",
-                    "nome_logradouro": ".//table//tr[25]/td[2]",
-                    "numero_imovel": ".//table//tr[26]/td[2]",
-                    "complemento": ".//table//tr[27]/td[2]",
-                    "cep": ".//table//tr[28]/td[2]",
-                }
-
-                valores = {}
-                for chave, xpath in campos.items():
-                    try:
-                        elemento = WebDriverWait(iptu_item, 5).until(
-                            EC.presence_of_element_located((By.XPATH, xpath))
-                        )
-                        valores[chave] = elemento.text.strip()
-                    except TimeoutException:
-                        valores[chave] = ""
-
-                # Remove pontos do número do imóvel
-                valores["numero_imovel"] = valores["numero_imovel"].replace(".", "")
+                iptu = extrair(self.driver, CAMPOS_IPTU_CTM_GEO, raiz=iptu_item)
+            except Exception as e:
+                logger.warning(f"Não foi possível extrair a tabela IPTU CTM GEO: {e}")
+                iptu = {nome: None for nome in CAMPOS_IPTU_CTM_GEO}
 
-                # Monta o endereço no formato desejado (padrão Google, sem formatar CEP)
-                endereco = f"{valores['tipo_logradouro']} {valores['nome_logradouro']}, {valores['numero_imovel']}"
-                if valores["complemento"]:
-                    endereco += f" {valores['complemento']}"
-                endereco += f" - Belo Horizonte - MG, {valores['cep']}"
+            resultado["iptu_ctm_geo_area"] = iptu["iptu_ctm_geo_area"]
+            if iptu["iptu_ctm_geo_area"] is None:
+                logger.warning("Não foi possível capturar área IPTU CTM GEO")
+            resultado["iptu_ctm_geo_area_terreno"] = iptu["iptu_ctm_geo_area_terreno"]
+            if iptu["iptu_ctm_geo_area_terreno"] is None:
+                logger.warning("Não foi possível capturar AREA TERRENO")
 
-                resultado["endereco_ctmgeo"] = endereco
-            except Exception as e:
-                logger.warning(f"Não foi possível capturar endereço CTM GEO: {e}")
-                resultado["endereco_ctmgeo"] = None
+            resultado["endereco_ctmgeo"] = _montar_endereco(iptu)
 
             # Lote CP - ATIVO
             lote_cp_item = ativar_item("Lote CP - ATIVO")
-
             try:
-                # Captura todas as linhas da tabela
-                tabela = lote_cp_item.find_element(By.TAG_NAME, "table")
-                linhas = tabela.find_elements(By.TAG_NAME, "tr")
-
-                # Captura a sexta linha e segunda coluna
-                linha_area = linhas[5]
-                colunas = linha_area.find_elements(By.TAG_NAME, "td")
-                valor = colunas[1].text.strip()
-                resultado["lote_cp_ativo_area_informada"] = valor
+                if lote_cp_item is None:
+                    raise NoSuchElementException("camada não encontrada")
+                lote_cp = extrair(self.driver, CAMPOS_LOTE_CP, raiz=lote_cp_item)
             except Exception as e:
-                logger.warning(f"Não foi possível capturar área Lote CP - ATIVO: {e}")
-                resultado["lote_cp_ativo_area_informada"] = None
-
+                logger.warning(
+                    f"Não foi possível extrair a tabela Lote CP - ATIVO: {e}"
+                )
+                lote_cp = {nome: None for nome in CAMPOS_LOTE_CP}
+            resultado["lote_cp_ativo_area_informada"] = lote_cp[
+                "lote_cp_ativo_area_informada"
+            ]
+            if lote_cp["lote_cp_ativo_area_informada"] is None:
+                logger.warning("Não foi possível capturar área Lote CP - ATIVO")
+
+            self.valores_painel = {**iptu, **lote_cp}
             return resultado
 
         except NoSuchElementException as e:
@@ -544,3 +696,76 @@ class SisctmAuto:
         except Exception as e:
             logger.error(f"Erro inesperado ao capturar áreas: {e}")
             return {}
+
+    def _cabecalhos_servico(self):
+        """Authorization enviada pelo mapa ao serviço de feições, se houver."""
+        host = urlparse(servico_feicoes.endereco).netloc
+        for url, cabecalhos in reversed(self.rede.requisicoes()):
+            if urlparse(url).netloc == host:
+                return {
+                    nome: valor
+                    for nome, valor in cabecalhos.items()
+                    if nome.lower() == "authorization"
+                }
+        return {}
+
+    def consultar_feicoes(self, indice_cadastral):
+        """
+        Lê áreas e endereço do índice direto no serviço de feições do mapa
+        (WFS), sem ativar camadas nem aplicar o filtro pela interface.
+
+        Retorna:
+            dict | None: Mesmo formato de `capturar_areas`, ou None se o
+                serviço ainda não foi aprendido ou não trouxe a área.
+        """
+        cliente = clientes_http.obter(self.driver, "SISCTM")
+        if not servico_feicoes.pronto or cliente is None:
+            return None
+        try:
+            consulta = servico_feicoes.consultar(
+                cliente, indice_cadastral, self._cabecalhos_servico()
+            )
+        except SessaoExpirada:
+            logger.info("Serviço de feições recusou a sessão, usando a interface")
+            clientes_http.sincronizar(self.driver, "SISCTM")
+            return None
+        except Exception as e:
+            logger.warning(f"Falha na consulta ao serviço de feições: {e}")
+            return None
+
+        if consulta is None or consulta[0]["iptu_ctm_geo_area"] is None:
+            logger.info(f"Índice {indice_cadastral} sem feição no WFS do SISCTM")
+            return None
+        dados = consulta[0]
+        logger.info(f"Áreas do SISCTM lidas no serviço de feições: {indice_cadastral}")
+        return {
+            "iptu_ctm_geo_area": dados["iptu_ctm_geo_area"],
+            "iptu_ctm_geo_area_terreno": dados["iptu_ctm_geo_area_terreno"],
+            "endereco_ctmgeo": _montar_endereco(dados),
+            "lote_cp_ativo_area_informada": dados["lote_cp_ativo_area_informada"],
+        }
+
+    def aprender_feicoes(self, indice_cadastral):
+        """
+        Aprende o serviço de feições com as requisições que a interface fez
+        ao filtrar o índice e confirma os atributos com os valores lidos no
+        painel lateral. Falhas aqui não afetam a coleta.
+        """
+        try:
+            servico_feicoes.aprender_requisicoes(
+                self.rede.requisicoes(), indice_cadastral
+            )
+            if not servico_feicoes.pronto or not self.valores_painel:
+                return
+            cliente = clientes_http.sincronizar(self.driver, "SISCTM")
+            if cliente is None:
+                return
+            consulta = servico_feicoes.consultar(
+                cliente, indice_cadastral, self._cabecalhos_servico()
+            )
+            if consulta:
+                servico_feicoes.aprender_atributos(
+                    indice_cadastral, consulta[1], self.valores_painel
+                )
+        except Exception as e:
+            logger.warning(f"Não foi possível aprender o serviço de feições: {e}")
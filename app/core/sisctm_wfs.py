@@ -0,0 +1,567 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import Future, InvalidStateError
+from urllib.parse import parse_qsl, urlparse, urlunparse
+
+from utils import logger, parse_area
+from utils.config import PASTA_DADOS, SISCTM_WFS_LOTE
+
+ARQUIVO_SERVICO = os.path.join(PASTA_DADOS, "sisctm_wfs.json")
+
+# Atributo usado pelo filtro da camada IPTU CTM GEO na interface
+ATRIBUTO_INDICE = "_INDICE_CADASTRAL"
+
+# Trecho do nome da camada Lote CP (o mesmo da imagem da legenda)
+CAMADA_LOTE_CP = "lotecp"
+
+Atributo = namedtuple("Atributo", ("nomes",))
+Atributo.__doc__ = """
+Atributo de uma feição lido para `dados_sisctm`.
+
+Parâmetros:
+    nomes (tuple): Nomes aceitos para o atributo (comparados sem acento,
+        maiúsculas ou separadores). Nomes aprendidos são somados a estes.
+"""
+
+ATRIBUTOS_IPTU = {
+    "iptu_ctm_geo_area": Atributo(("AREA",)),
+    "iptu_ctm_geo_area_terreno": Atributo(("AREA_TERRENO",)),
+    "tipo_logradouro": Atributo(("TIPO_LOGRADOURO", "TIPO_LOGR")),
+    "nome_logradouro": Atributo(("NOME_LOGRADOURO", "NOME_LOGR", "LOGRADOURO")),
+    "numero_imovel": Atributo(("NUMERO_IMOVEL", "NUM_IMOVEL")),
+    "complemento": Atributo(("COMPLEMENTO",)),
+    "cep": Atributo(("CEP",)),
+}
+
+ATRIBUTOS_LOTE_CP = {
+    "lote_cp_ativo_area_informada": Atributo(("AREA_INFORMADA", "AREA_INF")),
+}
+
+
+def _normalizar(nome):
+    sem_acento = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore")
+    return re.sub(r"[^a-z0-9]", "", sem_acento.decode().lower())
+
+
+def _parametros(url):
+    """Parâmetros da query string com as chaves em maiúsculas."""
+    return {k.upper(): v for k, v in parse_qsl(urlparse(url).query)}
+
+
+def _endereco_ows(url):
+    """
+    Endereço OWS do GeoServer a partir de uma requisição WMS (o mesmo
+    serviço atende WFS). Requisições do cache de tiles não servem.
+    """
+    partes = urlparse(url)
+    if "/gwc/" in partes.path:
+        return None
+    caminho = re.sub(r"/wms$", "/ows", partes.path, flags=re.IGNORECASE)
+    return urlunparse((partes.scheme, partes.netloc, caminho, "", "", ""))
+
+
+def _area(anel):
+    """Área (absoluta) de um anel pela fórmula do laço."""
+    return (
+        abs(sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(anel, anel[1:] + anel[:1])))
+        / 2
+    )
+
+
+def _ponto_na_superficie(aneis):
+    """
+    Ponto garantidamente dentro do polígono (anel externo e furos), mesmo
+    côncavo ou em L: a horizontal entre duas alturas de vértices perto do
+    meio cruza as arestas; o ponto é o meio do trecho interno mais largo.
+    """
+    alturas = sorted({v[1] for anel in aneis for v in anel})
+    if len(alturas) < 2:
+        return None
+    meio = (alturas[0] + alturas[-1]) / 2
+    # Altura que não coincide com nenhum vértice
+    i = min(range(len(alturas) - 1), key=lambda k: abs(alturas[k] - meio))
+    y = (alturas[i] + alturas[i + 1]) / 2
+
+    cruzamentos = []
+    for anel in aneis:
+        for inicio, fim in zip(anel, anel[1:] + anel[:1]):
+            (x1, y1), (x2, y2) = inicio[:2], fim[:2]
+            if (y1 > y) != (y2 > y):
+                cruzamentos.append(x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    cruzamentos.sort()
+    trechos = list(zip(cruzamentos[0::2], cruzamentos[1::2]))
+    if not trechos:
+        return None
+    esquerda, direita = max(trechos, key=lambda t: t[1] - t[0])
+    return ((esquerda + direita) / 2, y)
+
+
+def _ponto_interno(geometria):
+    """
+    Ponto da feição usado na consulta espacial da camada Lote CP. Em
+    polígonos, um ponto interno (a média dos vértices pode cair fora de
+    lotes côncavos); em multipolígonos, no maior polígono.
+    """
+    tipo = (geometria or {}).get("type")
+    coordenadas = (geometria or {}).get("coordinates")
+    if tipo == "Point":
+        return tuple(coordenadas[:2])
+    if tipo == "MultiPoint":
+        return tuple(coordenadas[0][:2])
+    if tipo == "Polygon":
+        poligono = coordenadas
+    elif tipo == "MultiPolygon" and coordenadas:
+        poligono = max(coordenadas, key=lambda p: _area(p[0]))
+    else:
+        return None
+    aneis = [[tuple(v[:2]) for v in anel] for anel in poligono if anel]
+    if not aneis:
+        return None
+    return _ponto_na_superficie(aneis)
+
+
+def _digitos(valor):
+    return re.sub(r"\D", "", str(valor))
+
+
+def _feicao_do_indice(feicoes, indice, unico):
+    """
+    Feição IPTU CTM GEO do índice, comparando só os dígitos do atributo
+    `_INDICE_CADASTRAL`. Numa consulta de um único índice, vale a primeira.
+    """
+    if unico:
+        return feicoes[0] if feicoes else None
+    alvo = _digitos(indice)
+    chave = _normalizar(ATRIBUTO_INDICE)
+    for feicao in feicoes:
+        for nome, valor in feicao.get("properties", {}).items():
+            if _normalizar(nome) == chave and _digitos(valor) == alvo:
+                return feicao
+    return None
+
+
+def _contem(geometria, ponto):
+    """Ponto dentro de um Polygon/MultiPolygon (regra par-ímpar, com furos)."""
+    tipo = (geometria or {}).get("type")
+    if tipo == "Polygon":
+        poligonos = [geometria["coordinates"]]
+    elif tipo == "MultiPolygon":
+        poligonos = geometria["coordinates"]
+    else:
+        return False
+
+    x, y = ponto
+    for aneis in poligonos:
+        dentro = False
+        for anel in aneis:
+            for inicio, fim in zip(anel, anel[1:] + anel[:1]):
+                (x1, y1), (x2, y2) = inicio[:2], fim[:2]
+                if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                    dentro = not dentro
+        if dentro:
+            return True
+    return False
+
+
+def _resolver(futuro, resultado=None, erro=None):
+    """Conclui o futuro, a menos que tenha sido cancelado (`descartar_agendados`)."""
+    try:
+        if erro is not None:
+            futuro.set_exception(erro)
+        else:
+            futuro.set_result(resultado)
+    except InvalidStateError:
+        pass
+
+
+def _mesmo_valor(valor, alvo):
+    """Compara um atributo da feição com o texto do painel (números por valor)."""
+    if valor is None or alvo is None:
+        return False
+    texto, alvo = str(valor).strip(), str(alvo).strip()
+    if not texto or not alvo:
+        return False
+    if texto == alvo:
+        return True
+    numero, numero_alvo = parse_area(texto), parse_area(alvo)
+    return numero is not None and numero == numero_alvo
+
+
+class ServicoFeicoesSisctm:
+    """
+    Serviço de feições (GeoServer WFS) por trás do mapa do SISCTM.
+
+    O endereço, os nomes das camadas e o filtro por índice cadastral não
+    são documentados: são aprendidos nas requisições WMS que o mapa faz
+    quando o filtro `_INDICE_CADASTRAL` é aplicado pela interface. Os nomes
+    dos atributos são confirmados comparando a feição com os valores lidos
+    no painel lateral na mesma execução. Tudo é salvo em disco para as
+    próximas execuções.
+
+    Parâmetros:
+        arquivo (str): Onde o serviço aprendido é salvo.
+        tamanho_lote (int): Máximo de ICs lidos em uma mesma consulta.
+    """
+
+    def __init__(self, arquivo=ARQUIVO_SERVICO, tamanho_lote=SISCTM_WFS_LOTE):
+        self.arquivo = arquivo
+        self.endereco = None
+        self.camada_iptu = None
+        self.camada_lote_cp = None
+        self.filtro = None
+        self.geometria_lote_cp = None
+        self.atributos = {}
+        self.tamanho_lote = tamanho_lote
+        self._agendados = {}
+        self._em_consulta = {}
+        # Campo -> (atributo, IC) visto uma vez, aguardando confirmação
+        self._candidatos = {}
+        self._lock = threading.Lock()
+        self._carregar()
+
+    @property
+    def pronto(self):
+        return bool(self.endereco and self.camada_iptu and self.filtro)
+
+    # Aprendizado
+
+    def aprender_requisicoes(self, requisicoes, indice):
+        """
+        Procura, nas requisições do mapa, a camada filtrada pelo índice e a
+        camada Lote CP.
+
+        Parâmetros:
+            requisicoes (list): Tuplas (url, cabeçalhos) do MonitorRede.
+            indice (str): Índice cadastral filtrado na interface.
+        """
+        alterado = False
+        for url, _ in requisicoes:
+            parametros = _parametros(url)
+            if parametros.get("SERVICE", "").upper() != "WMS":
+                continue
+            endereco = _endereco_ows(url)
+            if not endereco:
+                continue
+            camadas = parametros.get("QUERY_LAYERS") or parametros.get("LAYERS", "")
+            filtro = parametros.get("CQL_FILTER", "")
+
+            with self._lock:
+                if ATRIBUTO_INDICE in filtro and indice in filtro:
+                    # Com várias camadas, o filtro vem separado por ';'
+                    nomes, filtros = camadas.split(","), filtro.split(";")
+                    for nome, filtro_camada in zip(nomes, filtros):
+                        if ATRIBUTO_INDICE in filtro_camada:
+                            modelo = filtro_camada.replace(indice, "{indice}")
+                            alterado |= (
+                                self.endereco,
+                                self.camada_iptu,
+                                self.filtro,
+                            ) != (
+                                endereco,
+                                nome,
+                                modelo,
+                            )
+                            self.endereco, self.camada_iptu = endereco, nome
+                            self.filtro = modelo
+                for nome in camadas.split(","):
+                    if (
+                        CAMADA_LOTE_CP in _normalizar(nome)
+                        and nome != self.camada_lote_cp
+                    ):
+                        self.camada_lote_cp, alterado = nome, True
+
+        if alterado:
+            logger.info("Serviço de feições do SISCTM aprendido")
+            self._salvar()
+
+    def aprender_atributos(self, indice, feicoes, valores):
+        """
+        Associa cada campo lido no painel lateral ao atributo da feição que
+        tem o mesmo valor.
+
+        Só vale o atributo que é o único com aquele valor (um "100" pode ser
+        o número do imóvel ou uma área), e a associação só é gravada quando
+        se repete em um segundo IC.
+
+        Parâmetros:
+            indice (str): IC de onde vieram as feições e os valores.
+            feicoes (dict): Propriedades {"iptu": {...}, "lote_cp": {...}}.
+            valores (dict): Valores do painel, com as chaves de
+                ATRIBUTOS_IPTU e ATRIBUTOS_LOTE_CP.
+        """
+        alterado = False
+        for chave, campos in (("iptu", ATRIBUTOS_IPTU), ("lote_cp", ATRIBUTOS_LOTE_CP)):
+            propriedades = feicoes.get(chave) or {}
+            for campo in campos:
+                alvo = valores.get(campo)
+                nomes = [n for n, v in propriedades.items() if _mesmo_valor(v, alvo)]
+                if len(nomes) != 1:
+                    continue
+                nome = nomes[0]
+                with self._lock:
+                    if self.atributos.get(campo) == nome:
+                        self._candidatos.pop(campo, None)
+                        continue
+                    candidato = self._candidatos.get(campo)
+                    if candidato is None or candidato[0] != nome:
+                        self._candidatos[campo] = (nome, indice)
+                        continue
+                    if candidato[1] == indice:
+                        continue
+                    del self._candidatos[campo]
+                    self.atributos[campo] = nome
+                alterado = True
+        if alterado:
+            logger.info("Atributos do serviço de feições do SISCTM confirmados")
+            self._salvar()
+
+    # Consulta
+
+    def agendar(self, indices):
+        """
+        Anota ICs que serão consultados em breve, para que a próxima
+        consulta os leia junto, em uma única requisição.
+        """
+        with self._lock:
+            for indice in indices:
+                if indice not in self._em_consulta:
+                    self._agendados[indice] = None
+
+    def descartar_agendados(self):
+        """
+        Esquece ICs agendados e resultados de lotes não usados. Lotes ainda
+        em consulta têm seus futuros cancelados: quem vier a esperar por
+        eles consulta o próprio índice.
+        """
+        with self._lock:
+            self._agendados.clear()
+            futuros = list(self._em_consulta.values())
+            self._em_consulta.clear()
+        for futuro in futuros:
+            futuro.cancel()
+
+    def consultar(self, cliente, indice, cabecalhos=None):
+        """
+        Lê as feições IPTU CTM GEO e Lote CP do índice no WFS.
+
+        O índice é consultado junto com os ICs agendados (ver `agendar`);
+        os resultados dos demais ficam guardados para as próximas chamadas.
+
+        Retorna:
+            tuple | None: (dados_sisctm, feicoes), ou None se o índice não
+                tiver feição IPTU CTM GEO.
+        """
+        futuro, lote = self._reservar(indice)
+        if futuro is not None:
+            try:
+                return futuro.result()
+            except Exception:
+                # O lote falhou em outra thread: consulta só este índice
+                lote = {indice: Future()}
+
+        try:
+            resultados = self._consultar_lote(cliente, list(lote), cabecalhos)
+        except Exception as e:
+            for outro in lote.values():
+                _resolver(outro, erro=e)
+            raise
+        for chave, outro in lote.items():
+            _resolver(outro, resultados.get(chave))
+        return resultados.get(indice)
+
+    def _reservar(self, indice):
+        """
+        Futuro do lote que já inclui o índice ou, se não houver, um novo
+        lote com ele e os próximos ICs agendados.
+        """
+        with self._lock:
+            futuro = self._em_consulta.pop(indice, None)
+            if futuro is not None:
+                return futuro, None
+            self._agendados.pop(indice, None)
+            outros = list(self._agendados)[: max(0, self.tamanho_lote - 1)]
+            for outro in outros:
+                del self._agendados[outro]
+            lote = {chave: Future() for chave in [indice, *outros]}
+            self._em_consulta.update({chave: lote[chave] for chave in outros})
+        return None, lote
+
+    def _consultar_lote(self, cliente, indices, cabecalhos):
+        """
+        Consulta vários índices com um filtro OR e associa cada feição ao
+        seu índice; os lotes CP são lidos em uma segunda requisição.
+
+        Retorna:
+            dict: indice -> (dados_sisctm, feicoes) ou None.
+        """
+        filtro = " OR ".join(
+            f"({self.filtro.format(indice=indice)})" for indice in indices
+        )
+        feicoes_iptu = self._get_feicoes(
+            cliente,
+            cabecalhos,
+            typeName=self.camada_iptu,
+            CQL_FILTER=filtro,
+            maxFeatures=len(indices) * 5,
+        )
+        if len(indices) > 1:
+            logger.info(
+                f"Serviço de feições do SISCTM: {len(indices)} ICs em uma consulta"
+            )
+
+        iptu = {}
+        for indice in indices:
+            feicao = _feicao_do_indice(feicoes_iptu, indice, len(indices) == 1)
+            if feicao is not None:
+                iptu[indice] = feicao
+
+        pontos = {
+            indice: ponto
+            for indice, feicao in iptu.items()
+            if (ponto := _ponto_interno(feicao.get("geometry")))
+        }
+        lotes = self._lotes_cp(cliente, cabecalhos, pontos)
+
+        resultados = {}
+        for indice, feicao in iptu.items():
+            propriedades_iptu = feicao.get("properties", {})
+            propriedades_lote = lotes.get(indice, {})
+            dados = self._mapear(ATRIBUTOS_IPTU, propriedades_iptu)
+            dados.update(self._mapear(ATRIBUTOS_LOTE_CP, propriedades_lote))
+            feicoes = {"iptu": propriedades_iptu, "lote_cp": propriedades_lote}
+            resultados[indice] = (dados, feicoes)
+        return resultados
+
+    def _lotes_cp(self, cliente, cabecalhos, pontos):
+        """
+        Propriedades do Lote CP que contém o ponto de cada índice.
+
+        Retorna:
+            dict: indice -> propriedades do lote.
+        """
+        if not self.camada_lote_cp or not pontos:
+            return {}
+        geometria = self._geometria_lote_cp(cliente, cabecalhos)
+        if not geometria:
+            return {}
+
+        filtro = " OR ".join(
+            f"INTERSECTS({geometria}, POINT({x} {y}))" for x, y in pontos.values()
+        )
+        feicoes = self._get_feicoes(
+            cliente,
+            cabecalhos,
+            typeName=self.camada_lote_cp,
+            CQL_FILTER=filtro,
+            maxFeatures=len(pontos) * 2,
+        )
+        if len(pontos) == 1 and feicoes:
+            return {next(iter(pontos)): feicoes[0].get("properties", {})}
+
+        lotes = {}
+        for indice, ponto in pontos.items():
+            feicao = next(
+                (f for f in feicoes if _contem(f.get("geometry"), ponto)), None
+            )
+            if feicao is not None:
+                lotes[indice] = feicao.get("properties", {})
+        return lotes
+
+    def _get_feicoes(self, cliente, cabecalhos, **parametros):
+        resposta = cliente.get_json(
+            self.endereco,
+            params={
+                "service": "WFS",
+                "version": "1.0.0",
+                "request": "GetFeature",
+                "outputFormat": "application/json",
+                **parametros,
+            },
+            headers=cabecalhos or {},
+        )
+        return resposta.get("features") or []
+
+    def _geometria_lote_cp(self, cliente, cabecalhos):
+        """Nome do atributo de geometria da camada Lote CP (DescribeFeatureType)."""
+        if self.geometria_lote_cp:
+            return self.geometria_lote_cp
+        resposta = cliente.get_json(
+            self.endereco,
+            params={
+                "service": "WFS",
+                "version": "1.0.0",
+                "request": "DescribeFeatureType",
+                "typeName": self.camada_lote_cp,
+                "outputFormat": "application/json",
+            },
+            headers=cabecalhos or {},
+        )
+        for tipo in resposta.get("featureTypes", []):
+            for propriedade in tipo.get("properties", []):
+                if str(propriedade.get("type", "")).startswith("gml:"):
+                    with self._lock:
+                        self.geometria_lote_cp = propriedade["name"]
+                    self._salvar()
+                    return self.geometria_lote_cp
+        return None
+
+    def _mapear(self, campos, propriedades):
+        """Valores de `dados_sisctm` a partir das propriedades da feição."""
+        por_nome = {_normalizar(nome): valor for nome, valor in propriedades.items()}
+        dados = {}
+        for campo, atributo in campos.items():
+            nomes = list(atributo.nomes)
+            if campo in self.atributos:
+                nomes.insert(0, self.atributos[campo])
+            valor = next(
+                (
+                    por_nome[_normalizar(n)]
+                    for n in nomes
+                    if por_nome.get(_normalizar(n)) not in (None, "")
+                ),
+                None,
+            )
+            dados[campo] = str(valor).strip() if valor is not None else None
+        return dados
+
+    # Persistência
+
+    def _carregar(self):
+        try:
+            with open(self.arquivo, "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Serviço de feições do SISCTM ignorado: {e}")
+            return
+        self.endereco = conteudo.get("endereco")
+        self.camada_iptu = conteudo.get("camada_iptu")
+        self.camada_lote_cp = conteudo.get("camada_lote_cp")
+        self.filtro = conteudo.get("filtro")
+        self.geometria_lote_cp = conteudo.get("geometria_lote_cp")
+        self.atributos = conteudo.get("atributos", {})
+
+    def _salvar(self):
+        with self._lock:
+            conteudo = {
+                "endereco": self.endereco,
+                "camada_iptu": self.camada_iptu,
+                "camada_lote_cp": self.camada_lote_cp,
+                "filtro": self.filtro,
+                "geometria_lote_cp": self.geometria_lote_cp,
+                "atributos": dict(self.atributos),
+            }
+        try:
+            os.makedirs(os.path.dirname(self.arquivo), exist_ok=True)
+            with open(self.arquivo, "w", encoding="utf-8") as f:
+                json.dump(conteudo, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o serviço de feições: {e}")
+
+
+servico_feicoes = ServicoFeicoesSisctm()
@@ -1,13 +1,38 @@
-import time
 import os
 
-from utils import logger
+from utils import (
+    logger,
+    aguardar_autenticacao,
+    Esperas,
+    dom_estavel,
+    xhr_ocioso,
+    todas,
+    rastreador_downloads,
+    EsperaAdaptativa,
+    Campo,
+    extrair,
+    clientes_http,
+    SessaoExpirada,
+)
+from utils.config import URBANO_API
+from .urbano_api import UrbanoApi, endpoints_urbano
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
+# Formatos das pranchas anexadas (prints .png de outros sistemas ficam de fora)
+EXTENSOES_PROJETO = (".pdf", ".dwf", ".dwg", ".jpg", ".jpeg", ".tif", ".tiff", ".zip")
+
+# Campos da página do projeto, extraídos em uma única chamada ao navegador
+CAMPOS_PROJETO = {
+    "area_lotes": Campo(
+        "//p[@class='form-control-static ng-binding']//span[@class='ng-binding']"
+    ),
+    "area_construida": Campo("//*[@id='pb_area_total_visualizacao']//span"),
+}
+
 
 class UrbanoAuto:
     """
@@ -27,7 +52,16 @@ class UrbanoAuto:
         self.usuario = usuario
         self.senha = senha
         self.pasta_download = pasta_download
-        self.wait = WebDriverWait(self.driver, timeout=5)
+        self.wait = EsperaAdaptativa(self.driver, "URBANO.espera", padrao=5)
+        self.esperas = Esperas(self.driver, pasta_download)
+        self.arquivos = []
+        self.downloads = rastreador_downloads(self.driver, pasta_download)
+
+    def _guardar(self, caminho):
+        """Anota um arquivo gerado por este sistema (usado pelo cache de ICs)."""
+        if caminho:
+            self.arquivos.append(caminho)
+        return caminho
 
     def _click(self, element):
         """Tenta clicar diretamente, se falhar usa JavaScript."""
@@ -88,10 +122,70 @@ class UrbanoAuto:
             logger.error("Erro no login do Urbano: %s", e)
             return False
 
+    def sessao_ativa(self):
+        """Indica se a página atual já está autenticada (sessão reaproveitada)."""
+        return aguardar_autenticacao(
+            self.driver,
+            logado=(By.NAME, "zonaFiscal"),
+            formulario=(By.XPATH, "//div[@class='panel-body' and text()='Acesso PBH']"),
+        )
+
     def download_projeto(self, indice: str):
         """
         Pesquisa o projeto no Urbano e retorna a quantidade de projetos encontrados.
-        Também salva prints e tenta baixar certidão de baixa, alvará ou projeto se existirem.
+        Também tenta baixar certidão de baixa, alvará ou projeto se existirem.
+
+        Usa a API JSON do Urbano quando seus endpoints já são conhecidos; caso
+        contrário (ou se a API falhar), pesquisa pela interface e aproveita a
+        pesquisa para aprender os endpoints.
+        """
+        if URBANO_API:
+            resultado = self._download_projeto_api(indice)
+            if resultado is not None:
+                return resultado
+
+        try:
+            return self._download_projeto_ui(indice)
+        finally:
+            if URBANO_API and not endpoints_urbano.completo:
+                endpoints_urbano.aprender(self.driver, indice)
+
+    def _download_projeto_api(self, indice):
+        """
+        Pesquisa e download pela API, com a sessão HTTP do navegador.
+
+        Retorna:
+            tuple | None: (qtd_projetos, dados_projeto), ou None para usar a
+                interface.
+        """
+        cliente = clientes_http.obter(self.driver, "URBANO")
+        if cliente is None or not endpoints_urbano.pesquisa:
+            return None
+
+        api = UrbanoApi(cliente, self.pasta_download)
+        try:
+            resultado = api.consultar(indice)
+        except SessaoExpirada:
+            clientes_http.sincronizar(self.driver, "URBANO")
+            return None
+        except Exception as e:
+            logger.warning(
+                "API do Urbano indisponível (%s), usando a interface: %s", indice, e
+            )
+            return None
+        cliente.devolver_ao_driver(self.driver)
+        if resultado is None:
+            return None
+
+        qtd_projetos, dados_projeto, arquivos = resultado
+        for caminho in arquivos:
+            self._guardar(caminho)
+        return qtd_projetos, dados_projeto
+
+    def _download_projeto_ui(self, indice):
+        """
+        Pesquisa pela interface: salva prints e tenta baixar certidão de
+        baixa, alvará ou projeto se existirem.
         """
         try:
             logger.info("Iniciando pesquisa de projeto para índice: %s", indice)
@@ -102,7 +196,15 @@ class UrbanoAuto:
             # Divisão do índice
             parte1, parte2, parte3 = indice[0:3], indice[3:7], indice[7:11]
 
-            time.sleep(5)
+            # Aguarda a view de pesquisa do Angular terminar de carregar
+            self.esperas.ate(
+                todas(
+                    EC.presence_of_element_located((By.NAME, "zonaFiscal")),
+                    xhr_ocioso(),
+                ),
+                teto=10,
+                antes=5,
+            )
 
             # Preenche campos
             campo1 = self.wait.until(
@@ -126,13 +228,13 @@ class UrbanoAuto:
                 EC.element_to_be_clickable((By.ID, "btnPesquisar"))
             )
             self._click(btn_pesquisar)
-            time.sleep(15)
+            self.esperas.ate(todas(xhr_ocioso(), dom_estavel()), teto=30, antes=15)
 
             # Scroll para o print (caso necessário)
             self.driver.execute_script(
                 "window.scrollTo(0, document.body.scrollHeight);"
             )
-            time.sleep(2)
+            self.esperas.ate(dom_estavel(quieto=0.3), teto=3, antes=2)
 
             # Verifica a tabela e conta projetos
             try:
@@ -154,6 +256,7 @@ class UrbanoAuto:
                         self.pasta_download, "Pesquisa de Projeto.png"
                     )
                     self.driver.save_screenshot(screenshot_path)
+                    self._guardar(screenshot_path)
                     logger.info("Print da tela salvo")
 
                     return 0, dados_projeto
@@ -162,7 +265,7 @@ class UrbanoAuto:
                 primeiro_projeto = linhas[0].find_element(By.TAG_NAME, "a")
                 self._click(primeiro_projeto)
                 logger.info("Clicado no primeiro projeto da lista")
-                time.sleep(20)
+                self.esperas.ate(todas(xhr_ocioso(), dom_estavel()), teto=40, antes=20)
 
             except NoSuchElementException:
                 logger.info("Projetos não encontrados na pesquisa")
@@ -173,6 +276,7 @@ class UrbanoAuto:
                 # Print da pesquisa em caso de erros
                 screenshot_path = os.path.join(self.pasta_download, "Sem_Projeto.png")
                 self.driver.save_screenshot(screenshot_path)
+                self._guardar(screenshot_path)
                 logger.info("Print da tela salvo")
 
                 return 0, dados_projeto
@@ -183,9 +287,10 @@ class UrbanoAuto:
                 "//a[contains(@href,'certidao-de-baixa') and text()='visualizar']",
             )
             if certidao:
+                download = self.downloads.registrar()
                 certidao[0].click()
                 logger.info("Certidão de baixa baixada (clique realizado)")
-                time.sleep(10)
+                self._guardar(self.downloads.aguardar(download, timeout=20))
                 dados_projeto = self._capturar_dados_projeto(
                     nome_arquivo="Certidão de Baixa"
                 )
@@ -197,9 +302,10 @@ class UrbanoAuto:
                 "//a[contains(text(),'visualizar') and @ng-click='statusCtrl.abrirAlvara()']",
             )
             if alvara:
+                download = self.downloads.registrar()
                 alvara[0].click()
                 logger.info("Alvará baixado (clique realizado)")
-                time.sleep(10)
+                self._guardar(self.downloads.aguardar(download, timeout=20))
                 dados_projeto = self._capturar_dados_projeto(
                     nome_arquivo="Alvará de Contrução"
                 )
@@ -207,11 +313,12 @@ class UrbanoAuto:
 
             # Se nenhum documento encontrado, salva print e acessa "Documentos Anexos"
             if not certidao and not alvara:
-                time.sleep(10)
+                self.esperas.ate(todas(xhr_ocioso(), dom_estavel()), teto=20, antes=10)
                 screenshot_sem_doc = os.path.join(
                     self.pasta_download, "Sem Alvara-Baixa.png"
                 )
                 self.driver.save_screenshot(screenshot_sem_doc)
+                self._guardar(screenshot_sem_doc)
                 logger.info("Nenhum documento encontrado, captura de tela salva.")
 
                 # Clica em "Documentos Anexos"
@@ -233,7 +340,19 @@ class UrbanoAuto:
 
                 # Aguarda aparecer o painel "Pranchas do Projeto"
                 try:
-                    time.sleep(15)
+                    self.esperas.ate(
+                        todas(
+                            EC.presence_of_element_located(
+                                (
+                                    By.XPATH,
+                                    "//h3[contains(text(),'Pranchas do Projeto')]",
+                                )
+                            ),
+                            xhr_ocioso(),
+                        ),
+                        teto=30,
+                        antes=15,
+                    )
                     self.wait.until(
                         EC.presence_of_element_located(
                             (By.XPATH, "//h3[contains(text(),'Pranchas do Projeto')]")
@@ -263,6 +382,9 @@ class UrbanoAuto:
                     )
 
                     nome_arquivo = primeiro_arquivo.text.strip()
+                    download = self.downloads.registrar(
+                        nome_arquivo, extensoes=EXTENSOES_PROJETO
+                    )
                     try:
                         primeiro_arquivo.click()
                     except Exception:
@@ -272,7 +394,7 @@ class UrbanoAuto:
                         )
 
                     logger.info("Download iniciado para: %s", nome_arquivo)
-                    time.sleep(10)
+                    self._guardar(self.downloads.aguardar(download, timeout=20))
 
                     dados_projeto = self._capturar_dados_projeto(nome_arquivo="Projeto")
                     return qtd_projetos, dados_projeto
@@ -296,31 +418,18 @@ class UrbanoAuto:
         Caso algum campo não seja encontrado, retorna 'Não informado'.
         """
         dados = {}
-        time.sleep(2)
+        self.esperas.ate(dom_estavel(), teto=5, antes=2)
 
         # Tipo: nome do arquivo
         dados["tipo"] = nome_arquivo if nome_arquivo else "Não informado"
 
         try:
-            # Área do(s) lote(s)
-            area_lote_elem = self.driver.find_element(
-                By.XPATH,
-                "//p[@class='form-control-static ng-binding']//span[@class='ng-binding']",
-            )
-            dados["area_lotes"] = area_lote_elem.text.strip()
-        except Exception:
-            dados["area_lotes"] = "Não informado"
+            valores = extrair(self.driver, CAMPOS_PROJETO)
+        except Exception as e:
+            logger.warning("Falha ao extrair os dados do projeto: %s", e)
+            valores = {nome: None for nome in CAMPOS_PROJETO}
 
-        try:
-            # Área construída
-            area_construida_elem = self.driver.find_element(
-                By.ID, "pb_area_total_visualizacao"
-            )
-            area_construida_span = area_construida_elem.find_element(
-                By.TAG_NAME, "span"
-            )
-            dados["area_construida"] = area_construida_span.text.strip()
-        except Exception:
-            dados["area_construida"] = "Não informado"
+        for nome, valor in valores.items():
+            dados[nome] = "Não informado" if valor is None else valor
 
         return dados
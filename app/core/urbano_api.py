@@ -0,0 +1,396 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+from utils import logger, log_performance
+from utils.config import PASTA_DADOS, HTTP_CONEXOES_POR_HOST
+
+ARQUIVO_ENDPOINTS = os.path.join(PASTA_DADOS, "urbano_api.json")
+
+HOST_URBANO = "urbano.pbh.gov.br"
+
+# Nomes de chave (normalizados: minúsculas, sem acento e sem separadores)
+# procurados nas respostas JSON do Urbano, por campo
+CHAVES_API = {
+    "id": ("id", "idprojeto", "codigo", "codigoprojeto", "numeroprojeto"),
+    "status": ("status", "situacao", "descricaosituacao"),
+    "area_lotes": ("arealote", "arealotes", "areaterreno"),
+    "area_construida": ("areaconstruida", "areatotal", "areatotalconstruida"),
+    "certidao": ("certidaodebaixa", "certidaobaixa", "urlcertidao"),
+    "alvara": ("alvara", "alvaradeconstrucao", "urlalvara"),
+    "pranchas": ("pranchas", "pranchasdoprojeto", "anexos", "arquivos"),
+    "url": ("url", "link", "href", "caminho", "urlarquivo"),
+    "nome": ("nome", "nomearquivo", "descricao"),
+}
+
+NAO_INFORMADO = "Não informado"
+
+# Consultas pela API não geram as capturas de tela da interface; o
+# relatório registra a origem no lugar delas
+FONTE_API = "API do Urbano (consulta sem capturas de tela)"
+
+
+def _normalizar(chave):
+    sem_acento = unicodedata.normalize("NFKD", str(chave)).encode("ascii", "ignore")
+    return re.sub(r"[^a-z0-9]", "", sem_acento.decode().lower())
+
+
+def _buscar(dados, campo, profundidade=3):
+    """Primeiro valor (busca em largura) cuja chave corresponde ao campo."""
+    nomes = CHAVES_API[campo]
+    nivel = [dados]
+    for _ in range(profundidade):
+        proximo = []
+        for item in nivel:
+            if not isinstance(item, dict):
+                continue
+            for chave, valor in item.items():
+                if _normalizar(chave) in nomes and valor not in (None, ""):
+                    return valor
+                if isinstance(valor, dict):
+                    proximo.append(valor)
+        nivel = proximo
+    return None
+
+
+def _lista_projetos(dados):
+    """
+    Lista de projetos de uma resposta (lista direta ou dentro de um envelope).
+
+    Retorna:
+        list | None: Projetos (vazia se a pesquisa não encontrou nenhum), ou
+            None se a resposta não tem o formato esperado (formato alterado,
+            página de erro ou de login), para não confundi-la com "sem projeto".
+    """
+    if isinstance(dados, list):
+        if all(isinstance(p, dict) for p in dados):
+            return dados
+        return None
+    if isinstance(dados, dict):
+        for valor in dados.values():
+            if isinstance(valor, list) and all(isinstance(p, dict) for p in valor):
+                return valor
+    return None
+
+
+def _ocorrencias(texto, valor):
+    """Posições de `valor` em `texto` que não fazem parte de um número/palavra maior."""
+    padrao = r"(?<![0-9A-Za-z])" + re.escape(valor) + r"(?![0-9A-Za-z])"
+    return [m.start() for m in re.finditer(padrao, texto)]
+
+
+def _escapar(url):
+    return url.replace("{", "{{").replace("}", "}}")
+
+
+def _modelo(url, partes):
+    """
+    Troca na URL os valores das partes do índice por campos de formatação
+    ({zona}, {quarteirao}, {lote}), separados ou concatenados. Retorna None
+    se a URL não contém o índice.
+    """
+    modelo = _escapar(url)
+    completo = "".join(valor for _, valor in partes)
+    posicoes = _ocorrencias(modelo, completo)
+    if posicoes:
+        campos = "".join("{" + nome + "}" for nome, _ in partes)
+        return modelo[: posicoes[0]] + campos + modelo[posicoes[0] + len(completo) :]
+
+    inicio = 0
+    for nome, valor in partes:
+        posicao = next((p for p in _ocorrencias(modelo, valor) if p >= inicio), None)
+        if posicao is None:
+            return None
+        campo = "{" + nome + "}"
+        modelo = modelo[:posicao] + campo + modelo[posicao + len(valor) :]
+        inicio = posicao + len(campo)
+    return modelo
+
+
+def _modelo_projeto(url, id_projeto):
+    """Troca na URL a última ocorrência do identificador do projeto por {id}."""
+    modelo, valor = _escapar(url), str(id_projeto)
+    posicoes = _ocorrencias(modelo, valor)
+    if not posicoes:
+        return None
+    return modelo[: posicoes[-1]] + "{id}" + modelo[posicoes[-1] + len(valor) :]
+
+
+def _partes_indice(indice):
+    indice = indice.strip()
+    return (
+        ("zona", indice[0:3]),
+        ("quarteirao", indice[3:7]),
+        ("lote", indice[7:11]),
+    )
+
+
+class EndpointsUrbano:
+    """
+    Endpoints JSON usados pela interface AngularJS do Urbano.
+
+    Não há documentação da API: os endpoints são aprendidos no log de
+    performance do Chrome durante uma pesquisa feita pela interface e
+    salvos em disco para as próximas execuções.
+
+    - "pesquisa": resposta JSON cuja URL contém zona, quarteirão e lote
+      do índice pesquisado.
+    - "projeto": resposta JSON posterior cuja URL contém o identificador
+      do primeiro projeto retornado pela pesquisa.
+    """
+
+    def __init__(self, arquivo=ARQUIVO_ENDPOINTS):
+        self.arquivo = arquivo
+        self.pesquisa = None
+        self.projeto = None
+        self._lock = threading.Lock()
+        self._carregar()
+
+    @property
+    def completo(self):
+        return bool(self.pesquisa and self.projeto)
+
+    def aprender(self, driver, indice):
+        """Procura os endpoints nas requisições registradas pelo driver."""
+        mensagens, _ = log_performance(driver).ler()
+
+        respostas = []
+        for mensagem in mensagens:
+            if mensagem.get("method") != "Network.responseReceived":
+                continue
+            params = mensagem.get("params", {})
+            resposta = params.get("response", {})
+            if "json" in resposta.get("mimeType", "") and (
+                urlparse(resposta.get("url", "")).hostname == HOST_URBANO
+            ):
+                respostas.append((resposta["url"], params.get("requestId")))
+
+        pesquisa, projeto, id_projeto = None, None, None
+        for url, request_id in respostas:
+            if pesquisa is None:
+                pesquisa = _modelo(url, _partes_indice(indice))
+                if pesquisa:
+                    id_projeto = self._id_primeiro_projeto(driver, request_id)
+            elif id_projeto is not None:
+                projeto = _modelo_projeto(url, id_projeto)
+                if projeto:
+                    break
+
+        with self._lock:
+            alterado = (pesquisa and pesquisa != self.pesquisa) or (
+                projeto and projeto != self.projeto
+            )
+            self.pesquisa = pesquisa or self.pesquisa
+            self.projeto = projeto or self.projeto
+        if alterado:
+            logger.info("Endpoints da API do Urbano aprendidos")
+            self._salvar()
+
+    @staticmethod
+    def _id_primeiro_projeto(driver, request_id):
+        try:
+            corpo = driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": request_id}
+            )["body"]
+            projetos = _lista_projetos(json.loads(corpo))
+        except Exception:
+            return None
+        return _buscar(projetos[0], "id", profundidade=1) if projetos else None
+
+    def _carregar(self):
+        try:
+            with open(self.arquivo, "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Endpoints do Urbano ignorados: {e}")
+            return
+        self.pesquisa = conteudo.get("pesquisa")
+        self.projeto = conteudo.get("projeto")
+
+    def esquecer(self):
+        """
+        Descarta os endpoints aprendidos (a API mudou); a próxima pesquisa
+        pela interface os aprende de novo.
+        """
+        with self._lock:
+            if not (self.pesquisa or self.projeto):
+                return
+            self.pesquisa = self.projeto = None
+        logger.warning("Endpoints da API do Urbano descartados")
+        self._salvar()
+
+    def _salvar(self):
+        with self._lock:
+            conteudo = {"pesquisa": self.pesquisa, "projeto": self.projeto}
+        try:
+            os.makedirs(os.path.dirname(self.arquivo), exist_ok=True)
+            with open(self.arquivo, "w", encoding="utf-8") as f:
+                json.dump(conteudo, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar os endpoints do Urbano: {e}")
+
+
+endpoints_urbano = EndpointsUrbano()
+
+
+class UrbanoApi:
+    """
+    Consulta de projetos do Urbano direto na API JSON, com a sessão HTTP
+    do usuário logado, sem passar pela interface.
+
+    Parâmetros:
+        cliente (ClienteHttp): Cliente HTTP autenticado no Urbano.
+        pasta_download (str): Pasta onde os documentos serão salvos.
+        endpoints (EndpointsUrbano): Endpoints aprendidos.
+    """
+
+    def __init__(self, cliente, pasta_download, endpoints=None):
+        self.cliente = cliente
+        self.pasta_download = pasta_download
+        self.endpoints = endpoints or endpoints_urbano
+
+    def consultar(self, indice):
+        """
+        Pesquisa os projetos do índice e baixa o documento do primeiro
+        projeto (certidão de baixa, alvará ou primeira prancha, nessa ordem).
+
+        Retorna:
+            tuple | None: (qtd_projetos, dados_projeto, arquivos), ou None se
+                a API não tiver como atender (resposta em formato desconhecido,
+                endpoint do projeto ainda desconhecido, documento sem link).
+                Respostas em formato desconhecido descartam os endpoints.
+
+        Lança:
+            ConteudoInesperado: Se o documento baixado é uma página.
+        """
+        partes = dict(_partes_indice(indice))
+        url = self.endpoints.pesquisa.format(**partes)
+        try:
+            projetos = _lista_projetos(self.cliente.get_json(url))
+        except ValueError:
+            projetos = None
+        if projetos is None:
+            logger.warning("Resposta da API do Urbano em formato desconhecido")
+            self.endpoints.esquecer()
+            return None
+        logger.info("%d projeto(s) encontrado(s) via API", len(projetos))
+
+        if not projetos:
+            dados = {
+                "tipo": NAO_INFORMADO,
+                "area_lotes": NAO_INFORMADO,
+                "area_construida": NAO_INFORMADO,
+                "fonte": FONTE_API,
+                "projetos": [],
+            }
+            return 0, dados, []
+
+        if not self.endpoints.projeto:
+            return None
+
+        try:
+            with ThreadPoolExecutor(max_workers=HTTP_CONEXOES_POR_HOST) as executor:
+                detalhes = list(
+                    executor.map(lambda p: self._detalhar(p, url), projetos)
+                )
+        except ValueError:
+            logger.warning(
+                "Detalhe de projeto da API do Urbano em formato desconhecido"
+            )
+            self.endpoints.esquecer()
+            return None
+
+        primeiro = detalhes[0]
+        tipo, caminho = self._baixar_documento(primeiro)
+        if tipo is None:
+            return None
+
+        dados = {
+            "tipo": tipo,
+            "area_lotes": primeiro["area_lotes"] or NAO_INFORMADO,
+            "area_construida": primeiro["area_construida"] or NAO_INFORMADO,
+            "fonte": FONTE_API,
+            "projetos": detalhes,
+        }
+        return len(projetos), dados, [caminho] if caminho else []
+
+    def _detalhar(self, projeto, base):
+        """Une o item da pesquisa ao detalhe do projeto e extrai os campos."""
+        id_projeto = _buscar(projeto, "id", profundidade=1)
+        detalhe = dict(projeto)
+        if id_projeto is not None:
+            base = self.endpoints.projeto.format(id=id_projeto)
+            resposta = self.cliente.get_json(base)
+            if isinstance(resposta, dict):
+                detalhe.update(resposta)
+
+        pranchas = _buscar(detalhe, "pranchas") or []
+        return {
+            "id": id_projeto,
+            "status": _texto(_buscar(detalhe, "status")),
+            "area_lotes": _texto(_buscar(detalhe, "area_lotes")),
+            "area_construida": _texto(_buscar(detalhe, "area_construida")),
+            "certidao": _link(_buscar(detalhe, "certidao"), base),
+            "alvara": _link(_buscar(detalhe, "alvara"), base),
+            "pranchas": [
+                {
+                    "nome": _texto(_buscar(p, "nome", profundidade=1)),
+                    "url": _link(p, base),
+                }
+                for p in pranchas
+                if isinstance(p, dict) and _link(p, base)
+            ],
+        }
+
+    def _baixar_documento(self, projeto):
+        """
+        Baixa o documento mais relevante do projeto.
+
+        Retorna:
+            tuple: (tipo, caminho); tipo None se não há link utilizável.
+        """
+        if projeto["certidao"]:
+            tipo, url, nome = "Certidão de Baixa", projeto["certidao"], None
+        elif projeto["alvara"]:
+            tipo, url, nome = "Alvará de Contrução", projeto["alvara"], None
+        elif projeto["pranchas"]:
+            prancha = projeto["pranchas"][0]
+            tipo, url, nome = "Projeto", prancha["url"], prancha["nome"]
+        else:
+            return None, None
+
+        if nome:
+            nome = re.sub(r'[<>:"/\\|?*]', "_", nome)
+        caminho = self.cliente.baixar(
+            url, self.pasta_download, nome=nome, documento=True
+        )
+        logger.info("%s baixado via API: %s", tipo, os.path.basename(caminho))
+        return tipo, caminho
+
+
+def _texto(valor):
+    if valor is None or isinstance(valor, (dict, list)):
+        return None
+    return str(valor).strip() or None
+
+
+def _link(valor, base):
+    """
+    URL absoluta de um documento (texto com a URL ou objeto com ela). Só
+    valem URLs http(s) e caminhos absolutos: números de processo, versões
+    ou nomes de arquivo não são links.
+    """
+    if isinstance(valor, dict):
+        valor = _buscar(valor, "url", profundidade=1)
+    if not isinstance(valor, str):
+        return None
+    valor = valor.strip()
+    if not valor.startswith(("http://", "https://", "/")):
+        return None
+    return urljoin(base, valor)
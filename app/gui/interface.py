@@ -1,8 +1,8 @@
 import tkinter as tk
-from tkinter import messagebox, scrolledtext, ttk
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 import threading
 import os
-from utils import logger
+from utils import logger, DiarioExecucao
 
 
 def iniciar_interface(processar_callback):
@@ -10,49 +10,87 @@ def iniciar_interface(processar_callback):
     protocolos = []
     cancelar_event = threading.Event()
 
+    def ler_credenciais():
+        credenciais["usuario"] = entry_usuario.get()
+        credenciais["senha"] = entry_senha.get()
+        credenciais["usuario_sigede"] = entry_usuario_sigede.get()
+        credenciais["senha_sigede"] = entry_senha_sigede.get()
+
+        if not credenciais["usuario"] or not credenciais["senha"]:
+            raise ValueError("Usuário e senha do SIATU são obrigatórios")
+        if not credenciais["usuario_sigede"] or not credenciais["senha_sigede"]:
+            raise ValueError("Usuário e senha do SIGEDE são obrigatórios")
+
+    def iniciar_processamento(pasta_resultados=None):
+        # Desabilita entradas e botões
+        btn_confirmar.config(state="disabled")
+        btn_retomar.config(state="disabled")
+        entry_protocolos.config(state="disabled")
+        btn_cancelar.config(state="normal")
+        status_label.config(text="Processando...")
+        cancelar_event.clear()
+
+        # Configura barra de progresso
+        progress_bar["maximum"] = len(protocolos)
+        progress_bar["value"] = 0
+
+        # Executa em thread separada
+        threading.Thread(
+            target=lambda: processar_callback(
+                credenciais.copy(),
+                protocolos.copy(),
+                cancelar_event,
+                atualizar_progresso,
+                pasta_resultados=pasta_resultados,
+            ),
+            daemon=True,
+        ).start()
+
     def confirmar():
         try:
-            credenciais["usuario"] = entry_usuario.get()
-            credenciais["senha"] = entry_senha.get()
-            credenciais["usuario_sigede"] = entry_usuario_sigede.get()
-            credenciais["senha_sigede"] = entry_senha_sigede.get()
+            ler_credenciais()
             lista = entry_protocolos.get().split(",")
             protocolos.clear()
             protocolos.extend([i.strip() for i in lista if i.strip() != ""])
 
-            if not credenciais["usuario"] or not credenciais["senha"]:
-                raise ValueError("Usuário e senha do SIATU são obrigatórios")
-            if not credenciais["usuario_sigede"] or not credenciais["senha_sigede"]:
-                raise ValueError("Usuário e senha do SIGEDE são obrigatórios")
             if not protocolos:
                 raise ValueError("Informe ao menos um protocolo.")
 
-            # Desabilita entradas e botão
-            btn_confirmar.config(state="disabled")
-            entry_protocolos.config(state="disabled")
-            btn_cancelar.config(state="normal")
-            status_label.config(text="Processando...")
-            cancelar_event.clear()
-
-            # Configura barra de progresso
-            progress_bar["maximum"] = len(protocolos)
-            progress_bar["value"] = 0
-
-            # Executa em thread separada
-            threading.Thread(
-                target=lambda: processar_callback(
-                    credenciais.copy(),
-                    protocolos.copy(),
-                    cancelar_event,
-                    atualizar_progresso,
-                ),
-                daemon=True,
-            ).start()
+            iniciar_processamento()
 
         except Exception as e:
             logger.error(f"Erro na interface ao confirmar: {e}")
             messagebox.showerror("Erro", str(e))
 
+    def retomar():
+        try:
+            ler_credenciais()
+            pasta = filedialog.askdirectory(
+                title="Selecione a pasta de resultados interrompida"
+            )
+            if not pasta:
+                return
+            if not DiarioExecucao.existe(pasta):
+                raise ValueError("A pasta selecionada não possui diário de execução.")
+
+            diario = DiarioExecucao(pasta)
+            try:
+                protocolos.clear()
+                protocolos.extend(diario.protocolos())
+            finally:
+                diario.fechar()
+
+            if not protocolos:
+                raise ValueError("Nenhum protocolo registrado no diário.")
+
+            entry_protocolos.delete(0, tk.END)
+            entry_protocolos.insert(0, ",".join(protocolos))
+            iniciar_processamento(pasta_resultados=pasta)
+
+        except Exception as e:
+            logger.error(f"Erro na interface ao retomar: {e}")
+            messagebox.showerror("Erro", str(e))
+
     def cancelar():
         cancelar_event.set()
         status_label.config(text="Cancelando processo...")
@@ -61,12 +99,22 @@ def iniciar_interface(processar_callback):
         entry_protocolos.config(state="normal")
         entry_protocolos.delete(0, tk.END)
         btn_confirmar.config(state="normal")
+        btn_retomar.config(state="normal")
         btn_cancelar.config(state="disabled")
         progress_bar["value"] = 0
         status_label.config(text="Pronto para novo processamento.")
 
-    def atualizar_progresso(valor):
-        progress_bar["value"] = valor
+    def atualizar_progresso(valor, total=None, texto=None):
+        # Chamado pelas threads de processamento; a interface é atualizada
+        # na thread do Tk
+        def aplicar():
+            if total:
+                progress_bar["maximum"] = total
+            progress_bar["value"] = valor
+            if texto and not cancelar_event.is_set():
+                status_label.config(text=texto)
+
+        root.after(0, aplicar)
 
     def on_fechar():
         if messagebox.askokcancel("Sair", "Deseja realmente encerrar o processamento?"):
@@ -119,16 +167,19 @@ def iniciar_interface(processar_callback):
     )
     btn_cancelar.grid(row=5, column=1, sticky="we", padx=5, pady=5)
 
+    btn_retomar = tk.Button(root, text="Retomar execução...", command=retomar)
+    btn_retomar.grid(row=6, column=0, columnspan=2, sticky="we", padx=5, pady=5)
+
     status_label = tk.Label(root, text="Aguardando entrada...")
-    status_label.grid(row=6, column=0, columnspan=2, padx=5, pady=5)
+    status_label.grid(row=7, column=0, columnspan=2, padx=5, pady=5)
 
     progress_bar = ttk.Progressbar(
         root, orient="horizontal", length=700, mode="determinate"
     )
-    progress_bar.grid(row=7, column=0, columnspan=2, pady=5, padx=5)
+    progress_bar.grid(row=8, column=0, columnspan=2, pady=5, padx=5)
 
     log_area = scrolledtext.ScrolledText(root, width=90, height=20, state="disabled")
-    log_area.grid(row=8, column=0, columnspan=2, pady=5, padx=5, sticky="nsew")
+    log_area.grid(row=9, column=0, columnspan=2, pady=5, padx=5, sticky="nsew")
 
     # Ajuste para não perder a rolagem (log area)
     def atualizar_logs():
@@ -1,53 +1,77 @@
 import os
 from datetime import datetime
-from pipeline import processar_indice, processar_protocolo
-from utils import logger, abrir_pasta, criar_pasta_resultados
+from pipeline import planejar_lote, ExecutorIndices
+from utils import (
+    logger,
+    abrir_pasta,
+    criar_pasta_resultados,
+    pool_drivers,
+    clientes_http,
+    obter_servico,
+    encerrar_servico,
+    politica_timeouts,
+    DiarioExecucao,
+    cache_indices,
+)
 from gui import iniciar_interface
 
 
 def main():
-    def processar(credenciais, protocolos, cancelar_event, atualizar_progresso):
-        pasta_resultados = criar_pasta_resultados()
+    def processar(
+        credenciais,
+        protocolos,
+        cancelar_event,
+        atualizar_progresso,
+        pasta_resultados=None,
+    ):
+        # Com `pasta_resultados`, retoma a execução registrada no diário
+        # dessa pasta, repetindo só o que falhou ou não chegou a rodar
+        if not pasta_resultados:
+            pasta_resultados = criar_pasta_resultados()
+        diario = DiarioExecucao(pasta_resultados)
+        if diario.resumo():
+            logger.info(f"Retomando execução em {pasta_resultados}: {diario.resumo()}")
+        diario.iniciar_execucao(protocolos)
+
         count_protocol = 0
-        count_IC = 0
         inicio_exec = datetime.now()
+        executor_ic = ExecutorIndices(
+            credenciais,
+            pasta_resultados,
+            cancelar_event,
+            atualizar_progresso,
+            diario=diario,
+        )
 
         try:
-            for i, protocolo in enumerate(protocolos, 1):
-                if cancelar_event.is_set():
-                    logger.info("Processamento cancelado pelo usuário.")
-                    break
+            # Resolve o chromedriver e inicia o serviço compartilhado
+            obter_servico()
 
-                count_protocol += 1
-                protocolo_normalizado = (
-                    protocolo.replace("-", "").replace("/", "").replace(".", "")
+            # Fase de planejamento: todos os protocolos resolvidos no SIGEDE
+            # antes da coleta, formando o grafo protocolo -> ICs do lote
+            def progresso_planejamento(resolvidos, total):
+                atualizar_progresso(
+                    resolvidos,
+                    total,
+                    f"Resolvendo protocolos no SIGEDE: {resolvidos}/{total}",
                 )
 
-                try:
-                    indices = processar_protocolo(
-                        protocolo_normalizado, credenciais, pasta_resultados
-                    )
-                except Exception as e:
-                    logger.error(f"Erro no protocolo {protocolo}: {e}")
-                    indices = []
+            plano = planejar_lote(
+                protocolos,
+                credenciais,
+                pasta_resultados,
+                cancelar_event,
+                atualizar_progresso=progresso_planejamento,
+                diario=diario,
+            )
+            count_protocol = len(plano.protocolos)
 
-                if indices:
-                    for indice in indices:
-                        if cancelar_event.is_set():
-                            break
-                        count_IC += 1
-                        indice_normalizado = indice.replace("-", "")
-                        try:
-                            processar_indice(
-                                indice_normalizado,
-                                credenciais,
-                                protocolo,
-                                pasta_resultados,
-                            )
-                        except Exception as e:
-                            logger.error(f"Erro no índice {indice}: {e}")
+            if cancelar_event.is_set():
+                logger.info("Processamento cancelado pelo usuário.")
+            else:
+                executor_ic.enviar_plano(plano)
 
-                atualizar_progresso(i)
+            executor_ic.aguardar()
 
             if not cancelar_event.is_set():
                 if os.path.exists(pasta_resultados):
@@ -62,10 +86,21 @@ def main():
             logger.error(f"Erro crítico: {e}")
 
         finally:
+            executor_ic.encerrar()
+            diario.fechar()
+            pool_drivers.encerrar()
+            clientes_http.fechar()
+            encerrar_servico()
+            politica_timeouts.salvar()
+            cache_indices.registrar_estatisticas()
             duracao = datetime.now() - inicio_exec
             minutos, segundos = divmod(duracao.total_seconds(), 60)
             logger.info(f"Protocolos processados: {count_protocol}")
-            logger.info(f"ICs processados: {count_IC}")
+            logger.info(f"ICs processados: {executor_ic.count_IC}")
+            logger.info(
+                f"ICs repetidos no lote: {executor_ic.indices_reaproveitados} "
+                f"({executor_ic.raspagens_evitadas} coletas evitadas)"
+            )
             logger.info(f"Tempo: {int(minutos)} min {int(segundos)} seg")
             root.after(0, resetar_interface)
 
@@ -1,6 +1,12 @@
-from .process import processar_indice, processar_protocolo
+from .process import processar_indice, processar_protocolo, reaproveitar_indice
+from .execucao import ExecutorIndices
+from .planejamento import PlanoLote, planejar_lote
 
 __all__ = [
     "processar_indice",
     "processar_protocolo",
+    "reaproveitar_indice",
+    "ExecutorIndices",
+    "PlanoLote",
+    "planejar_lote",
 ]
@@ -0,0 +1,250 @@
+from concurrent.futures import Future
+
+import queue
+import threading
+import time
+
+from utils import logger, politica_timeouts
+from utils.config import IC_WORKERS, FILA_IC_TAMANHO
+from .process import (
+    processar_indice,
+    reaproveitar_indice,
+    agendar_indices,
+    descartar_agendados,
+)
+
+
+class ExecutorIndices:
+    """
+    Processa os ICs dos protocolos em um pool de workers (consumidores).
+
+    Recebe o lote já resolvido no SIGEDE (`enviar_plano`) em uma fila
+    limitada; quando a fila está cheia, o envio bloqueia. Falhas de um IC
+    não afetam os demais. O progresso conta itens (IC de um protocolo, ou
+    protocolo sem IC) e vem acompanhado da estimativa de término.
+
+    Um IC que aparece em mais de um protocolo do lote é coletado uma única
+    vez; os demais protocolos recebem links para os arquivos da primeira
+    coleta e geram apenas o próprio relatório.
+
+    Parâmetros:
+        credenciais (dict): Credenciais dos sistemas.
+        pasta_resultados (str): Pasta raiz dos resultados da execução.
+        cancelar_event (threading.Event): Sinaliza cancelamento pelo usuário.
+        atualizar_progresso (callable): Recebe (concluídos, total, texto).
+        max_workers (int): Número de ICs processados simultaneamente.
+        tamanho_fila (int): ICs aguardando processamento antes de bloquear o envio.
+        diario (DiarioExecucao, opcional): Diário da execução, para retomada.
+    """
+
+    def __init__(
+        self,
+        credenciais,
+        pasta_resultados,
+        cancelar_event,
+        atualizar_progresso,
+        max_workers=IC_WORKERS,
+        tamanho_fila=FILA_IC_TAMANHO,
+        diario=None,
+    ):
+        self.credenciais = credenciais
+        self.diario = diario
+        self.pasta_resultados = pasta_resultados
+        self.cancelar_event = cancelar_event
+        self.atualizar_progresso = atualizar_progresso
+        self.count_IC = 0
+        self.indices_reaproveitados = 0
+        self.raspagens_evitadas = 0
+        self._compartilhados = {}
+        self.protocolos_concluidos = 0
+        self.total_itens = 0
+        self.itens_concluidos = 0
+        self._duracoes = []
+        self._workers_ativos = max(1, max_workers)
+        self._fila = queue.Queue(maxsize=max(1, tamanho_fila))
+        self._restantes = {}
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._consumir, daemon=True)
+            for _ in range(max(1, max_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enviar_plano(self, plano):
+        """
+        Enfileira todo o lote resolvido, na ordem de coleta do plano, com o
+        total de itens conhecido desde o início.
+
+        Parâmetros:
+            plano (PlanoLote): Grafo protocolo -> ICs do lote.
+        """
+        itens = plano.itens()
+        with self._lock:
+            self.total_itens += plano.total
+            for protocolo, _ in itens:
+                self._restantes[protocolo] = self._restantes.get(protocolo, 0) + 1
+        agendar_indices(list(plano.protocolos_por_indice()))
+
+        for protocolo, indices in plano.indices_por_protocolo.items():
+            if not indices:
+                self._concluir_protocolo()
+                self._concluir_item()
+        for item in itens:
+            if not self._colocar(item):
+                return
+
+    def _colocar(self, item):
+        """Coloca um item na fila; False se o lote foi cancelado na espera."""
+        while True:
+            try:
+                self._fila.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                if self.cancelar_event.is_set():
+                    return False
+
+    def aguardar(self):
+        """Aguarda a fila esvaziar e todos os ICs terminarem."""
+        self._fila.join()
+
+    def encerrar(self):
+        """Encerra os workers, descartando ICs não iniciados se houve cancelamento."""
+        if self.cancelar_event.is_set():
+            while True:
+                try:
+                    self._fila.get_nowait()
+                    self._fila.task_done()
+                except queue.Empty:
+                    break
+
+        for _ in self._workers:
+            self._fila.put(None)
+        for worker in self._workers:
+            worker.join()
+        descartar_agendados()
+
+    def _consumir(self):
+        """Loop de um worker: retira ICs da fila até receber o sinal de fim."""
+        while True:
+            item = self._fila.get()
+            try:
+                if item is None:
+                    return
+                self._processar(*item)
+            finally:
+                self._fila.task_done()
+
+    def _processar(self, protocolo, indice):
+        """Processa um IC isolando suas falhas."""
+        inicio = None
+        try:
+            if self.cancelar_event.is_set():
+                return
+
+            inicio = time.monotonic()
+
+            with self._lock:
+                self.count_IC += 1
+
+            indice_normalizado = indice.replace("-", "")
+            try:
+                self._processar_indice(protocolo, indice_normalizado)
+            except Exception as e:
+                logger.error(f"Erro no índice {indice}: {e}")
+        finally:
+            with self._lock:
+                self._restantes[protocolo] -= 1
+                concluido = self._restantes[protocolo] == 0
+            if concluido:
+                self._concluir_protocolo()
+            self._concluir_item(inicio)
+
+    def _processar_indice(self, protocolo, indice):
+        """
+        Coleta o IC na primeira vez em que aparece no lote; nas seguintes,
+        aguarda essa coleta e reaproveita o resultado.
+        """
+        with self._lock:
+            compartilhado = self._compartilhados.get(indice)
+            primeiro = compartilhado is None
+            if primeiro:
+                compartilhado = self._compartilhados[indice] = (protocolo, Future())
+        protocolo_origem, futuro = compartilhado
+
+        if primeiro:
+            inicio = time.monotonic()
+            try:
+                contexto = processar_indice(
+                    indice,
+                    self.credenciais,
+                    protocolo,
+                    self.pasta_resultados,
+                    diario=self.diario,
+                )
+            except Exception as e:
+                futuro.set_exception(e)
+                raise
+            futuro.set_result(contexto)
+            politica_timeouts.registrar("IC.total", time.monotonic() - inicio)
+            return
+
+        if protocolo_origem == protocolo:
+            logger.info(f"IC {indice} repetido no protocolo {protocolo}, ignorado")
+            return
+
+        # A coleta de origem já está em andamento em outro worker
+        try:
+            etapas = reaproveitar_indice(
+                indice,
+                self.credenciais,
+                protocolo,
+                self.pasta_resultados,
+                futuro.result(),
+                diario=self.diario,
+            )
+        except Exception as e:
+            logger.warning(f"IC {indice} não reaproveitado, coletando novamente: {e}")
+            processar_indice(
+                indice,
+                self.credenciais,
+                protocolo,
+                self.pasta_resultados,
+                diario=self.diario,
+            )
+            return
+
+        with self._lock:
+            self.indices_reaproveitados += 1
+            self.raspagens_evitadas += etapas
+
+    def _concluir_protocolo(self):
+        with self._lock:
+            self.protocolos_concluidos += 1
+        logger.info(f"Protocolos concluídos: {self.protocolos_concluidos}")
+
+    def _concluir_item(self, inicio=None):
+        with self._lock:
+            self.itens_concluidos += 1
+            concluidos, total = self.itens_concluidos, self.total_itens
+            if inicio is not None:
+                self._duracoes.append(time.monotonic() - inicio)
+            texto = self._texto_progresso(concluidos, total)
+        self.atualizar_progresso(concluidos, total, texto)
+
+    def _texto_progresso(self, concluidos, total):
+        """
+        Itens concluídos e tempo restante estimado pela duração média dos
+        itens já processados; antes do primeiro, pela mediana histórica
+        de um IC (`IC.total`).
+        """
+        texto = f"{concluidos}/{total} itens concluídos"
+        if self._duracoes:
+            media = sum(self._duracoes) / len(self._duracoes)
+        else:
+            media = politica_timeouts.estimativa("IC.total")
+        if media is None or concluidos >= total:
+            return texto
+        restante = (total - concluidos) * media / self._workers_ativos
+        minutos, segundos = divmod(int(restante), 60)
+        return f"{texto} - restam cerca de {minutos} min {segundos} seg"
@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from utils import logger
+from utils.config import ETAPAS_MAX_PARALELAS
+
+
+def _dependencias(etapas, disponiveis):
+    """
+    Calcula de quais etapas cada etapa depende, a partir das entradas
+    e saídas declaradas.
+    """
+    produtores = {}
+    for etapa in etapas:
+        for saida in etapa.saidas:
+            produtores[saida] = etapa
+
+    dependencias = {}
+    for etapa in etapas:
+        deps = set()
+        for entrada in etapa.entradas:
+            if entrada in produtores:
+                deps.add(produtores[entrada])
+            elif entrada not in disponiveis:
+                raise ValueError(
+                    f"Entrada '{entrada}' de {type(etapa).__name__} não é produzida "
+                    "por nenhuma etapa"
+                )
+        dependencias[etapa] = deps
+    return dependencias
+
+
+def etapas_pendentes(etapas, contexto, concluidas):
+    """
+    Separa as etapas que precisam rodar na retomada de um IC.
+
+    Uma etapa concluída é repetida se alguma etapa de que ela depende for
+    repetida, para que suas saídas (ex.: o relatório) reflitam os novos
+    dados.
+
+    Parâmetros:
+        etapas (list[SistemaAutomacao]): Etapas do IC.
+        contexto (dict): Valores iniciais do IC.
+        concluidas (dict): {nome da etapa: saídas} registradas no diário.
+
+    Retorna:
+        tuple[list, dict]: Etapas a executar e saídas reaproveitadas.
+    """
+    dependencias = _dependencias(etapas, contexto)
+    repetir = {e for e in etapas if type(e).__name__ not in concluidas}
+
+    mudou = True
+    while mudou:
+        mudou = False
+        for etapa in etapas:
+            if etapa not in repetir and dependencias[etapa] & repetir:
+                repetir.add(etapa)
+                mudou = True
+
+    reaproveitadas = {}
+    for etapa in etapas:
+        if etapa not in repetir:
+            reaproveitadas.update(concluidas[type(etapa).__name__])
+    return [e for e in etapas if e in repetir], reaproveitadas
+
+
+def _executar_etapa(etapa, contexto, diario):
+    """Executa uma etapa registrando início, fim e falha no diário."""
+    if diario is None:
+        return etapa.executar_etapa(contexto)
+
+    nome = type(etapa).__name__
+    diario.iniciar(nome)
+    try:
+        saidas = etapa.executar_etapa(contexto)
+    except Exception as e:
+        diario.falhar(nome, e)
+        raise
+    diario.concluir(nome, saidas)
+    return saidas
+
+
+def executar_grafo(etapas, contexto, max_paralelas=ETAPAS_MAX_PARALELAS, diario=None):
+    """
+    Executa as etapas respeitando as dependências entre entradas e saídas.
+
+    Etapas independentes rodam em paralelo, limitadas a `max_paralelas`;
+    cada etapa inicia assim que suas entradas estão prontas. Se uma etapa
+    falhar, as pendentes não são iniciadas e a exceção é repassada.
+
+    Parâmetros:
+        etapas (list[SistemaAutomacao]): Etapas a executar.
+        contexto (dict): Valores iniciais; recebe as saídas de cada etapa.
+        diario (DiarioIndice, opcional): Registro das etapas para retomada.
+
+    Retorna:
+        dict: O contexto com as saídas de todas as etapas.
+    """
+    dependencias = _dependencias(etapas, contexto)
+    pendentes = list(etapas)
+    concluidas = set()
+    em_execucao = {}
+    erro = None
+
+    with ThreadPoolExecutor(max_workers=max_paralelas) as executor:
+        while pendentes or em_execucao:
+            if erro is None:
+                for etapa in [e for e in pendentes if dependencias[e] <= concluidas]:
+                    pendentes.remove(etapa)
+                    futuro = executor.submit(
+                        _executar_etapa, etapa, dict(contexto), diario
+                    )
+                    em_execucao[futuro] = etapa
+            elif not em_execucao:
+                break
+
+            if not em_execucao:
+                raise RuntimeError("Dependência circular entre etapas do pipeline")
+
+            prontos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                etapa = em_execucao.pop(futuro)
+                try:
+                    contexto.update(futuro.result())
+                    concluidas.add(etapa)
+                except Exception as e:
+                    logger.error(f"Falha na etapa {type(etapa).__name__}: {e}")
+                    if erro is None:
+                        erro = e
+
+    if erro is not None:
+        raise erro
+    return contexto
@@ -1,8 +1,51 @@
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
+
+from utils import cache_indices
 
 
 class SistemaAutomacao(ABC):
+    # Nomes dos valores consumidos e produzidos por `executar`, na ordem
+    # dos argumentos e do retorno. Usados para montar o grafo de etapas.
+    entradas = ()
+    saidas = ()
+
+    # Semáforo compartilhado entre instâncias que limita quantas execuções
+    # simultâneas do sistema são permitidas (None = sem limite)
+    limite = None
+
+    # Nome do sistema no cache de resultados por IC (None = sem cache)
+    cache = None
+
     @abstractmethod
     def executar(self, indice, credenciais, pasta_indice):
         """Executa coleta de dados e retorna os resultados do sistema"""
         pass
+
+    def executar_etapa(self, contexto):
+        """Executa o sistema como etapa do grafo, lendo e gravando no contexto"""
+        with self.limite or nullcontext():
+            resultado = self.executar(*(contexto[nome] for nome in self.entradas))
+        return self.mapear_saidas(resultado)
+
+    def mapear_saidas(self, resultado):
+        """Associa o retorno de `executar` aos nomes declarados em `saidas`"""
+        if not self.saidas:
+            return {}
+        if len(self.saidas) == 1:
+            resultado = (resultado,)
+        return dict(zip(self.saidas, resultado))
+
+    @classmethod
+    def agendar(cls, indices):
+        """Avisa o sistema dos ICs que virão (permite consultá-los em lote)"""
+
+    @classmethod
+    def descartar_agendados(cls):
+        """Esquece os ICs agendados que não chegaram a ser consultados"""
+
+    def guardar_no_cache(self, indice, resultado, arquivos):
+        """Salva no cache de ICs um resultado com dados e os arquivos gerados"""
+        saidas = self.mapear_saidas(resultado)
+        if self.cache and any(saidas.values()):
+            cache_indices.salvar(self.cache, indice, saidas, arquivos)
@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from utils import logger
+from utils.config import LIMITE_SIGEDE, PASTA_DADOS, PLANO_LOTE_TTL_DIAS
+from .process import processar_protocolo
+
+PASTA_PLANOS = os.path.join(PASTA_DADOS, "planos")
+
+
+def normalizar_protocolo(protocolo):
+    return protocolo.replace("-", "").replace("/", "").replace(".", "")
+
+
+def normalizar_indice(indice):
+    return indice.replace("-", "")
+
+
+def _arquivo_do_plano(protocolos, pasta=PASTA_PLANOS):
+    """Plano salvo do conjunto de protocolos (independe da ordem informada)."""
+    chave = "\n".join(sorted({normalizar_protocolo(p) for p in protocolos}))
+    return os.path.join(pasta, hashlib.sha1(chave.encode()).hexdigest() + ".json")
+
+
+class PlanoLote:
+    """
+    Grafo protocolo -> ICs do lote, resolvido no SIGEDE antes da coleta.
+
+    Com o grafo completo, cada IC é coletado uma vez mesmo que apareça em
+    vários protocolos, a coleta começa pelos ICs que liberam mais
+    relatórios e o progresso conta todos os itens desde o início.
+
+    Parâmetros:
+        indices_por_protocolo (dict): protocolo -> lista de ICs, na ordem
+            em que os protocolos foram informados.
+        pendentes (iterable): Protocolos que não foram resolvidos (falha ou
+            cancelamento); entram sem ICs e não são gravados no plano.
+    """
+
+    def __init__(self, indices_por_protocolo, pendentes=()):
+        self.indices_por_protocolo = dict(indices_por_protocolo)
+        self.pendentes = set(pendentes)
+
+    @property
+    def protocolos(self):
+        return list(self.indices_por_protocolo)
+
+    def protocolos_por_indice(self):
+        """IC normalizado -> protocolos em que ele aparece."""
+        grafo = {}
+        for protocolo, indices in self.indices_por_protocolo.items():
+            for indice in indices:
+                protocolos = grafo.setdefault(normalizar_indice(indice), [])
+                if protocolo not in protocolos:
+                    protocolos.append(protocolo)
+        return grafo
+
+    def itens(self):
+        """
+        Pares (protocolo, IC) na ordem de coleta.
+
+        Primeiro a coleta de cada IC único, começando pelos que aparecem
+        em mais protocolos (liberam mais relatórios); depois as repetições,
+        que só reaproveitam a coleta e geram o relatório.
+        """
+        grafo = self.protocolos_por_indice()
+        primeiros, repeticoes = [], []
+        for indice, protocolos in grafo.items():
+            primeiros.append((protocolos[0], indice))
+            repeticoes.extend((protocolo, indice) for protocolo in protocolos[1:])
+        primeiros.sort(key=lambda item: -len(grafo[item[1]]))
+        return primeiros + repeticoes
+
+    @property
+    def total(self):
+        """Itens de progresso: um por par (protocolo, IC) ou protocolo sem IC."""
+        vazios = sum(
+            1 for indices in self.indices_por_protocolo.values() if not indices
+        )
+        return len(self.itens()) + vazios
+
+    @staticmethod
+    def carregar(protocolos, pasta=PASTA_PLANOS, ttl_dias=PLANO_LOTE_TTL_DIAS):
+        """
+        Protocolos já resolvidos no plano salvo do mesmo conjunto de
+        protocolos (nova execução ou retomada), dentro da validade.
+
+        Retorna:
+            dict: protocolo -> ICs; vazio se não há plano salvo válido.
+        """
+        caminho = _arquivo_do_plano(protocolos, pasta)
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+            salvo_em = float(conteudo["salvo_em"])
+            resolvidos = dict(conteudo["protocolos"])
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Plano do lote ignorado ({caminho}): {e}")
+            return {}
+        if time.time() - salvo_em > ttl_dias * 86400:
+            return {}
+        # O mesmo protocolo pode ter sido digitado com outra pontuação
+        informados = {normalizar_protocolo(p): p for p in protocolos}
+        return {
+            informados[normalizar_protocolo(protocolo)]: list(indices)
+            for protocolo, indices in resolvidos.items()
+            if normalizar_protocolo(protocolo) in informados
+            and isinstance(indices, list)
+        }
+
+    def salvar(self, pasta=PASTA_PLANOS):
+        """Grava os protocolos resolvidos e o grafo para as próximas execuções."""
+        grafo = self.protocolos_por_indice()
+        conteudo = {
+            "salvo_em": time.time(),
+            "protocolos": {
+                protocolo: indices
+                for protocolo, indices in self.indices_por_protocolo.items()
+                if protocolo not in self.pendentes
+            },
+            "indices_unicos": len(grafo),
+            "indices_repetidos": sum(1 for p in grafo.values() if len(p) > 1),
+        }
+        caminho = _arquivo_do_plano(self.protocolos, pasta)
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            with open(caminho, "w", encoding="utf-8") as f:
+                json.dump(conteudo, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o plano do lote: {e}")
+
+
+def planejar_lote(
+    protocolos,
+    credenciais,
+    pasta_resultados,
+    cancelar_event,
+    atualizar_progresso=None,
+    diario=None,
+    max_workers=LIMITE_SIGEDE,
+):
+    """
+    Resolve todos os protocolos no SIGEDE, em paralelo, antes da coleta
+    dos ICs. Protocolos já resolvidos no plano salvo do mesmo conjunto de
+    protocolos, no diário da pasta (retomada) ou no cache (execução
+    recente) não abrem o SIGEDE.
+
+    Parâmetros:
+        atualizar_progresso (callable, opcional): Recebe (resolvidos, total).
+        max_workers (int): Sessões do SIGEDE simultâneas.
+
+    Retorna:
+        PlanoLote: Grafo protocolo -> ICs (vazio para protocolos que
+            falharam ou foram cancelados).
+    """
+    resolvidos, pendentes = {}, set()
+    lock = threading.Lock()
+
+    # Plano gravado por uma execução anterior com os mesmos protocolos;
+    # protocolos que chegaram ao diário depois dele (plano interrompido)
+    # vêm do diário
+    planejados = PlanoLote.carregar(protocolos)
+
+    def resolver(protocolo):
+        if protocolo in planejados:
+            logger.info(f"Protocolo {protocolo} retomado do plano salvo")
+            return protocolo, planejados[protocolo], True
+
+        if cancelar_event.is_set():
+            return protocolo, [], False
+
+        indices_salvos = diario.indices_capturados(protocolo) if diario else None
+        if indices_salvos is not None:
+            logger.info(f"Protocolo {protocolo} retomado do diário")
+            return protocolo, indices_salvos, True
+
+        if diario:
+            diario.iniciar_protocolo(protocolo)
+        try:
+            indices = processar_protocolo(
+                normalizar_protocolo(protocolo), credenciais, pasta_resultados
+            )
+            if diario:
+                diario.concluir_protocolo(protocolo, indices)
+        except Exception as e:
+            logger.error(f"Erro no protocolo {protocolo}: {e}")
+            if diario:
+                diario.falhar_protocolo(protocolo, e)
+            return protocolo, [], False
+        return protocolo, list(indices or []), True
+
+    faltam = sum(1 for protocolo in protocolos if protocolo not in planejados)
+    logger.info(f"Resolvendo {faltam} de {len(protocolos)} protocolos no SIGEDE")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futuros = [executor.submit(resolver, protocolo) for protocolo in protocolos]
+        for futuro in as_completed(futuros):
+            protocolo, indices, resolvido = futuro.result()
+            with lock:
+                resolvidos[protocolo] = indices
+                if not resolvido:
+                    pendentes.add(protocolo)
+                quantidade = len(resolvidos)
+            if atualizar_progresso:
+                atualizar_progresso(quantidade, len(protocolos))
+
+    plano = PlanoLote(((p, resolvidos.get(p, [])) for p in protocolos), pendentes)
+    grafo = plano.protocolos_por_indice()
+    logger.info(
+        f"Lote planejado: {len(protocolos)} protocolos, {len(grafo)} ICs únicos, "
+        f"{plano.total} itens"
+    )
+    plano.salvar()
+    return plano
@@ -1,13 +1,43 @@
-from utils import logger
-from core import gerar_relatorio
 from .sistemas import Siatu
 from .sistemas import Urbano
 from .sistemas import Sisctm
 from .sistemas import GoogleMaps
 from .sistemas import Sigede
+from .sistemas import Relatorio
+from .grafo import executar_grafo, etapas_pendentes
+from utils import (
+    logger,
+    contador_esperas,
+    cache_indices,
+    armazem_blobs,
+    vincular_arquivo,
+)
 
 import os
 
+# Relatório gerado por protocolo; nunca compartilhado entre pastas
+PREFIXO_RELATORIO = "1. Relatório"
+
+
+def _etapas_do_indice():
+    """Etapas do grafo de um IC, na ordem de declaração."""
+    return [Siatu(), Urbano(), Sisctm(), GoogleMaps(), Relatorio()]
+
+
+def agendar_indices(indices):
+    """
+    Avisa as etapas dos ICs que virão, para que sistemas com consulta em
+    lote (SISCTM) os leiam juntos.
+    """
+    for etapa in _etapas_do_indice():
+        etapa.agendar(indices)
+
+
+def descartar_agendados():
+    """Esquece ICs agendados e não consultados (fim da execução)."""
+    for etapa in _etapas_do_indice():
+        etapa.descartar_agendados()
+
 
 def processar_protocolo(protocolo, credenciais, pasta_resultados):
     """
@@ -18,35 +48,115 @@ def processar_protocolo(protocolo, credenciais, pasta_resultados):
     pasta_protocolo = os.path.join(pasta_resultados, protocolo)
     os.makedirs(pasta_protocolo, exist_ok=True)
 
-    indices = Sigede().executar(protocolo, credenciais, pasta_protocolo)
+    # Protocolo resolvido há pouco (outra execução): ICs, Inteiro Teor e
+    # prints vêm do cache, sem abrir o SIGEDE
+    sigede = Sigede()
+    saidas = cache_indices.obter(sigede.cache, protocolo, pasta_protocolo)
+    if saidas is not None:
+        return saidas["indices"]
+
+    indices = sigede.executar(protocolo, credenciais, pasta_protocolo)
+    # Inteiro Teor vira hard link para o armazém de anexos
+    armazem_blobs.deduplicar_pasta(pasta_protocolo)
+    _registrar_economia(pasta_protocolo, f"protocolo {protocolo}")
     return indices
 
 
-def processar_indice(indice, credenciais, protocolo, pasta_resultados):
+def processar_indice(indice, credenciais, protocolo, pasta_resultados, diario=None):
     """
-    Execução dos módulos SIATU, URBANO e SISCTM (IC)
+    Execução dos módulos SIATU, URBANO e SISCTM (IC) em paralelo
     Execução do módulo Google Maps (Endereço)
     Gera relatório
     Criação da pasta IC
+    Com `diario`, etapas já concluídas em uma execução anterior são puladas
+    """
+    pasta_indice = os.path.join(pasta_resultados, protocolo, indice)
+    os.makedirs(pasta_indice, exist_ok=True)
+
+    # SIATU, URBANO e SISCTM rodam em paralelo; Google Maps aguarda
+    # SIATU/SISCTM e o relatório aguarda todos
+    contexto = {
+        "indice": indice,
+        "credenciais": credenciais,
+        "pasta_indice": pasta_indice,
+    }
+    etapas = _etapas_do_indice()
+
+    registro = diario.do_indice(protocolo, indice) if diario else None
+    if registro:
+        etapas, reaproveitadas = etapas_pendentes(
+            etapas, contexto, registro.concluidas()
+        )
+        contexto.update(reaproveitadas)
+        if not etapas:
+            logger.info(f"IC {indice} já concluído na execução anterior")
+            return contexto
+
+    # Sistemas com resultado recente do mesmo IC (outro protocolo ou outra
+    # execução) são restaurados do cache, sem abrir o navegador
+    for etapa in [e for e in etapas if e.cache]:
+        saidas = cache_indices.obter(etapa.cache, indice, pasta_indice)
+        if saidas is None:
+            continue
+        contexto.update(saidas)
+        etapas.remove(etapa)
+        if registro:
+            registro.iniciar(type(etapa).__name__)
+            registro.concluir(type(etapa).__name__, saidas)
+
+    try:
+        executar_grafo(etapas, contexto, diario=registro)
+    finally:
+        # Anexos repetidos entre execuções viram hard links para o armazém
+        armazem_blobs.deduplicar_pasta(pasta_indice, ignorar=(PREFIXO_RELATORIO,))
+        _registrar_economia(pasta_indice, f"IC {indice}")
+    return contexto
+
+
+def reaproveitar_indice(
+    indice, credenciais, protocolo, pasta_resultados, origem, diario=None
+):
+    """
+    IC já processado por outro protocolo do mesmo lote: liga os arquivos
+    da pasta de origem na pasta deste protocolo e gera apenas o relatório.
+
+    Parâmetros:
+        origem (dict): Contexto devolvido por `processar_indice` no outro
+            protocolo.
+
+    Retorna:
+        int: Número de etapas de coleta reaproveitadas.
     """
     pasta_indice = os.path.join(pasta_resultados, protocolo, indice)
     os.makedirs(pasta_indice, exist_ok=True)
 
-    dados_pb, anexos_count = Siatu().executar(indice, credenciais, pasta_indice)
-    dados_projeto, projetos_count = Urbano().executar(indice, credenciais, pasta_indice)
-    dados_sisctm = Sisctm().executar(indice, credenciais, pasta_indice)
-    GoogleMaps().executar(indice, dados_sisctm, dados_pb, pasta_indice)
-
-    pdf_path = os.path.join(pasta_indice, f"1. Relatório de Triagem - {indice}.pdf")
-    gerar_relatorio(
-        indice_cadastral=indice,
-        anexos_count=anexos_count,
-        projetos_count=projetos_count,
-        pasta_anexos=pasta_indice,
-        prps_trabalhador=credenciais["usuario"],
-        nome_pdf=pdf_path,
-        dados_planta=dados_pb,
-        dados_projeto=dados_projeto,
-        dados_sisctm=dados_sisctm,
+    for entrada in os.scandir(origem["pasta_indice"]):
+        if entrada.is_file() and not entrada.name.startswith(PREFIXO_RELATORIO):
+            vincular_arquivo(entrada.path, os.path.join(pasta_indice, entrada.name))
+
+    contexto = {
+        "indice": indice,
+        "credenciais": credenciais,
+        "pasta_indice": pasta_indice,
+    }
+    registro = diario.do_indice(protocolo, indice) if diario else None
+    coleta = [e for e in _etapas_do_indice() if not isinstance(e, Relatorio)]
+    for etapa in coleta:
+        saidas = {nome: origem[nome] for nome in etapa.saidas}
+        contexto.update(saidas)
+        if registro:
+            registro.iniciar(type(etapa).__name__)
+            registro.concluir(type(etapa).__name__, saidas)
+
+    executar_grafo([Relatorio()], contexto, diario=registro)
+    logger.info(f"IC {indice} reaproveitado de outro protocolo do lote")
+    return len(coleta)
+
+
+def _registrar_economia(pasta, descricao):
+    """Registra no log o tempo economizado pelas esperas por evento."""
+    economia = contador_esperas.consumir(pasta)
+    logger.info(
+        f"Esperas por evento economizaram {economia:.1f}s ({descricao}) "
+        "em relação às pausas fixas"
     )
-    logger.info(f"Relatório gerado")
@@ -1,51 +1,163 @@
 from pipeline.interface import SistemaAutomacao
 from core import SiatuAuto, UrbanoAuto, SisctmAuto, GoogleMapsAuto, SigedeAuto
-from utils import driver_context, logger, retry
+from core import gerar_relatorio
+from core.sisctm_wfs import servico_feicoes
+from utils import (
+    pool_drivers,
+    armazem_sessoes,
+    clientes_http,
+    politica_timeouts,
+    logger,
+    retry,
+)
+from utils.config import LIMITE_SIATU, LIMITE_URBANO, LIMITE_SISCTM, LIMITE_GOOGLE
+from utils.config import SISCTM_WFS, SISCTM_PRINTS
+
+import os
+import threading
+
+
+def _autenticar(sistema, auto, driver, usuario):
+    """
+    Acessa o sistema reaproveitando a sessão salva no armazém; faz login
+    apenas quando não há sessão ou ela expirou. A sessão autenticada é
+    copiada para o cliente HTTP do sistema.
+    """
+    with politica_timeouts.etapa(driver, f"{sistema}.login"):
+        injetada = armazem_sessoes.injetar(driver, sistema, usuario)
+        if not auto.acessar():
+            return False
+
+        if injetada:
+            if auto.sessao_ativa():
+                logger.info(f"Sessão do {sistema} reaproveitada, login dispensado")
+                clientes_http.sincronizar(driver, sistema)
+                return True
+            armazem_sessoes.invalidar(sistema, usuario)
+
+        # Novo login: o cliente HTTP da sessão anterior não vale mais
+        clientes_http.invalidar(driver, sistema)
+        if not auto.login():
+            return False
+        if auto.sessao_ativa():
+            armazem_sessoes.capturar(driver, sistema, usuario)
+            clientes_http.sincronizar(driver, sistema)
+        return True
+
+
+def _automacao_quente(sessao, sistema, usuario, criar, pasta_download):
+    """
+    Objeto de automação guardado numa sessão quente do pool. Enquanto a
+    página continuar logada, só troca a pasta do item; senão, cria outro
+    objeto e faz o login de novo.
+
+    Parâmetros:
+        sessao (_SessaoPool): Sessão emprestada por `emprestar_quente`.
+        criar (callable): Recebe o driver e cria o objeto de automação.
+
+    Retorna:
+        Objeto de automação pronto, ou None se a autenticação falhou.
+    """
+    auto = sessao.estado.pop(sistema, None)
+    if auto is not None:
+        if auto.sessao_pronta():
+            auto.preparar(pasta_download)
+            sessao.estado[sistema] = auto
+            logger.info(f"Sessão do {sistema} mantida aberta, login dispensado")
+            return auto
+        logger.info(f"Sessão aberta do {sistema} perdida, refazendo login")
+        clientes_http.invalidar(sessao.driver, sistema)
+
+    auto = criar(sessao.driver)
+    if not _autenticar(sistema, auto, sessao.driver, usuario):
+        return None
+    sessao.estado[sistema] = auto
+    return auto
 
 
 class Sigede(SistemaAutomacao):
+    saidas = ("indices",)
+    cache = "SIGEDE"
+
     def executar(self, protocolo, credenciais, pasta_protocolo):
         indices = []
 
-        with driver_context(pasta_protocolo) as driver:
-            sigede = SigedeAuto(
-                driver=driver,
-                url="https://cas.pbh.gov.br/cas/login?service=https%3A%2F%2Fsigede.pbh.gov.br%2Fsigede%2Flogin%2Fcas",
-                usuario=credenciais["usuario_sigede"],
-                senha=credenciais["senha_sigede"],
-                pasta_download=pasta_protocolo,
+        usuario = credenciais["usuario_sigede"]
+        # Uma sessão logada atende os protocolos do lote em sequência
+        with pool_drivers.emprestar_quente(
+            ("SIGEDE", usuario), pasta_protocolo
+        ) as sessao:
+            sigede = _automacao_quente(
+                sessao,
+                "SIGEDE",
+                usuario,
+                lambda driver: SigedeAuto(
+                    driver=driver,
+                    url="https://cas.pbh.gov.br/cas/login?service=https%3A%2F%2Fsigede.pbh.gov.br%2Fsigede%2Flogin%2Fcas",
+                    usuario=usuario,
+                    senha=credenciais["senha_sigede"],
+                    pasta_download=pasta_protocolo,
+                ),
+                pasta_protocolo,
             )
-
-            if sigede.acessar() and sigede.login() and sigede.navegar(protocolo):
+            if sigede and sigede.navegar(protocolo):
                 indices = sigede.verificar_tabela()
+                if indices:
+                    self.guardar_no_cache(protocolo, indices, sigede.arquivos)
 
         logger.info(f"SIGEDE concluído para protocolo {protocolo}")
         return indices
 
 
 class Siatu(SistemaAutomacao):
+    entradas = ("indice", "credenciais", "pasta_indice")
+    saidas = ("dados_pb", "anexos_count")
+    limite = threading.BoundedSemaphore(LIMITE_SIATU)
+    cache = "SIATU"
 
     def executar(self, indice, credenciais, pasta_indice):
         dados_pb = {}
         anexos_count = 0
         add_config = True
 
+        usuario = credenciais["usuario"]
+
+        # A sessão fica na página de consulta entre ICs; uma falha descarta
+        # o navegador e a nova tentativa começa do login
         @retry(max_retries=4, delay=5, exceptions=(Exception,))
         def fluxo_siatu():
-            with driver_context(pasta_indice, add_config=add_config) as driver:
-                siatu = SiatuAuto(
-                    driver=driver,
-                    url="https://siatu-producao.pbh.gov.br/seguranca/login?service=https%3A%2F%2Fsiatu-producao.pbh.gov.br%2Faction%2Fmenu",
-                    usuario=credenciais["usuario"],
-                    senha=credenciais["senha"],
-                    pasta_download=pasta_indice,
+            with pool_drivers.emprestar_quente(
+                ("SIATU", usuario), pasta_indice, add_config=add_config
+            ) as sessao:
+                driver = sessao.driver
+                siatu = _automacao_quente(
+                    sessao,
+                    "SIATU",
+                    usuario,
+                    lambda driver: SiatuAuto(
+                        driver=driver,
+                        url="https://siatu-producao.pbh.gov.br/seguranca/login?service=https%3A%2F%2Fsiatu-producao.pbh.gov.br%2Faction%2Fmenu",
+                        usuario=usuario,
+                        senha=credenciais["senha"],
+                        pasta_download=pasta_indice,
+                    ),
+                    pasta_indice,
                 )
-
-                if siatu.acessar() and siatu.login() and siatu.navegar():
-                    return siatu.planta_basica(indice), siatu.download_anexos(indice)
+                if siatu is None:
+                    return None
+                if siatu.url_consulta is None:
+                    with politica_timeouts.etapa(driver, "SIATU.navegar"):
+                        if not siatu.navegar():
+                            return None
+                # Padrão curto: o SIATU às vezes trava ao recarregar a consulta
+                with politica_timeouts.etapa(driver, "SIATU.planta_basica", padrao=10):
+                    dados = siatu.planta_basica(indice)
+                with politica_timeouts.etapa(driver, "SIATU.anexos"):
+                    return dados, siatu.download_anexos(indice), siatu.arquivos
 
         try:
-            dados_pb, anexos_count = fluxo_siatu()
+            dados_pb, anexos_count, arquivos = fluxo_siatu()
+            self.guardar_no_cache(indice, (dados_pb, anexos_count), arquivos)
         except Exception as e:
             logger.error(f"Falha no fluxo do SIATU para índice {indice}: {e}")
 
@@ -54,10 +166,15 @@ class Siatu(SistemaAutomacao):
 
 
 class Urbano(SistemaAutomacao):
+    entradas = ("indice", "credenciais", "pasta_indice")
+    saidas = ("dados_projeto", "projetos_count")
+    limite = threading.BoundedSemaphore(LIMITE_URBANO)
+    cache = "URBANO"
+
     def executar(self, indice, credenciais, pasta_indice):
         dados_projeto = {}
         projetos_count = 0
-        with driver_context(pasta_indice) as driver:
+        with pool_drivers.emprestar(pasta_indice) as driver:
             urbano = UrbanoAuto(
                 driver=driver,
                 url="https://urbano.pbh.gov.br/edificacoes/#/",
@@ -66,33 +183,83 @@ class Urbano(SistemaAutomacao):
                 pasta_download=pasta_indice,
             )
 
-            if urbano.acessar() and urbano.login():
-                projetos_count, dados_projeto = urbano.download_projeto(indice)
+            if _autenticar("URBANO", urbano, driver, credenciais["usuario"]):
+                with politica_timeouts.etapa(driver, "URBANO.projeto"):
+                    projetos_count, dados_projeto = urbano.download_projeto(indice)
+                self.guardar_no_cache(
+                    indice, (dados_projeto, projetos_count), urbano.arquivos
+                )
 
         logger.info(f"Urbano concluído para índice {indice}")
         return dados_projeto, projetos_count
 
 
 class Sisctm(SistemaAutomacao):
+    entradas = ("indice", "credenciais", "pasta_indice")
+    saidas = ("dados_sisctm",)
+    limite = threading.BoundedSemaphore(LIMITE_SISCTM)
+    cache = "SISCTM"
+
+    @classmethod
+    def agendar(cls, indices):
+        if SISCTM_WFS:
+            servico_feicoes.agendar(indices)
+
+    @classmethod
+    def descartar_agendados(cls):
+        servico_feicoes.descartar_agendados()
+
     def executar(self, indice, credenciais, pasta_indice):
         dados_sisctm = {}
-        with driver_context(pasta_indice) as driver:
-            sisctm = SisctmAuto(
-                driver=driver,
-                url="https://acesso.pbh.gov.br/auth/realms/PBH/protocol/openid-connect/auth?client_id=sisctm-mapa&redirect_uri=https%3A%2F%2Fsisctm.pbh.gov.br%2Fmapa%2Flogin",
-                usuario=credenciais["usuario"],
-                senha=credenciais["senha"],
-                pasta_download=pasta_indice,
+        usuario = credenciais["usuario"]
+        # O mapa fica aberto entre ICs: login e camadas uma vez por sessão,
+        # depois só o filtro muda
+        with pool_drivers.emprestar_quente(("SISCTM", usuario), pasta_indice) as sessao:
+            driver = sessao.driver
+            sisctm = _automacao_quente(
+                sessao,
+                "SISCTM",
+                usuario,
+                lambda driver: SisctmAuto(
+                    driver=driver,
+                    url="https://acesso.pbh.gov.br/auth/realms/PBH/protocol/openid-connect/auth?client_id=sisctm-mapa&redirect_uri=https%3A%2F%2Fsisctm.pbh.gov.br%2Fmapa%2Flogin",
+                    usuario=usuario,
+                    senha=credenciais["senha"],
+                    pasta_download=pasta_indice,
+                ),
+                pasta_indice,
             )
+            if sisctm:
+                consultados = None
+                if SISCTM_WFS:
+                    with politica_timeouts.etapa(driver, "SISCTM.feicoes"):
+                        consultados = sisctm.consultar_feicoes(indice)
 
-            if sisctm.login() and sisctm.ativar_camadas(indice):
-                dados_sisctm = sisctm.capturar_areas()
+                # A interface só é percorrida para os prints ou quando o
+                # serviço de feições não respondeu (e então é aprendido)
+                ativadas = consultados is not None
+                if consultados is None or SISCTM_PRINTS:
+                    with politica_timeouts.etapa(driver, "SISCTM.ativar_camadas"):
+                        ativadas = sisctm.ativar_camadas(indice, prints=SISCTM_PRINTS)
+                if consultados is not None:
+                    dados_sisctm = consultados
+                elif ativadas:
+                    with politica_timeouts.etapa(driver, "SISCTM.capturar_areas"):
+                        dados_sisctm = sisctm.capturar_areas()
+                    if SISCTM_WFS:
+                        sisctm.aprender_feicoes(indice)
+                if ativadas:
+                    self.guardar_no_cache(indice, dados_sisctm, sisctm.arquivos)
 
         logger.info(f"SISCTM concluído para índice {indice}")
         return dados_sisctm
 
 
 class GoogleMaps(SistemaAutomacao):
+    entradas = ("indice", "dados_sisctm", "dados_pb", "pasta_indice")
+    saidas = ("google_concluido",)
+    limite = threading.BoundedSemaphore(LIMITE_GOOGLE)
+
     def executar(self, indice, dados_sisctm, dados_pb, pasta_indice):
         if dados_sisctm or dados_pb:
             endereco = (
@@ -101,7 +268,7 @@ class GoogleMaps(SistemaAutomacao):
                 or "Não encontrado"
             )
 
-        with driver_context(pasta_indice) as driver:
+        with pool_drivers.emprestar(pasta_indice) as driver:
             google = GoogleMapsAuto(
                 driver,
                 url="https://www.google.com/maps/",
@@ -112,3 +279,46 @@ class GoogleMaps(SistemaAutomacao):
                 google.navegar()
 
         logger.info(f"Google Maps concluído para índice {indice}")
+        return True
+
+
+class Relatorio(SistemaAutomacao):
+    entradas = (
+        "indice",
+        "credenciais",
+        "pasta_indice",
+        "dados_pb",
+        "anexos_count",
+        "dados_projeto",
+        "projetos_count",
+        "dados_sisctm",
+        "google_concluido",
+    )
+    saidas = ("relatorio",)
+
+    def executar(
+        self,
+        indice,
+        credenciais,
+        pasta_indice,
+        dados_pb,
+        anexos_count,
+        dados_projeto,
+        projetos_count,
+        dados_sisctm,
+        google_concluido=None,
+    ):
+        pdf_path = os.path.join(pasta_indice, f"1. Relatório de Triagem - {indice}.pdf")
+        gerar_relatorio(
+            indice_cadastral=indice,
+            anexos_count=anexos_count,
+            projetos_count=projetos_count,
+            pasta_anexos=pasta_indice,
+            prps_trabalhador=credenciais["usuario"],
+            nome_pdf=pdf_path,
+            dados_planta=dados_pb,
+            dados_projeto=dados_projeto,
+            dados_sisctm=dados_sisctm,
+        )
+        logger.info(f"Relatório gerado")
+        return pdf_path
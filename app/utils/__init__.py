@@ -1,6 +1,7 @@
 from .logger import logger
 from .pastas import abrir_pasta, criar_pasta_resultados
-from .web_driver import driver_context
+from .web_driver import pool_drivers
+from .chromedriver import obter_servico, encerrar_servico
 from .relatorio import (
     normalizar_nome,
     extrair_elementos_do_endereco_para_comparacao,
@@ -8,15 +9,68 @@ from .relatorio import (
     formatar_area,
 )
 from .decorators import retry
+from .sessoes import armazem_sessoes, aguardar_autenticacao
+from .rede import MonitorRede, log_performance
+from .downloads import rastreador_downloads
+from .timeouts import politica_timeouts, EsperaAdaptativa
+from .diario import DiarioExecucao
+from .cache_ic import cache_indices
+from .blobs import armazem_blobs, vincular_arquivo
+from .manifestos import ManifestoAnexos
+from .clientes_http import clientes_http, SessaoExpirada
+from .extracao import Campo, TEXTO, TEXTOS, LINHAS, extrair
+from .esperas import (
+    Esperas,
+    contador_esperas,
+    pagina_carregada,
+    dom_estavel,
+    xhr_ocioso,
+    url_mudou,
+    nova_janela,
+    elemento_estavel,
+    conteudo_atualizado,
+    todas,
+)
 
 __all__ = [
     "logger",
     "abrir_pasta",
-    "driver_context",
+    "pool_drivers",
+    "obter_servico",
+    "encerrar_servico",
     "criar_pasta_resultados",
     "normalizar_nome",
     "extrair_elementos_do_endereco_para_comparacao",
     "parse_area",
     "formatar_area",
     "retry",
+    "armazem_sessoes",
+    "aguardar_autenticacao",
+    "Esperas",
+    "contador_esperas",
+    "pagina_carregada",
+    "dom_estavel",
+    "xhr_ocioso",
+    "url_mudou",
+    "nova_janela",
+    "elemento_estavel",
+    "conteudo_atualizado",
+    "todas",
+    "MonitorRede",
+    "log_performance",
+    "rastreador_downloads",
+    "politica_timeouts",
+    "EsperaAdaptativa",
+    "DiarioExecucao",
+    "cache_indices",
+    "armazem_blobs",
+    "vincular_arquivo",
+    "ManifestoAnexos",
+    "clientes_http",
+    "SessaoExpirada",
+    "Campo",
+    "TEXTO",
+    "TEXTOS",
+    "LINHAS",
+    "extrair",
 ]
@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from .logger import logger
+from .config import PASTA_BLOBS, PASTA_DADOS
+
+# Documentos baixados que se repetem entre execuções (prints não entram)
+EXTENSOES_BLOB = (".pdf", ".dwf", ".dwg", ".jpg", ".jpeg", ".tif", ".tiff", ".zip")
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do arquivo, lido em blocos (PDFs grandes não vão inteiros à memória)."""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _temporario(caminho):
+    """Nome temporário na mesma pasta do destino, para trocas atômicas."""
+    return f"{caminho}.{uuid.uuid4().hex}.tmp"
+
+
+def vincular_arquivo(origem, destino):
+    """Cria `destino` como hard link de `origem` (ou cópia, se não suportado)."""
+    temporario = _temporario(destino)
+    try:
+        os.link(origem, temporario)
+    except OSError:
+        shutil.copy2(origem, temporario)
+    os.replace(temporario, destino)
+
+
+class ArmazemBlobs:
+    """
+    Armazém de arquivos endereçados pelo conteúdo (SHA-256 → arquivo).
+
+    Cada documento é gravado uma única vez no armazém; as pastas de
+    resultados recebem hard links para ele (ou cópias, quando o sistema de
+    arquivos não aceita hard links), de modo que os caminhos usados pelo
+    relatório continuam válidos.
+
+    Parâmetros:
+        pasta (str): Pasta raiz do armazém.
+    """
+
+    def __init__(self, pasta=PASTA_BLOBS):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+
+    def caminho_blob(self, digest):
+        return os.path.join(self.pasta, digest[:2], digest)
+
+    def guardar(self, caminho):
+        """
+        Guarda o arquivo no armazém e troca o original por um hard link.
+
+        Retorna:
+            str: Hash do conteúdo.
+        """
+        return self._guardar(caminho)[0]
+
+    def _guardar(self, caminho):
+        """Retorna o hash e se o conteúdo já estava no armazém."""
+        digest = hash_arquivo(caminho)
+        blob = self.caminho_blob(digest)
+
+        with self._lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                temporario = _temporario(blob)
+                try:
+                    os.link(caminho, temporario)
+                except OSError:
+                    shutil.copy2(caminho, temporario)
+                os.replace(temporario, blob)
+                return digest, False
+
+        # Conteúdo já armazenado: o arquivo vira um link para o blob existente
+        if os.path.samefile(caminho, blob):
+            return digest, False
+        vincular_arquivo(blob, caminho)
+        return digest, True
+
+    def vincular(self, digest, destino):
+        """
+        Coloca o blob em `destino` (hard link ou cópia).
+
+        Retorna:
+            bool: False se o blob não existe mais no armazém.
+        """
+        blob = self.caminho_blob(digest)
+        if not os.path.isfile(blob):
+            return False
+        os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+        vincular_arquivo(blob, destino)
+        return True
+
+    def deduplicar_pasta(self, pasta, extensoes=EXTENSOES_BLOB, ignorar=()):
+        """
+        Move para o armazém os documentos de uma pasta de resultados.
+
+        Parâmetros:
+            extensoes (tuple): Extensões consideradas.
+            ignorar (tuple): Prefixos de nomes mantidos fora do armazém.
+        """
+        economia = 0
+        for entrada in os.scandir(pasta):
+            nome = entrada.name
+            if (
+                not entrada.is_file()
+                or not nome.lower().endswith(extensoes)
+                or nome.startswith(ignorar)
+            ):
+                continue
+            try:
+                _, reaproveitado = self._guardar(entrada.path)
+                if reaproveitado:
+                    economia += os.path.getsize(entrada.path)
+            except OSError as e:
+                logger.warning(f"Arquivo mantido fora do armazém ({nome}): {e}")
+        if economia:
+            logger.info(
+                f"Anexos repetidos reaproveitados em {pasta}: {economia / 1e6:.1f} MB"
+            )
+
+    def referencias(self):
+        """
+        Hashes referenciados por registros do programa (cache de ICs e
+        manifestos de anexos).
+        """
+        hashes = set()
+        pasta_cache = os.path.join(PASTA_DADOS, "cache_ic")
+        for raiz, _, arquivos in os.walk(pasta_cache):
+            if "dados.json" not in arquivos:
+                continue
+            try:
+                with open(os.path.join(raiz, "dados.json"), encoding="utf-8") as f:
+                    entrada = json.load(f)
+                if isinstance(entrada.get("arquivos"), dict):
+                    hashes.update(entrada["arquivos"].values())
+            except (OSError, ValueError):
+                continue
+
+        pasta_manifestos = os.path.join(PASTA_DADOS, "manifestos")
+        for raiz, _, arquivos in os.walk(pasta_manifestos):
+            for nome in arquivos:
+                if not nome.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(raiz, nome), encoding="utf-8") as f:
+                        hashes.update(item["hash"] for item in json.load(f).values())
+                except (OSError, ValueError, KeyError, AttributeError):
+                    continue
+        return hashes
+
+    def gc(self, simular=False):
+        """
+        Remove os blobs que nada referencia: sem hard links em pastas de
+        resultados (st_nlink == 1) e fora dos registros do programa.
+
+        Parâmetros:
+            simular (bool): Apenas informa o que seria removido.
+
+        Retorna:
+            tuple[int, int]: Blobs removidos e bytes liberados.
+        """
+        referenciados = self.referencias()
+        removidos, liberados = 0, 0
+        if not os.path.isdir(self.pasta):
+            return removidos, liberados
+
+        for prefixo in os.scandir(self.pasta):
+            if not prefixo.is_dir():
+                continue
+            for blob in os.scandir(prefixo.path):
+                if blob.name.endswith(".tmp"):
+                    continue
+                # DirEntry.stat() não informa st_nlink no Windows
+                info = os.stat(blob.path)
+                if info.st_nlink > 1 or blob.name in referenciados:
+                    continue
+                if not simular:
+                    try:
+                        os.remove(blob.path)
+                    except OSError as e:
+                        logger.warning(f"Blob não removido ({blob.name}): {e}")
+                        continue
+                removidos += 1
+                liberados += info.st_size
+        return removidos, liberados
+
+
+armazem_blobs = ArmazemBlobs()
+
+
+def _main():
+    parser = argparse.ArgumentParser(description="Armazém de anexos da triagem")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    gc = comandos.add_parser("gc", help="Remove blobs que nada referencia")
+    gc.add_argument(
+        "--simular", action="store_true", help="Apenas lista o que seria removido"
+    )
+    args = parser.parse_args()
+
+    if args.comando == "gc":
+        removidos, liberados = armazem_blobs.gc(simular=args.simular)
+        acao = "seriam removidos" if args.simular else "removidos"
+        print(f"{removidos} blobs {acao} ({liberados / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    _main()
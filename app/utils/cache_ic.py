@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+
+from .logger import logger
+from .blobs import armazem_blobs
+from .config import (
+    PASTA_DADOS,
+    CACHE_IC_TTL_SIATU,
+    CACHE_IC_TTL_URBANO,
+    CACHE_IC_TTL_SISCTM,
+    CACHE_IC_TTL_SIGEDE,
+)
+
+PASTA_CACHE = os.path.join(PASTA_DADOS, "cache_ic")
+
+TTL_DIAS = {
+    "SIATU": CACHE_IC_TTL_SIATU,
+    "URBANO": CACHE_IC_TTL_URBANO,
+    "SISCTM": CACHE_IC_TTL_SISCTM,
+    # Por protocolo: ICs vinculados, Inteiro Teor e prints da pesquisa
+    "SIGEDE": CACHE_IC_TTL_SIGEDE,
+}
+
+
+class CacheIndices:
+    """
+    Cache local dos resultados de cada sistema por IC.
+
+    Cada entrada guarda as saídas da etapa (dados_pb, dados_projeto,
+    dados_sisctm...), os hashes dos arquivos baixados/capturados (guardados
+    no armazém de blobs) e a data da coleta. Enquanto a entrada estiver
+    dentro da validade do sistema, o IC que reaparece em outro protocolo
+    (ou em outra execução) reaproveita o resultado sem abrir o navegador.
+
+    Parâmetros:
+        pasta (str): Pasta raiz do cache.
+        ttl_dias (dict): Validade das entradas, em dias, por sistema.
+    """
+
+    def __init__(self, pasta=PASTA_CACHE, ttl_dias=TTL_DIAS):
+        self.pasta = pasta
+        self.ttl_dias = ttl_dias
+        self._estatisticas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _lock_da_entrada(self, sistema, indice):
+        with self._lock:
+            return self._locks.setdefault((sistema, indice), threading.Lock())
+
+    def _contar(self, sistema, evento):
+        with self._lock:
+            contagem = self._estatisticas.setdefault(
+                sistema, {"acertos": 0, "falhas": 0}
+            )
+            contagem[evento] += 1
+
+    def _pasta_entrada(self, sistema, indice):
+        return os.path.join(self.pasta, sistema, indice)
+
+    def obter(self, sistema, indice, pasta_destino):
+        """
+        Restaura a entrada do IC em `pasta_destino`, se válida.
+
+        Retorna:
+            dict | None: Saídas da etapa, ou None se não houver entrada válida.
+        """
+        ttl = self.ttl_dias.get(sistema, 0) * 86400
+        if ttl <= 0:
+            return None
+
+        pasta_entrada = self._pasta_entrada(sistema, indice)
+        with self._lock_da_entrada(sistema, indice):
+            try:
+                with open(
+                    os.path.join(pasta_entrada, "dados.json"), "r", encoding="utf-8"
+                ) as f:
+                    entrada = json.load(f)
+            except (OSError, ValueError):
+                self._contar(sistema, "falhas")
+                return None
+
+            if time.time() - entrada["capturado_em"] > ttl:
+                self._contar(sistema, "falhas")
+                return None
+
+            try:
+                restaurados = all(
+                    armazem_blobs.vincular(digest, os.path.join(pasta_destino, nome))
+                    for nome, digest in entrada["arquivos"].items()
+                )
+            except (OSError, AttributeError) as e:
+                logger.warning(f"Cache do {sistema} para IC {indice} ignorado: {e}")
+                restaurados = False
+            if not restaurados:
+                self._contar(sistema, "falhas")
+                return None
+
+        self._contar(sistema, "acertos")
+        logger.info(f"{sistema} do IC {indice} reaproveitado do cache")
+        return entrada["saidas"]
+
+    def salvar(self, sistema, indice, saidas, arquivos):
+        """
+        Grava as saídas e guarda no armazém de blobs os arquivos gerados.
+
+        Parâmetros:
+            saidas (dict): Saídas da etapa, pelo nome declarado em `saidas`.
+            arquivos (list[str]): Caminhos dos arquivos gerados.
+        """
+        if self.ttl_dias.get(sistema, 0) <= 0:
+            return
+
+        pasta_entrada = self._pasta_entrada(sistema, indice)
+        with self._lock_da_entrada(sistema, indice):
+            try:
+                hashes = {
+                    os.path.basename(caminho): armazem_blobs.guardar(caminho)
+                    for caminho in dict.fromkeys(arquivos)
+                    if os.path.isfile(caminho)
+                }
+                entrada = {
+                    "saidas": saidas,
+                    "arquivos": hashes,
+                    "capturado_em": time.time(),
+                }
+                os.makedirs(pasta_entrada, exist_ok=True)
+                caminho_dados = os.path.join(pasta_entrada, "dados.json")
+                with open(caminho_dados + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(entrada, f, ensure_ascii=False, default=str)
+                os.replace(caminho_dados + ".tmp", caminho_dados)
+            except OSError as e:
+                logger.warning(f"Não foi possível salvar o cache do {sistema}: {e}")
+
+    def registrar_estatisticas(self):
+        """Registra no log os acertos e falhas do cache na execução."""
+        with self._lock:
+            estatisticas = {s: dict(c) for s, c in self._estatisticas.items()}
+            self._estatisticas.clear()
+
+        for sistema, contagem in sorted(estatisticas.items()):
+            total = contagem["acertos"] + contagem["falhas"]
+            logger.info(
+                f"Cache de ICs {sistema}: {contagem['acertos']}/{total} acertos"
+            )
+
+
+cache_indices = CacheIndices()
@@ -0,0 +1,152 @@
+from selenium.webdriver.chrome.service import Service
+
+from datetime import datetime, timedelta
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+from .logger import logger
+from .config import PASTA_DADOS, CHROMEDRIVER_OFFLINE, CHROMEDRIVER_VALIDADE_DIAS
+
+ARQUIVO_CACHE = os.path.join(PASTA_DADOS, "chromedriver.json")
+
+_lock = threading.Lock()
+_servico = None
+
+
+def _ler_cache():
+    """Lê o caminho e versão do chromedriver salvos em disco."""
+    try:
+        with open(ARQUIVO_CACHE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if os.path.isfile(cache.get("caminho", "")):
+            return cache
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _salvar_cache(caminho, versao):
+    """Salva o caminho e versão do chromedriver resolvido."""
+    os.makedirs(PASTA_DADOS, exist_ok=True)
+    cache = {
+        "caminho": caminho,
+        "versao": versao,
+        "resolvido_em": datetime.now().isoformat(timespec="seconds"),
+    }
+    with open(ARQUIVO_CACHE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    return cache
+
+
+def _versao(caminho):
+    """Obtém a versão informada pelo binário do chromedriver."""
+    try:
+        saida = subprocess.run(
+            [caminho, "--version"], capture_output=True, text=True, timeout=10
+        ).stdout
+        return saida.split()[1] if saida else None
+    except Exception:
+        return None
+
+
+def _cache_valido(cache):
+    """Indica se o cache ainda está dentro do prazo de validade."""
+    try:
+        resolvido_em = datetime.fromisoformat(cache["resolvido_em"])
+    except (KeyError, ValueError):
+        return False
+    return datetime.now() - resolvido_em < timedelta(days=CHROMEDRIVER_VALIDADE_DIAS)
+
+
+def resolver_chromedriver(offline=CHROMEDRIVER_OFFLINE, forcar=False):
+    """
+    Resolve o caminho do chromedriver, consultando a rede o mínimo possível.
+
+    - Usa o caminho salvo em disco enquanto estiver válido.
+    - No modo offline nunca acessa a rede: usa o cache (mesmo vencido)
+      ou um chromedriver disponível no PATH.
+    - Se a consulta online falhar, recorre ao cache existente.
+
+    Parâmetros:
+        offline (bool): Não acessar a rede.
+        forcar (bool): Ignora o prazo de validade do cache.
+    """
+    cache = _ler_cache()
+
+    if cache and not forcar and (offline or _cache_valido(cache)):
+        logger.info(f"Chromedriver em cache: versão {cache['versao']}")
+        return cache["caminho"]
+
+    if offline:
+        caminho = shutil.which("chromedriver")
+        if not caminho:
+            raise RuntimeError(
+                "Modo offline: nenhum chromedriver em cache ou no PATH do sistema."
+            )
+        logger.info("Chromedriver encontrado no PATH (modo offline)")
+        return _salvar_cache(caminho, _versao(caminho))["caminho"]
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        caminho = ChromeDriverManager().install()
+    except Exception as e:
+        if cache:
+            logger.warning(f"Falha ao consultar chromedriver online, usando cache: {e}")
+            return cache["caminho"]
+        raise
+
+    cache = _salvar_cache(caminho, _versao(caminho))
+    logger.info(f"Chromedriver resolvido: versão {cache['versao']}")
+    return caminho
+
+
+class ServicoCompartilhado(Service):
+    """
+    Serviço chromedriver único, reaproveitado por todas as sessões da execução.
+
+    `start()` só inicia o processo na primeira chamada e `stop()` é ignorado,
+    para que `driver.quit()` não derrube as demais sessões. O processo é
+    encerrado por `encerrar()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_inicio = threading.Lock()
+
+    def start(self):
+        with self._lock_inicio:
+            processo = getattr(self, "process", None)
+            if processo is not None and processo.poll() is None:
+                return
+            super().start()
+            logger.info(f"Serviço chromedriver iniciado (PID {self.process.pid})")
+
+    def stop(self):
+        pass
+
+    def encerrar(self):
+        """Encerra de fato o processo do chromedriver."""
+        super().stop()
+
+
+def obter_servico():
+    """Retorna o serviço chromedriver compartilhado, criando-o se necessário."""
+    global _servico
+    with _lock:
+        if _servico is None:
+            _servico = ServicoCompartilhado(resolver_chromedriver())
+        return _servico
+
+
+def encerrar_servico():
+    """Encerra o serviço chromedriver compartilhado, se existir."""
+    global _servico
+    with _lock:
+        if _servico is not None:
+            _servico.encerrar()
+            logger.info("Serviço chromedriver encerrado.")
+            _servico = None
@@ -0,0 +1,290 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from urllib.parse import unquote, urlparse
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from .logger import logger
+from .config import HTTP_CONEXOES_POR_HOST, HTTP_TENTATIVAS, HTTP_TIMEOUT
+
+# Trechos de URL das páginas de login (CAS, Keycloak e login próprio do
+# SIATU); um redirecionamento para elas indica sessão expirada
+MARCADORES_LOGIN = ("/cas/login", "openid-connect/auth", "/seguranca/login")
+
+_NOME_ANEXO = re.compile(r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", re.IGNORECASE)
+
+
+class SessaoExpirada(Exception):
+    """O servidor recusou a sessão HTTP; é preciso sincronizar com o navegador."""
+
+
+class ConteudoInesperado(Exception):
+    """O servidor respondeu com uma página no lugar do arquivo pedido."""
+
+
+def _e_pagina(tipo, inicio):
+    """Indica se a resposta é uma página HTML (pelo Content-Type ou pelo início)."""
+    if tipo.split(";")[0].strip().lower() in ("text/html", "application/xhtml+xml"):
+        return True
+    inicio = inicio.lstrip().lower()
+    return inicio.startswith((b"<!doctype html", b"<html"))
+
+
+class ClienteHttp:
+    """
+    Sessão HTTP (requests) de um sistema, autenticada com os cookies do
+    navegador em que foi feito o login.
+
+    As conexões ficam abertas entre requisições (keep-alive), limitadas a
+    `conexoes` por host, e GETs que falham por erro de rede ou 5xx são
+    repetidos com espera crescente.
+
+    Parâmetros:
+        sistema (str): Nome do sistema, para os logs.
+        conexoes (int): Conexões simultâneas por host.
+        tentativas (int): Repetições de um GET que falhou.
+        timeout (float): Timeout de cada requisição, em segundos.
+    """
+
+    def __init__(
+        self,
+        sistema,
+        conexoes=HTTP_CONEXOES_POR_HOST,
+        tentativas=HTTP_TENTATIVAS,
+        timeout=HTTP_TIMEOUT,
+    ):
+        self.sistema = sistema
+        self.timeout = timeout
+        self.sincronizada_em = None
+        self.sessao = requests.Session()
+
+        repeticao = Retry(
+            total=tentativas,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=conexoes,
+            pool_block=True,
+            max_retries=repeticao,
+        )
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+
+    def carregar_do_driver(self, driver):
+        """Copia para a sessão os cookies (todos os domínios) e o User-Agent."""
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        agente = driver.execute_script("return navigator.userAgent")
+
+        self.sessao.cookies.clear()
+        for c in cookies:
+            self.sessao.cookies.set(
+                c["name"],
+                c["value"],
+                domain=c.get("domain"),
+                path=c.get("path", "/"),
+                secure=c.get("secure", False),
+            )
+        self.sessao.headers["User-Agent"] = agente
+        self.sincronizada_em = time.time()
+        return len(cookies)
+
+    def devolver_ao_driver(self, driver):
+        """
+        Envia ao navegador os cookies da sessão HTTP, para que ele acompanhe
+        cookies renovados pelo servidor durante as requisições diretas.
+        """
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": c.secure,
+            }
+            for c in self.sessao.cookies
+        ]
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        except Exception as e:
+            logger.warning(
+                f"Cookies do {self.sistema} não devolvidos ao navegador: {e}"
+            )
+
+    def expirou(self, resposta):
+        """Indica se a resposta é uma recusa da sessão (401/403 ou tela de login)."""
+        if resposta.status_code in (401, 403):
+            return True
+        return bool(resposta.history) and any(
+            marcador in resposta.url for marcador in MARCADORES_LOGIN
+        )
+
+    def get(self, url, **kwargs):
+        """
+        GET autenticado.
+
+        Retorna:
+            requests.Response: Resposta com status 2xx.
+
+        Lança:
+            SessaoExpirada: Se o servidor pediu um novo login.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        resposta = self.sessao.get(url, **kwargs)
+        if self.expirou(resposta):
+            resposta.close()
+            raise SessaoExpirada(f"Sessão HTTP do {self.sistema} expirada")
+        try:
+            resposta.raise_for_status()
+        except requests.HTTPError:
+            # Respostas em stream prendem a conexão do pool até serem fechadas
+            resposta.close()
+            raise
+        return resposta
+
+    def get_json(self, url, **kwargs):
+        """GET de um endpoint JSON; retorna o conteúdo decodificado."""
+        cabecalhos = {"Accept": "application/json", **kwargs.pop("headers", {})}
+        return self.get(url, headers=cabecalhos, **kwargs).json()
+
+    def baixar(self, url, pasta, nome=None, documento=False, bloco=1024 * 1024):
+        """
+        Baixa um arquivo em blocos, sem carregá-lo inteiro na memória.
+
+        O arquivo é gravado com extensão .part e renomeado ao final, de modo
+        que um download interrompido nunca é confundido com um concluído; se
+        a transferência falhar, o .part é removido.
+
+        Parâmetros:
+            url (str): Endereço do arquivo.
+            pasta (str): Pasta de destino.
+            nome (str, opcional): Nome do arquivo; se omitido, usa o nome
+                informado pelo servidor ou o final da URL.
+            documento (bool): Recusa respostas que são páginas HTML (ex.: a
+                página da aplicação servida no lugar de um link inválido).
+
+        Retorna:
+            str: Caminho do arquivo baixado.
+
+        Lança:
+            ConteudoInesperado: Se `documento` e a resposta é uma página.
+        """
+        with self.get(url, stream=True) as resposta:
+            nome = nome or _nome_do_arquivo(resposta, url)
+            destino = os.path.join(pasta, nome)
+            temporario = destino + ".part"
+            tipo = resposta.headers.get("Content-Type", "")
+            try:
+                with open(temporario, "wb") as f:
+                    for parte in resposta.iter_content(bloco):
+                        if documento and f.tell() == 0 and _e_pagina(tipo, parte):
+                            raise ConteudoInesperado(
+                                f"{self.sistema} respondeu uma página em {url}"
+                            )
+                        f.write(parte)
+            except BaseException:
+                try:
+                    os.remove(temporario)
+                except OSError:
+                    pass
+                raise
+        os.replace(temporario, destino)
+        return destino
+
+    def fechar(self):
+        self.sessao.close()
+
+
+def _nome_do_arquivo(resposta, url):
+    """Nome do arquivo pelo Content-Disposition ou, na falta dele, pela URL."""
+    encontrado = _NOME_ANEXO.search(resposta.headers.get("Content-Disposition", ""))
+    if encontrado:
+        nome = unquote(encontrado.group(1))
+    else:
+        nome = unquote(os.path.basename(urlparse(resposta.url or url).path))
+    nome = os.path.basename(nome.strip()) or "download"
+    if not os.path.splitext(nome)[1]:
+        tipo = resposta.headers.get("Content-Type", "").split(";")[0].strip()
+        nome += mimetypes.guess_extension(tipo) or ""
+    return nome
+
+
+class ClientesHttp:
+    """
+    Um cliente HTTP por sistema e sessão de navegador, criado a partir do
+    navegador logo após o login e usado pelas etapas que só precisam
+    baixar arquivos ou consultar páginas/JSON.
+
+    Cada navegador tem o seu cliente: o servidor pode guardar estado na
+    sessão (ex.: o IC selecionado no SIATU), e sessões simultâneas do mesmo
+    usuário não podem trocar cookies entre si. O cliente é descartado
+    quando o navegador é limpo, encerrado ou refaz o login.
+    """
+
+    def __init__(self):
+        self._clientes = {}
+        self._lock = threading.Lock()
+
+    def sincronizar(self, driver, sistema):
+        """
+        Cria (ou atualiza) o cliente do sistema com a sessão do navegador.
+
+        Retorna:
+            ClienteHttp | None: Cliente sincronizado, ou None em caso de falha.
+        """
+        chave = (sistema, driver.session_id)
+        with self._lock:
+            cliente = self._clientes.get(chave)
+            if cliente is None:
+                cliente = self._clientes[chave] = ClienteHttp(sistema)
+
+        try:
+            quantidade = cliente.carregar_do_driver(driver)
+        except Exception as e:
+            logger.warning(f"Falha ao copiar a sessão do {sistema} para HTTP: {e}")
+            return None
+        logger.debug(f"Sessão HTTP do {sistema} sincronizada ({quantidade} cookies)")
+        return cliente
+
+    def obter(self, driver, sistema):
+        """Retorna o cliente já sincronizado com este navegador, ou None."""
+        with self._lock:
+            cliente = self._clientes.get((sistema, driver.session_id))
+        if cliente is None or cliente.sincronizada_em is None:
+            return None
+        return cliente
+
+    def invalidar(self, driver, sistema=None):
+        """
+        Descarta os clientes do navegador (de um sistema ou de todos), quando
+        a sessão dele deixa de valer: limpeza, encerramento ou novo login.
+        """
+        with self._lock:
+            chaves = [
+                chave
+                for chave in self._clientes
+                if chave[1] == driver.session_id and sistema in (None, chave[0])
+            ]
+            clientes = [self._clientes.pop(chave) for chave in chaves]
+        for cliente in clientes:
+            logger.debug(f"Sessão HTTP do {cliente.sistema} descartada")
+            cliente.fechar()
+
+    def fechar(self):
+        """Fecha as conexões de todos os clientes."""
+        with self._lock:
+            clientes = list(self._clientes.values())
+            self._clientes.clear()
+        for cliente in clientes:
+            cliente.fechar()
+
+
+clientes_http = ClientesHttp()
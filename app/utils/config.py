@@ -0,0 +1,94 @@
+import os
+
+from dotenv import load_dotenv
+
+from .logger import ROOT
+
+# Permite ajustar a execução via variáveis de ambiente ou arquivo .env
+load_dotenv()
+
+
+def _ler_int(nome, padrao):
+    """Lê uma variável de ambiente inteira, usando o padrão se inválida."""
+    try:
+        return int(os.getenv(nome, padrao))
+    except (TypeError, ValueError):
+        return padrao
+
+
+def _ler_bool(nome, padrao=False):
+    """Lê uma variável de ambiente booleana (1/true/sim)."""
+    valor = os.getenv(nome)
+    if valor is None:
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "s", "yes")
+
+
+# Pasta de dados persistentes entre execuções (caches, registros)
+PASTA_DADOS = os.getenv("TRIAGEM_PASTA_DADOS", str(ROOT / ".triagem"))
+
+# Pool de drivers Chrome
+DRIVER_POOL_TAMANHO = _ler_int("TRIAGEM_DRIVER_POOL_TAMANHO", 8)
+DRIVER_MAX_USOS = _ler_int("TRIAGEM_DRIVER_MAX_USOS", 20)
+# Sessões quentes (logadas e já configuradas) duram mais antes de reciclar
+DRIVER_QUENTE_MAX_USOS = _ler_int("TRIAGEM_DRIVER_QUENTE_MAX_USOS", 100)
+
+# Resolução do chromedriver
+CHROMEDRIVER_OFFLINE = _ler_bool("TRIAGEM_CHROMEDRIVER_OFFLINE")
+CHROMEDRIVER_VALIDADE_DIAS = _ler_int("TRIAGEM_CHROMEDRIVER_VALIDADE_DIAS", 7)
+
+# Etapas de um IC executadas em paralelo
+ETAPAS_MAX_PARALELAS = _ler_int("TRIAGEM_ETAPAS_MAX_PARALELAS", 4)
+
+# ICs processados simultaneamente
+IC_WORKERS = _ler_int("TRIAGEM_IC_WORKERS", 3)
+
+# ICs descobertos no SIGEDE aguardando um worker livre
+FILA_IC_TAMANHO = _ler_int("TRIAGEM_FILA_IC_TAMANHO", IC_WORKERS * 2)
+
+# Sessões simultâneas permitidas por sistema
+LIMITE_SIATU = _ler_int("TRIAGEM_LIMITE_SIATU", 2)
+LIMITE_URBANO = _ler_int("TRIAGEM_LIMITE_URBANO", 2)
+LIMITE_SISCTM = _ler_int("TRIAGEM_LIMITE_SISCTM", 2)
+LIMITE_GOOGLE = _ler_int("TRIAGEM_LIMITE_GOOGLE", 2)
+LIMITE_SIGEDE = _ler_int("TRIAGEM_LIMITE_SIGEDE", 2)
+
+# Reaproveitamento de sessões autenticadas
+SESSOES_TTL_MIN = _ler_int("TRIAGEM_SESSOES_TTL_MIN", 30)
+SESSOES_PERSISTIR = _ler_bool("TRIAGEM_SESSOES_PERSISTIR")
+
+# Timeouts adaptativos por etapa
+TIMEOUT_COMANDO_PADRAO = _ler_int("TRIAGEM_TIMEOUT_COMANDO", 120)
+TIMEOUTS_PERCENTIL = _ler_int("TRIAGEM_TIMEOUTS_PERCENTIL", 95)
+TIMEOUTS_MIN_AMOSTRAS = _ler_int("TRIAGEM_TIMEOUTS_MIN_AMOSTRAS", 20)
+
+# Cache de resultados por IC: validade em dias por sistema (0 = desativado)
+CACHE_IC_TTL_SIATU = _ler_int("TRIAGEM_CACHE_IC_TTL_SIATU", 7)
+CACHE_IC_TTL_URBANO = _ler_int("TRIAGEM_CACHE_IC_TTL_URBANO", 7)
+CACHE_IC_TTL_SISCTM = _ler_int("TRIAGEM_CACHE_IC_TTL_SISCTM", 30)
+CACHE_IC_TTL_SIGEDE = _ler_int("TRIAGEM_CACHE_IC_TTL_SIGEDE", 1)
+
+# Validade em dias do plano do lote (protocolo -> ICs) salvo para novas
+# execuções com os mesmos protocolos
+PLANO_LOTE_TTL_DIAS = _ler_int("TRIAGEM_PLANO_LOTE_TTL_DIAS", 7)
+
+# Armazém de anexos por conteúdo (hash -> arquivo), compartilhado entre execuções
+PASTA_BLOBS = os.getenv("TRIAGEM_PASTA_BLOBS", os.path.join(PASTA_DADOS, "blobs"))
+
+# Cliente HTTP com a sessão do navegador (downloads e consultas diretas)
+HTTP_CONEXOES_POR_HOST = _ler_int("TRIAGEM_HTTP_CONEXOES_POR_HOST", 4)
+HTTP_TENTATIVAS = _ler_int("TRIAGEM_HTTP_TENTATIVAS", 3)
+HTTP_TIMEOUT = _ler_int("TRIAGEM_HTTP_TIMEOUT", 60)
+
+# SIATU: baixa planta básica e anexos via HTTP (o clique fica como alternativa)
+SIATU_DOWNLOAD_HTTP = _ler_bool("TRIAGEM_SIATU_DOWNLOAD_HTTP", True)
+
+# Urbano: pesquisa de projetos pela API JSON (a interface fica como alternativa)
+URBANO_API = _ler_bool("TRIAGEM_URBANO_API", True)
+
+# SISCTM: áreas e endereço pelo serviço de feições do mapa (WFS); a interface
+# fica como alternativa e os prints aéreos podem ser desligados
+SISCTM_WFS = _ler_bool("TRIAGEM_SISCTM_WFS", True)
+SISCTM_PRINTS = _ler_bool("TRIAGEM_SISCTM_PRINTS", True)
+# ICs lidos em uma mesma consulta ao WFS
+SISCTM_WFS_LOTE = _ler_int("TRIAGEM_SISCTM_WFS_LOTE", 40)
@@ -0,0 +1,210 @@
+from datetime import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .logger import logger
+
+ARQUIVO_DIARIO = ".diario.sqlite"
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+INCOMPLETA = "incompleta"
+FALHOU = "falhou"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS execucao (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+CREATE TABLE IF NOT EXISTS protocolos (
+    protocolo TEXT PRIMARY KEY,
+    ordem INTEGER,
+    status TEXT,
+    indices TEXT,
+    inicio REAL,
+    fim REAL,
+    erro TEXT
+);
+CREATE TABLE IF NOT EXISTS etapas (
+    protocolo TEXT,
+    indice TEXT,
+    etapa TEXT,
+    status TEXT,
+    saidas TEXT,
+    inicio REAL,
+    fim REAL,
+    erro TEXT,
+    PRIMARY KEY (protocolo, indice, etapa)
+);
+"""
+
+
+class DiarioExecucao:
+    """
+    Diário da execução em SQLite, gravado dentro da pasta de resultados.
+
+    Registra cada protocolo (com os ICs capturados no SIGEDE) e cada etapa
+    de cada IC, com status, horários e saídas. Cada registro é gravado na
+    hora, de modo que uma execução interrompida (cancelamento, queda do
+    programa ou reinício do Windows) pode ser retomada a partir da mesma
+    pasta, repetindo apenas o que falhou ou não chegou a rodar.
+
+    Parâmetros:
+        pasta_resultados (str): Pasta "Resultados - ..." da execução.
+    """
+
+    def __init__(self, pasta_resultados):
+        self.pasta_resultados = pasta_resultados
+        self.caminho = os.path.join(pasta_resultados, ARQUIVO_DIARIO)
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(
+            self.caminho, check_same_thread=False, isolation_level=None
+        )
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.executescript(_ESQUEMA)
+
+    @staticmethod
+    def existe(pasta_resultados):
+        """Indica se a pasta tem um diário de execução para retomar."""
+        return os.path.isfile(os.path.join(pasta_resultados, ARQUIVO_DIARIO))
+
+    def _executar(self, sql, parametros=()):
+        with self._lock:
+            return self._con.execute(sql, parametros).fetchall()
+
+    def fechar(self):
+        with self._lock:
+            self._con.close()
+
+    # Protocolos
+
+    def iniciar_execucao(self, protocolos):
+        """Registra os protocolos da execução, preservando os já registrados."""
+        if not self._executar("SELECT valor FROM execucao WHERE chave = 'inicio'"):
+            self._executar(
+                "INSERT INTO execucao VALUES ('inicio', ?)",
+                (datetime.now().isoformat(timespec="seconds"),),
+            )
+        # Protocolos novos de uma retomada entram depois dos já registrados
+        (ultima,) = self._executar("SELECT COALESCE(MAX(ordem), -1) FROM protocolos")[0]
+        for ordem, protocolo in enumerate(protocolos, start=ultima + 1):
+            self._executar(
+                "INSERT OR IGNORE INTO protocolos (protocolo, ordem, status) "
+                "VALUES (?, ?, ?)",
+                (protocolo, ordem, PENDENTE),
+            )
+
+    def protocolos(self):
+        """Protocolos registrados, na ordem original da execução."""
+        linhas = self._executar("SELECT protocolo FROM protocolos ORDER BY ordem")
+        return [protocolo for (protocolo,) in linhas]
+
+    def indices_capturados(self, protocolo):
+        """
+        Retorna os ICs do protocolo se o SIGEDE já foi concluído para ele,
+        ou None se o protocolo precisa ser (re)processado.
+        """
+        linhas = self._executar(
+            "SELECT status, indices FROM protocolos WHERE protocolo = ?",
+            (protocolo,),
+        )
+        if not linhas or linhas[0][0] != CONCLUIDA:
+            return None
+        return json.loads(linhas[0][1] or "[]")
+
+    def iniciar_protocolo(self, protocolo):
+        self._executar(
+            "UPDATE protocolos SET status = ?, inicio = ?, fim = NULL, erro = NULL "
+            "WHERE protocolo = ?",
+            (EXECUTANDO, time.time(), protocolo),
+        )
+
+    def concluir_protocolo(self, protocolo, indices):
+        """
+        Registra os ICs capturados. Sem ICs (protocolo sem processo ou falha
+        interna do SIGEDE), o protocolo fica incompleto e é repetido na
+        retomada.
+        """
+        status = CONCLUIDA if indices else INCOMPLETA
+        self._executar(
+            "UPDATE protocolos SET status = ?, indices = ?, fim = ? "
+            "WHERE protocolo = ?",
+            (status, json.dumps(list(indices or [])), time.time(), protocolo),
+        )
+
+    def falhar_protocolo(self, protocolo, erro):
+        self._executar(
+            "UPDATE protocolos SET status = ?, fim = ?, erro = ? WHERE protocolo = ?",
+            (FALHOU, time.time(), str(erro), protocolo),
+        )
+
+    # Etapas
+
+    def do_indice(self, protocolo, indice):
+        """Retorna o registro das etapas de um IC."""
+        return DiarioIndice(self, protocolo, indice)
+
+    def resumo(self):
+        """Quantidade de etapas por status, para o log da retomada."""
+        linhas = self._executar("SELECT status, COUNT(*) FROM etapas GROUP BY status")
+        return dict(linhas)
+
+
+class DiarioIndice:
+    """
+    Etapas de um IC no diário. É o objeto recebido por `executar_grafo`.
+
+    Uma etapa que termina sem erro, mas com todas as saídas vazias (ex.:
+    SIATU ou SISCTM que falharam internamente e devolveram os valores
+    padrão), é registrada como incompleta e repetida na retomada.
+    """
+
+    def __init__(self, diario, protocolo, indice):
+        self.diario = diario
+        self.protocolo = protocolo
+        self.indice = indice
+
+    def concluidas(self):
+        """Retorna {etapa: saídas} das etapas concluídas deste IC."""
+        linhas = self.diario._executar(
+            "SELECT etapa, saidas FROM etapas "
+            "WHERE protocolo = ? AND indice = ? AND status = ?",
+            (self.protocolo, self.indice, CONCLUIDA),
+        )
+        return {etapa: json.loads(saidas or "{}") for etapa, saidas in linhas}
+
+    def iniciar(self, etapa):
+        self.diario._executar(
+            "INSERT OR REPLACE INTO etapas "
+            "(protocolo, indice, etapa, status, inicio) VALUES (?, ?, ?, ?, ?)",
+            (self.protocolo, self.indice, etapa, EXECUTANDO, time.time()),
+        )
+
+    def concluir(self, etapa, saidas):
+        status = CONCLUIDA if not saidas or any(saidas.values()) else INCOMPLETA
+        if status == INCOMPLETA:
+            logger.info(f"Etapa {etapa} do IC {self.indice} sem resultados")
+        self.diario._executar(
+            "UPDATE etapas SET status = ?, saidas = ?, fim = ? "
+            "WHERE protocolo = ? AND indice = ? AND etapa = ?",
+            (
+                status,
+                json.dumps(saidas, ensure_ascii=False, default=str),
+                time.time(),
+                self.protocolo,
+                self.indice,
+                etapa,
+            ),
+        )
+
+    def falhar(self, etapa, erro):
+        self.diario._executar(
+            "UPDATE etapas SET status = ?, fim = ?, erro = ? "
+            "WHERE protocolo = ? AND indice = ? AND etapa = ?",
+            (FALHOU, time.time(), str(erro), self.protocolo, self.indice, etapa),
+        )
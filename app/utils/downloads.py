@@ -0,0 +1,207 @@
+from concurrent.futures import Future
+
+import os
+import threading
+import time
+import weakref
+
+from .logger import logger
+from .rede import log_performance
+
+# Eventos de download do DevTools: o domínio Page chega pelo log de
+# performance; o Browser, quando o chromedriver o repassa
+_INICIO = ("Page.downloadWillBegin", "Browser.downloadWillBegin")
+_PROGRESSO = ("Page.downloadProgress", "Browser.downloadProgress")
+
+_rastreadores = weakref.WeakValueDictionary()
+_lock_registro = threading.Lock()
+# Navegadores diferentes podem concluir arquivos de mesmo nome na mesma pasta
+_lock_nomes = threading.Lock()
+
+
+class _Expectativa:
+    """Download esperado após um clique."""
+
+    def __init__(self, nome, extensoes):
+        self.nome = nome
+        self.extensoes = extensoes
+        self.futuro = Future()
+
+    def aceita(self, arquivo):
+        return not self.extensoes or arquivo.lower().endswith(self.extensoes)
+
+
+def _nome_disponivel(pasta, nome):
+    """Nome livre na pasta, no padrão do Chrome ("arquivo (1).pdf")."""
+    base, extensao = os.path.splitext(nome)
+    candidato, contador = nome, 1
+    while os.path.exists(os.path.join(pasta, candidato)):
+        candidato = f"{base} ({contador}){extensao}"
+        contador += 1
+    return candidato
+
+
+class RastreadorDownloads:
+    """
+    Acompanha os downloads de um navegador e associa cada um ao clique que
+    o disparou, pelos eventos de download do DevTools (downloadWillBegin e
+    downloadProgress) lidos no log de performance.
+
+    Antes do clique, `registrar()` devolve um Future. O primeiro download
+    que começa depois dele (o de nome igual ao esperado, se houver mais de
+    um) fica associado a esse Future pelo seu guid, e o Future recebe o
+    caminho final quando o download termina. Como cada navegador tem o seu
+    rastreador e o navegador grava o arquivo com o guid (ver
+    `definir_pasta_download`), downloads simultâneos de outros sistemas na
+    mesma pasta nunca são confundidos, e a pasta não é varrida.
+
+    Use `rastreador_downloads(driver, pasta)` para obter a instância do
+    navegador.
+
+    Parâmetros:
+        driver (selenium.webdriver): Navegador que faz os downloads.
+        pasta (str): Pasta de download atual do navegador.
+        intervalo (float): Espera entre leituras do log de eventos.
+    """
+
+    def __init__(self, driver, pasta, intervalo=0.2):
+        self.pasta = os.path.abspath(pasta)
+        self.intervalo = intervalo
+        self._log = log_performance(driver)
+        self._cursor = self._log.cursor()
+        self._pendentes = []
+        # guid -> (expectativa ou None, nome sugerido, pasta)
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome_esperado=None, extensoes=(".pdf",)):
+        """
+        Registra um download esperado. Deve ser chamado antes do clique.
+
+        Parâmetros:
+            nome_esperado (str, opcional): Nome provável do arquivo.
+            extensoes (tuple): Extensões aceitas (vazio = qualquer).
+        """
+        expectativa = _Expectativa(nome_esperado, extensoes)
+        with self._lock:
+            # Downloads anteriores ao registro não pertencem a este clique
+            self._processar()
+            self._pendentes.append(expectativa)
+        return expectativa.futuro
+
+    def aguardar(self, futuro, timeout=120):
+        """
+        Aguarda o download associado ao Future.
+
+        Retorna:
+            str | None: Caminho do arquivo baixado, ou None no timeout ou
+                se o download foi cancelado.
+        """
+        limite = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._processar()
+            if futuro.done() or not self._log.disponivel:
+                break
+            if time.monotonic() >= limite:
+                break
+            time.sleep(self.intervalo)
+
+        if futuro.done():
+            caminho = futuro.result()
+            if caminho is None:
+                logger.warning("Download cancelado pelo navegador: %s", self.pasta)
+            return caminho
+
+        with self._lock:
+            expectativa = self._desassociar(futuro)
+        futuro.cancel()
+        logger.warning(
+            "Timeout aguardando download: %s",
+            (expectativa and expectativa.nome) or self.pasta,
+        )
+        return None
+
+    def _desassociar(self, futuro):
+        """Remove a expectativa do Future; o download, se houver, segue sem ela."""
+        for expectativa in self._pendentes:
+            if expectativa.futuro is futuro:
+                self._pendentes.remove(expectativa)
+                return expectativa
+        for guid, (expectativa, nome, pasta) in self._em_andamento.items():
+            if expectativa is not None and expectativa.futuro is futuro:
+                self._em_andamento[guid] = (None, nome, pasta)
+                return expectativa
+        return None
+
+    def _processar(self):
+        """Trata os eventos de download recebidos desde a última leitura."""
+        mensagens, self._cursor = self._log.ler(self._cursor)
+        for mensagem in mensagens:
+            metodo = mensagem.get("method")
+            params = mensagem.get("params", {})
+            if metodo in _INICIO:
+                self._iniciado(params.get("guid"), params.get("suggestedFilename"))
+            elif metodo in _PROGRESSO and params.get("state") in (
+                "completed",
+                "canceled",
+            ):
+                self._encerrado(params.get("guid"), params["state"] == "completed")
+
+    def _iniciado(self, guid, sugerido):
+        """Associa um download que começou à expectativa correspondente."""
+        if not guid or guid in self._em_andamento:
+            return
+        nome = os.path.basename(sugerido or "") or guid
+        candidatas = [e for e in self._pendentes if e.aceita(nome)]
+        # Nome exato primeiro; senão, o clique mais antigo ainda sem download
+        escolhida = next(
+            (e for e in candidatas if e.nome == nome),
+            candidatas[0] if candidatas else None,
+        )
+        if escolhida is not None:
+            self._pendentes.remove(escolhida)
+        self._em_andamento[guid] = (escolhida, nome, self.pasta)
+
+    def _encerrado(self, guid, concluido):
+        """Dá o nome final ao arquivo concluído e resolve o Future do clique."""
+        if guid not in self._em_andamento:
+            return
+        expectativa, nome, pasta = self._em_andamento.pop(guid)
+        caminho = self._renomear(pasta, guid, nome) if concluido else None
+        if expectativa is not None:
+            expectativa.futuro.set_result(caminho)
+
+    def _renomear(self, pasta, guid, nome):
+        origem = os.path.join(pasta, guid)
+        if not os.path.exists(origem):
+            # Navegador sem a gravação por guid: o arquivo já tem o nome
+            caminho = os.path.join(pasta, nome)
+            return caminho if os.path.exists(caminho) else None
+        for _ in range(3):
+            try:
+                with _lock_nomes:
+                    destino = os.path.join(pasta, _nome_disponivel(pasta, nome))
+                    os.rename(origem, destino)
+                return destino
+            except OSError as e:
+                # No Windows o arquivo pode continuar aberto por um instante
+                logger.debug(f"Renomeação do download adiada ({nome}): {e}")
+                time.sleep(self.intervalo)
+        logger.warning("Download concluído, mas não renomeado: %s", origem)
+        return None
+
+
+def rastreador_downloads(driver, pasta):
+    """
+    Retorna o rastreador do navegador, com downloads na pasta informada
+    (a mesma passada a `definir_pasta_download`).
+    """
+    with _lock_registro:
+        rastreador = _rastreadores.get(driver.session_id)
+        if rastreador is None:
+            rastreador = RastreadorDownloads(driver, pasta)
+            _rastreadores[driver.session_id] = rastreador
+        else:
+            rastreador.pasta = os.path.abspath(pasta)
+        return rastreador
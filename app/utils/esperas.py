@@ -0,0 +1,229 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+import threading
+import time
+
+from .logger import logger
+
+_JS_MUTACOES = """
+if (!window.__triagemMutacao) {
+    window.__triagemMutacao = Date.now();
+    new MutationObserver(function () { window.__triagemMutacao = Date.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true,
+                            characterData: true});
+}
+return [document.readyState, Date.now() - window.__triagemMutacao];
+"""
+
+_JS_XHR = """
+if (!window.__triagemXhr) {
+    var estado = window.__triagemXhr = {pendentes: 0, ultimo: Date.now()};
+    var fim = function () {
+        estado.pendentes = Math.max(0, estado.pendentes - 1);
+        estado.ultimo = Date.now();
+    };
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        estado.pendentes++;
+        estado.ultimo = Date.now();
+        this.addEventListener('loadend', fim);
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var fetchOriginal = window.fetch;
+        window.fetch = function () {
+            estado.pendentes++;
+            estado.ultimo = Date.now();
+            return fetchOriginal.apply(this, arguments).finally(fim);
+        };
+    }
+}
+var e = window.__triagemXhr;
+var jquery = (window.jQuery && window.jQuery.active) || 0;
+return [e.pendentes + jquery, Date.now() - e.ultimo];
+"""
+
+
+def pagina_carregada():
+    """Condição: documento com readyState 'complete'."""
+
+    def condicao(driver):
+        try:
+            return driver.execute_script("return document.readyState") == "complete"
+        except WebDriverException:
+            return False
+
+    return condicao
+
+
+def dom_estavel(quieto=0.5):
+    """
+    Condição: página carregada e sem mutações no DOM por `quieto` segundos.
+    Após uma navegação o observador é reinstalado no novo documento.
+    """
+
+    def condicao(driver):
+        try:
+            estado, ociosa_ms = driver.execute_script(_JS_MUTACOES)
+        except WebDriverException:
+            return False
+        return estado == "complete" and ociosa_ms >= quieto * 1000
+
+    return condicao
+
+
+def xhr_ocioso(quieto=0.5):
+    """
+    Condição: nenhuma requisição XHR/fetch pendente por `quieto` segundos.
+    """
+
+    def condicao(driver):
+        try:
+            pendentes, ocioso_ms = driver.execute_script(_JS_XHR)
+        except WebDriverException:
+            return False
+        return pendentes == 0 and ocioso_ms >= quieto * 1000
+
+    return condicao
+
+
+def url_mudou(url_anterior):
+    """Condição: a URL atual é diferente de `url_anterior`."""
+
+    def condicao(driver):
+        try:
+            return driver.current_url != url_anterior
+        except WebDriverException:
+            return False
+
+    return condicao
+
+
+def nova_janela(quantidade_anterior):
+    """Condição: uma nova janela/aba foi aberta."""
+
+    def condicao(driver):
+        try:
+            return len(driver.window_handles) > quantidade_anterior
+        except WebDriverException:
+            return False
+
+    return condicao
+
+
+def elemento_estavel(localizador, quieto=0.5):
+    """
+    Condição: elemento presente e com posição/tamanho inalterados por
+    `quieto` segundos.
+    """
+    ultimo = {"rect": None, "desde": 0.0}
+
+    def condicao(driver):
+        try:
+            rect = driver.find_element(*localizador).rect
+        except WebDriverException:
+            ultimo["rect"] = None
+            return False
+
+        agora = time.monotonic()
+        if rect != ultimo["rect"]:
+            ultimo["rect"], ultimo["desde"] = rect, agora
+            return False
+        return agora - ultimo["desde"] >= quieto
+
+    return condicao
+
+
+def conteudo_atualizado(localizador, anterior):
+    """
+    Condição: o elemento de `localizador` foi substituído ou mudou de texto
+    em relação a `anterior` (o mesmo elemento, lido antes da ação, ou None).
+    """
+    texto_anterior = None
+    if anterior is not None:
+        try:
+            texto_anterior = anterior.text
+        except WebDriverException:
+            anterior = None
+
+    def condicao(driver):
+        try:
+            atual = driver.find_element(*localizador)
+            if anterior is None or atual != anterior:
+                return True
+            return atual.text != texto_anterior
+        except WebDriverException:
+            return False
+
+    return condicao
+
+
+def todas(*condicoes):
+    """Condição: todas as condições informadas são verdadeiras."""
+
+    def condicao(driver):
+        return all(c(driver) for c in condicoes)
+
+    return condicao
+
+
+class ContadorEsperas:
+    """
+    Acumula, por chave (pasta do IC ou do protocolo), quantos segundos as
+    esperas por evento economizaram em relação às pausas fixas antigas.
+    """
+
+    def __init__(self):
+        self._economia = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, chave, segundos):
+        with self._lock:
+            self._economia[chave] = self._economia.get(chave, 0.0) + segundos
+
+    def consumir(self, chave):
+        """Retorna e zera o total economizado da chave."""
+        with self._lock:
+            return self._economia.pop(chave, 0.0)
+
+
+contador_esperas = ContadorEsperas()
+
+
+class Esperas:
+    """
+    Esperas por evento com teto, usadas no lugar de `time.sleep` fixos.
+
+    Parâmetros:
+        driver (selenium.webdriver): Driver observado.
+        chave (str): Chave do contador de economia (pasta do IC/protocolo).
+    """
+
+    def __init__(self, driver, chave=None):
+        self.driver = driver
+        self.chave = chave
+
+    def ate(self, condicao, teto, antes=0):
+        """
+        Aguarda a condição por no máximo `teto` segundos, sem lançar erro.
+
+        Parâmetros:
+            condicao (callable): Condição no formato do WebDriverWait.
+            teto (float): Tempo máximo de espera.
+            antes (float): Duração da pausa fixa substituída, para o contador.
+
+        Retorna:
+            bool: True se a condição foi satisfeita antes do teto.
+        """
+        inicio = time.monotonic()
+        try:
+            WebDriverWait(self.driver, teto, poll_frequency=0.1).until(condicao)
+            ok = True
+        except TimeoutException:
+            logger.debug("Espera atingiu o teto de %.1fs", teto)
+            ok = False
+
+        if antes and self.chave:
+            contador_esperas.registrar(self.chave, antes - (time.monotonic() - inicio))
+        return ok
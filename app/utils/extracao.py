@@ -0,0 +1,82 @@
+from collections import namedtuple
+import time
+
+from .logger import logger
+
+# Modos de extração de um campo
+TEXTO = "texto"  # texto do primeiro nó encontrado (ou None)
+TEXTOS = "textos"  # textos de todos os nós encontrados
+LINHAS = "linhas"  # para cada nó (tr), os textos das suas células (td)
+
+Campo = namedtuple("Campo", ("xpath", "modo"), defaults=(TEXTO,))
+Campo.__doc__ = """
+Campo extraído da página.
+
+Parâmetros:
+    xpath (str): XPath do campo, relativo à raiz da extração.
+    modo (str): TEXTO, TEXTOS ou LINHAS.
+"""
+
+_JS_EXTRAIR = """
+var mapa = arguments[0], raiz = arguments[1] || document, saida = {};
+function texto(no) {
+    var t = no.innerText !== undefined ? no.innerText : no.textContent;
+    return (t || "").trim();
+}
+function nos(xpath) {
+    var r = document.evaluate(xpath, raiz, null,
+                              XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var lista = [];
+    for (var i = 0; i < r.snapshotLength; i++) lista.push(r.snapshotItem(i));
+    return lista;
+}
+for (var nome in mapa) {
+    var xpath = mapa[nome][0], modo = mapa[nome][1];
+    try {
+        var encontrados = nos(xpath);
+        if (modo === "textos") {
+            saida[nome] = encontrados.map(texto);
+        } else if (modo === "linhas") {
+            saida[nome] = encontrados.map(function (tr) {
+                return Array.prototype.map.call(tr.querySelectorAll("td"), texto);
+            });
+        } else {
+            saida[nome] = encontrados.length ? texto(encontrados[0]) : null;
+        }
+    } catch (e) {
+        saida[nome] = null;
+    }
+}
+return saida;
+"""
+
+
+def extrair(driver, campos, raiz=None):
+    """
+    Extrai vários campos da página em uma única chamada ao navegador.
+
+    Os XPaths são avaliados no próprio navegador e os textos voltam
+    serializados em um dict, evitando uma ida e volta ao WebDriver por
+    elemento. Um campo ausente vale None (TEXTO) ou lista vazia.
+
+    Parâmetros:
+        driver (selenium.webdriver): Driver da página.
+        campos (dict): Mapeamento nome -> Campo.
+        raiz (WebElement, opcional): Elemento base dos XPaths relativos.
+
+    Retorna:
+        dict: Valores extraídos, com as mesmas chaves de `campos`.
+    """
+    inicio = time.monotonic()
+    valores = driver.execute_script(_JS_EXTRAIR, campos, raiz) or {}
+    logger.debug(
+        "Extração de %d campos em %.0f ms",
+        len(campos),
+        (time.monotonic() - inicio) * 1000,
+    )
+    vazio = {TEXTO: None, TEXTOS: [], LINHAS: []}
+    resultado = {}
+    for nome, campo in campos.items():
+        valor = valores.get(nome)
+        resultado[nome] = vazio[campo.modo] if valor is None else valor
+    return resultado
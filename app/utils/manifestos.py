@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import time
+
+from .logger import logger
+from .config import PASTA_DADOS
+from .blobs import armazem_blobs
+
+PASTA_MANIFESTOS = os.path.join(PASTA_DADOS, "manifestos")
+
+
+class ManifestoAnexos:
+    """
+    Manifesto dos anexos já baixados de um IC em um sistema.
+
+    Cada anexo é identificado pela assinatura da sua linha na tabela do
+    sistema (texto da linha e parâmetros do link) e guarda nome, tamanho e
+    hash do arquivo no armazém de blobs. Em execuções seguintes, anexos com
+    a mesma assinatura são restaurados do armazém sem novo download; só os
+    novos ou alterados são baixados.
+
+    Parâmetros:
+        sistema (str): Nome do sistema (ex.: "SIATU").
+        indice (str): Índice cadastral normalizado.
+    """
+
+    def __init__(self, sistema, indice, pasta=PASTA_MANIFESTOS):
+        self.caminho = os.path.join(pasta, sistema, f"{indice}.json")
+        self._itens = {}
+        self._vistos = set()
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                self._itens = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifesto de anexos ignorado ({self.caminho}): {e}")
+
+    @staticmethod
+    def assinatura(*partes):
+        """Assinatura estável de uma linha da tabela de anexos."""
+        return hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+    def restaurar(self, assinatura, pasta_destino):
+        """
+        Restaura o anexo da assinatura em `pasta_destino`, se conhecido.
+
+        Retorna:
+            str | None: Caminho restaurado, ou None se precisa baixar.
+        """
+        self._vistos.add(assinatura)
+        item = self._itens.get(assinatura)
+        if not item:
+            return None
+
+        destino = os.path.join(pasta_destino, item["nome"])
+        try:
+            if armazem_blobs.vincular(item["hash"], destino) and (
+                os.path.getsize(destino) == item["tamanho"]
+            ):
+                return destino
+        except OSError as e:
+            logger.warning(f"Anexo {item['nome']} não restaurado: {e}")
+
+        del self._itens[assinatura]
+        return None
+
+    def registrar(self, assinatura, caminho):
+        """Registra um anexo recém-baixado e o guarda no armazém de blobs."""
+        self._vistos.add(assinatura)
+        try:
+            self._itens[assinatura] = {
+                "nome": os.path.basename(caminho),
+                "tamanho": os.path.getsize(caminho),
+                "hash": armazem_blobs.guardar(caminho),
+                "registrado_em": time.time(),
+            }
+        except OSError as e:
+            logger.warning(f"Anexo {caminho} fora do manifesto: {e}")
+
+    def hashes(self):
+        return {item["hash"] for item in self._itens.values()}
+
+    def salvar(self, completo=False):
+        """
+        Grava o manifesto.
+
+        Parâmetros:
+            completo (bool): A tabela foi percorrida inteira; anexos que não
+                aparecem mais nela são removidos do manifesto.
+        """
+        if completo:
+            self._itens = {
+                assinatura: item
+                for assinatura, item in self._itens.items()
+                if assinatura in self._vistos
+            }
+        try:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            with open(self.caminho + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._itens, f, ensure_ascii=False, indent=2)
+            os.replace(self.caminho + ".tmp", self.caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar o manifesto de anexos: {e}")
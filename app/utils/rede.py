@@ -0,0 +1,175 @@
+from selenium.common.exceptions import WebDriverException
+
+from collections import deque
+from itertools import islice
+import json
+import threading
+import time
+import weakref
+
+from .logger import logger
+
+# Tipos de recurso considerados na detecção (tiles, imagens e dados do mapa)
+TIPOS_MONITORADOS = ("Image", "XHR", "Fetch", "Other")
+
+_EVENTOS_FIM = ("Network.loadingFinished", "Network.loadingFailed")
+
+_logs = weakref.WeakValueDictionary()
+_lock_logs = threading.Lock()
+
+
+class LogPerformance:
+    """
+    Leitor único do log de performance (eventos do DevTools) de um driver.
+
+    O chromedriver esvazia o log a cada leitura; aqui os eventos lidos ficam
+    guardados, e cada consumidor (monitor de rede, rastreador de downloads,
+    aprendizado de endpoints) acompanha os seus com um cursor próprio, sem
+    consumir os eventos dos demais.
+
+    Use `log_performance(driver)` para obter a instância do driver.
+
+    Parâmetros:
+        driver (selenium.webdriver): Driver com `goog:loggingPrefs` =
+            {"performance": "ALL"}.
+        capacidade (int): Eventos guardados; os mais antigos são descartados.
+    """
+
+    def __init__(self, driver, capacidade=10000):
+        self.driver = driver
+        self.disponivel = True
+        self._eventos = deque(maxlen=capacidade)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def ler(self, cursor=0):
+        """
+        Eventos recebidos a partir do cursor.
+
+        Retorna:
+            tuple: (mensagens {"method", "params"}, novo cursor).
+        """
+        with self._lock:
+            self._coletar()
+            primeiro = self._total - len(self._eventos)
+            novos = list(islice(self._eventos, max(0, cursor - primeiro), None))
+            return novos, self._total
+
+    def cursor(self):
+        """Cursor que ignora os eventos recebidos até agora."""
+        with self._lock:
+            self._coletar()
+            return self._total
+
+    def descartar(self):
+        """Esquece os eventos recebidos (ex.: ao devolver o driver ao pool)."""
+        with self._lock:
+            self._coletar()
+            self._eventos.clear()
+
+    def _coletar(self):
+        if not self.disponivel:
+            return
+        try:
+            entradas = self.driver.get_log("performance")
+        except WebDriverException as e:
+            logger.warning(f"Log de performance indisponível: {e}")
+            self.disponivel = False
+            return
+        for entrada in entradas:
+            try:
+                mensagem = json.loads(entrada["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._eventos.append(mensagem)
+            self._total += 1
+
+
+def log_performance(driver):
+    """Retorna o leitor compartilhado do log de performance do driver."""
+    with _lock_logs:
+        log = _logs.get(driver.session_id)
+        if log is None:
+            log = LogPerformance(driver)
+            _logs[driver.session_id] = log
+        return log
+
+
+class MonitorRede:
+    """
+    Acompanha as requisições em andamento de um driver pelo log de
+    performance do Chrome (eventos Network.* do DevTools).
+
+    Requer o driver criado com `goog:loggingPrefs` = {"performance": "ALL"}.
+
+    Parâmetros:
+        driver (selenium.webdriver): Driver monitorado.
+        travada_apos (float): Segundos após os quais uma requisição sem
+            resposta deixa de bloquear a ociosidade (long-polling, tiles
+            que nunca respondem).
+        historico (int): Quantidade de requisições recentes guardadas
+            (URL e cabeçalhos) para consulta em `requisicoes()`.
+    """
+
+    def __init__(self, driver, travada_apos=10, historico=500):
+        self.driver = driver
+        self.travada_apos = travada_apos
+        self._requisicoes = deque(maxlen=historico)
+        self._em_andamento = {}
+        self._ultima_atividade = time.monotonic()
+        self._log = log_performance(driver)
+        self._cursor = 0
+        self._ler_log()
+
+    def _ler_log(self):
+        """Processa os eventos de rede recebidos desde a última leitura."""
+        mensagens, self._cursor = self._log.ler(self._cursor)
+        agora = time.monotonic()
+        for mensagem in mensagens:
+            metodo = mensagem.get("method")
+            params = mensagem.get("params", {})
+            if metodo == "Network.requestWillBeSent":
+                requisicao = params.get("request", {})
+                self._requisicoes.append(
+                    (requisicao.get("url", ""), requisicao.get("headers", {}))
+                )
+                if params.get("type") in TIPOS_MONITORADOS:
+                    self._em_andamento[params["requestId"]] = agora
+                    self._ultima_atividade = agora
+            elif metodo in _EVENTOS_FIM:
+                if self._em_andamento.pop(params.get("requestId"), None):
+                    self._ultima_atividade = agora
+
+    def requisicoes(self):
+        """Requisições recentes do driver, como tuplas (url, cabeçalhos)."""
+        self._ler_log()
+        return list(self._requisicoes)
+
+    def pendentes(self):
+        """Número de requisições monitoradas ainda sem resposta."""
+        self._ler_log()
+        agora = time.monotonic()
+        return sum(
+            1
+            for inicio in self._em_andamento.values()
+            if agora - inicio < self.travada_apos
+        )
+
+    def ociosa(self, quieto=1.0):
+        """
+        Condição (formato WebDriverWait): nenhuma requisição em andamento e
+        nenhuma atividade de rede por `quieto` segundos, contados a partir
+        da criação da condição.
+        """
+        desde = time.monotonic()
+
+        def condicao(driver):
+            if not self._log.disponivel:
+                # Sem log de performance, não há como afirmar ociosidade
+                return False
+            if self.pendentes():
+                return False
+            referencia = max(self._ultima_atividade, desde)
+            return time.monotonic() - referencia >= quieto
+
+        return condicao
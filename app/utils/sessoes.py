@@ -0,0 +1,192 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+
+import ctypes
+import json
+import os
+import sys
+import threading
+import time
+
+from .logger import logger
+from .config import PASTA_DADOS, SESSOES_TTL_MIN, SESSOES_PERSISTIR
+
+ARQUIVO_SESSOES = os.path.join(PASTA_DADOS, "sessoes.bin")
+
+# Campos aceitos pelo Network.setCookies
+_CAMPOS_COOKIE = (
+    "name",
+    "value",
+    "domain",
+    "path",
+    "secure",
+    "httpOnly",
+    "sameSite",
+    "expires",
+    "priority",
+    "sourceScheme",
+    "sourcePort",
+)
+
+
+class _Blob(ctypes.Structure):
+    _fields_ = [
+        ("cbData", ctypes.c_uint32),
+        ("pbData", ctypes.POINTER(ctypes.c_char)),
+    ]
+
+
+def _dpapi(dados, proteger):
+    """Criptografa/descriptografa com a DPAPI do Windows (chave do usuário)."""
+    crypt32 = ctypes.windll.crypt32
+    kernel32 = ctypes.windll.kernel32
+
+    buffer = ctypes.create_string_buffer(dados, len(dados))
+    entrada = _Blob(len(dados), ctypes.cast(buffer, ctypes.POINTER(ctypes.c_char)))
+    saida = _Blob()
+    funcao = crypt32.CryptProtectData if proteger else crypt32.CryptUnprotectData
+
+    if not funcao(
+        ctypes.byref(entrada), None, None, None, None, 0, ctypes.byref(saida)
+    ):
+        raise OSError("Falha na DPAPI ao processar sessões salvas")
+    try:
+        return ctypes.string_at(saida.pbData, saida.cbData)
+    finally:
+        kernel32.LocalFree(saida.pbData)
+
+
+def aguardar_autenticacao(driver, logado, formulario, timeout=15):
+    """
+    Aguarda a página indicar se a sessão está autenticada.
+
+    Parâmetros:
+        logado (tuple): Localizador presente apenas com sessão ativa.
+        formulario (tuple): Localizador do formulário de login.
+
+    Retorna:
+        bool: True se o localizador `logado` apareceu.
+    """
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.any_of(
+                EC.presence_of_element_located(logado),
+                EC.presence_of_element_located(formulario),
+            )
+        )
+        return bool(driver.find_elements(*logado))
+    except TimeoutException:
+        return False
+
+
+class ArmazemSessoes:
+    """
+    Guarda os cookies das sessões autenticadas de cada sistema.
+
+    Após o primeiro login de um sistema, os cookies de todos os domínios do
+    navegador (incluindo CAS/Keycloak) são capturados e injetados nos
+    próximos drivers, que assim dispensam o formulário de login. Sessões
+    mais antigas que `ttl_min` ou recusadas pelo servidor são descartadas.
+
+    No Windows, as sessões podem ser persistidas em disco entre execuções,
+    criptografadas com a DPAPI do usuário.
+
+    Parâmetros:
+        ttl_min (int): Validade das sessões, em minutos.
+        persistir (bool): Salva as sessões em disco (somente Windows).
+    """
+
+    def __init__(self, ttl_min=SESSOES_TTL_MIN, persistir=SESSOES_PERSISTIR):
+        self.ttl = ttl_min * 60
+        self.persistir = persistir and sys.platform.startswith("win")
+        self._sessoes = {}
+        self._lock = threading.Lock()
+        if self.persistir:
+            self._carregar()
+
+    def injetar(self, driver, sistema, usuario):
+        """
+        Injeta no driver os cookies salvos do sistema.
+
+        Retorna:
+            bool: True se havia sessão válida para injetar.
+        """
+        with self._lock:
+            sessao = self._sessoes.get((sistema, usuario))
+
+        if not sessao or time.time() - sessao["capturada_em"] > self.ttl:
+            return False
+
+        try:
+            driver.execute_cdp_cmd("Network.setCookies", {"cookies": sessao["cookies"]})
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao injetar sessão do {sistema}: {e}")
+            return False
+
+    def capturar(self, driver, sistema, usuario):
+        """Salva os cookies atuais do driver como sessão do sistema."""
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        except Exception as e:
+            logger.warning(f"Falha ao capturar sessão do {sistema}: {e}")
+            return
+
+        cookies = [
+            {campo: c[campo] for campo in _CAMPOS_COOKIE if campo in c} for c in cookies
+        ]
+        with self._lock:
+            self._sessoes[(sistema, usuario)] = {
+                "cookies": cookies,
+                "capturada_em": time.time(),
+            }
+        logger.info(f"Sessão do {sistema} salva ({len(cookies)} cookies)")
+        self._salvar()
+
+    def invalidar(self, sistema, usuario):
+        """Descarta a sessão salva do sistema (expirada ou recusada)."""
+        with self._lock:
+            removida = self._sessoes.pop((sistema, usuario), None)
+        if removida:
+            logger.info(f"Sessão do {sistema} expirada, novo login necessário")
+            self._salvar()
+
+    def _carregar(self):
+        try:
+            with open(ARQUIVO_SESSOES, "rb") as f:
+                conteudo = json.loads(_dpapi(f.read(), proteger=False))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"Sessões salvas ignoradas: {e}")
+            return
+
+        agora = time.time()
+        for item in conteudo:
+            if agora - item["capturada_em"] <= self.ttl:
+                chave = (item["sistema"], item["usuario"])
+                self._sessoes[chave] = {
+                    "cookies": item["cookies"],
+                    "capturada_em": item["capturada_em"],
+                }
+
+    def _salvar(self):
+        if not self.persistir:
+            return
+
+        with self._lock:
+            conteudo = [
+                {"sistema": sistema, "usuario": usuario, **sessao}
+                for (sistema, usuario), sessao in self._sessoes.items()
+            ]
+        try:
+            os.makedirs(PASTA_DADOS, exist_ok=True)
+            dados = _dpapi(json.dumps(conteudo).encode("utf-8"), proteger=True)
+            with open(ARQUIVO_SESSOES, "wb") as f:
+                f.write(dados)
+        except Exception as e:
+            logger.warning(f"Não foi possível salvar as sessões em disco: {e}")
+
+
+armazem_sessoes = ArmazemSessoes()
@@ -0,0 +1,222 @@
+from selenium.webdriver.support.ui import WebDriverWait
+
+from contextlib import contextmanager
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from .logger import logger
+from .config import (
+    PASTA_DADOS,
+    TIMEOUT_COMANDO_PADRAO,
+    TIMEOUTS_PERCENTIL,
+    TIMEOUTS_MIN_AMOSTRAS,
+)
+from .web_driver import definir_timeout_comando
+
+ARQUIVO_TIMEOUTS = os.path.join(PASTA_DADOS, "timeouts.json")
+
+# Limites superiores (s) das faixas do histograma; a última faixa é aberta
+FAIXAS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, 377, 610)
+
+# Folga aplicada sobre o percentil: multiplicativa e fixa (s)
+MARGEM = 1.5
+FOLGA = 1.0
+
+# Acima deste total as contagens são reduzidas à metade, para que o
+# histograma acompanhe mudanças no tempo de resposta dos sistemas
+MAX_AMOSTRAS = 500
+
+
+def _faixa_do_percentil(contagens, percentil):
+    """Limite superior da faixa do histograma que contém o percentil."""
+    alvo = sum(contagens) * percentil / 100
+    acumulado = 0.0
+    for indice, contagem in enumerate(contagens):
+        acumulado += contagem
+        if acumulado >= alvo:
+            break
+    limite = FAIXAS[min(indice, len(FAIXAS) - 1)]
+    if indice == len(FAIXAS):
+        limite *= 2
+    return limite
+
+
+class PoliticaTimeouts:
+    """
+    Timeouts derivados da latência observada de cada etapa.
+
+    Cada etapa (ex.: "SIATU.planta_basica") mantém um histograma das
+    durações bem-sucedidas. O timeout da etapa é o percentil configurado
+    desse histograma, com margem, limitado a [`minimo`, `maximo`]. Enquanto
+    não houver amostras suficientes, vale o padrão informado pelo chamador.
+    Os histogramas são salvos em disco e reaproveitados entre execuções.
+
+    Parâmetros:
+        percentil (int): Percentil usado como base do timeout.
+        min_amostras (int): Amostras necessárias para abandonar o padrão.
+    """
+
+    def __init__(
+        self, percentil=TIMEOUTS_PERCENTIL, min_amostras=TIMEOUTS_MIN_AMOSTRAS
+    ):
+        self.percentil = percentil
+        self.min_amostras = min_amostras
+        self._histogramas = {}
+        self._lock = threading.Lock()
+        self._carregar()
+
+    def registrar(self, etapa, segundos):
+        """Registra a duração de uma execução bem-sucedida da etapa."""
+        with self._lock:
+            contagens = self._histogramas.setdefault(etapa, [0.0] * (len(FAIXAS) + 1))
+            contagens[bisect.bisect_left(FAIXAS, segundos)] += 1
+            if sum(contagens) > MAX_AMOSTRAS:
+                self._histogramas[etapa] = [c / 2 for c in contagens]
+
+    def timeout(self, etapa, padrao, minimo=1, maximo=None):
+        """
+        Retorna o timeout da etapa.
+
+        Parâmetros:
+            etapa (str): Nome da etapa ("SISTEMA.etapa").
+            padrao (float): Timeout usado enquanto faltarem amostras.
+            minimo (float): Menor timeout aceito.
+            maximo (float, opcional): Maior timeout aceito (padrão x 4).
+        """
+        with self._lock:
+            contagens = list(self._histogramas.get(etapa, ()))
+
+        if sum(contagens) < self.min_amostras:
+            return padrao
+
+        limite = _faixa_do_percentil(contagens, self.percentil)
+        maximo = padrao * 4 if maximo is None else maximo
+        return max(minimo, min(maximo, limite * MARGEM + FOLGA))
+
+    def estimativa(self, etapa):
+        """
+        Duração típica da etapa (mediana pelo histograma), ou None enquanto
+        faltarem amostras. Usada nas estimativas de término.
+        """
+        with self._lock:
+            contagens = list(self._histogramas.get(etapa, ()))
+        if sum(contagens) < self.min_amostras:
+            return None
+        return _faixa_do_percentil(contagens, 50)
+
+    @contextmanager
+    def etapa(self, driver, nome, padrao=TIMEOUT_COMANDO_PADRAO, minimo=5):
+        """
+        Executa uma etapa com o timeout de comandos do driver ajustado ao
+        histograma da etapa, registrando sua duração se concluir sem erro.
+
+        Parâmetros:
+            driver (selenium.webdriver): Driver usado na etapa.
+            nome (str): Nome da etapa ("SISTEMA.etapa").
+            padrao (float): Timeout de comandos enquanto faltarem amostras.
+            minimo (float): Menor timeout de comandos aceito.
+        """
+        timeout = self.timeout(nome, padrao, minimo=minimo)
+        definir_timeout_comando(driver, timeout)
+        logger.debug(f"Timeout de comandos em {nome}: {timeout:.1f}s")
+
+        inicio = time.monotonic()
+        try:
+            yield timeout
+            self.registrar(nome, time.monotonic() - inicio)
+        finally:
+            try:
+                definir_timeout_comando(driver, TIMEOUT_COMANDO_PADRAO)
+            except Exception:
+                pass
+
+    def salvar(self):
+        """Salva os histogramas em disco para as próximas execuções."""
+        with self._lock:
+            conteudo = {"faixas": FAIXAS, "etapas": dict(self._histogramas)}
+        try:
+            os.makedirs(PASTA_DADOS, exist_ok=True)
+            with open(ARQUIVO_TIMEOUTS, "w", encoding="utf-8") as f:
+                json.dump(conteudo, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning(f"Não foi possível salvar os histogramas de timeout: {e}")
+
+    def _carregar(self):
+        try:
+            with open(ARQUIVO_TIMEOUTS, "r", encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Histogramas de timeout ignorados: {e}")
+            return
+
+        # Histogramas gravados com outras faixas não são comparáveis
+        if tuple(conteudo.get("faixas", ())) != FAIXAS:
+            return
+        for etapa, contagens in conteudo.get("etapas", {}).items():
+            if len(contagens) == len(FAIXAS) + 1:
+                self._histogramas[etapa] = [float(c) for c in contagens]
+
+
+politica_timeouts = PoliticaTimeouts()
+
+
+def _alvo_da_condicao(condicao):
+    """
+    Valor do localizador (By, valor) de uma condição do expected_conditions,
+    que o guarda na closure; None para lambdas e condições sem localizador.
+    """
+    for celula in getattr(condicao, "__closure__", None) or ():
+        try:
+            conteudo = celula.cell_contents
+        except ValueError:
+            continue
+        if (
+            isinstance(conteudo, tuple)
+            and len(conteudo) == 2
+            and all(isinstance(parte, str) for parte in conteudo)
+        ):
+            return re.sub(r"\s+", " ", conteudo[1]).strip()[:80]
+    return None
+
+
+class EsperaAdaptativa(WebDriverWait):
+    """
+    WebDriverWait cujo timeout segue o histograma das esperas bem-sucedidas.
+
+    Cada espera tem o seu histograma, nomeado pelo método que espera e pelo
+    localizador da condição (ou pela linha, em condições sem localizador):
+    esperas rápidas não encurtam as lentas. O timeout é recalculado a cada
+    `until` e nunca fica abaixo do padrão; o histograma só o estende para
+    esperas que costumam demorar mais. Esperas que estouram o timeout não
+    entram no histograma.
+
+    Parâmetros:
+        driver (selenium.webdriver): Driver observado.
+        prefixo (str): Prefixo dos histogramas ("SISTEMA.espera").
+        padrao (float): Timeout usado enquanto faltarem amostras, e o menor
+            aceito depois.
+    """
+
+    def __init__(self, driver, prefixo, padrao, politica=politica_timeouts):
+        self.prefixo = prefixo
+        self.padrao = padrao
+        self.politica = politica
+        super().__init__(driver, timeout=padrao)
+
+    def until(self, method, message=""):
+        chamador = sys._getframe(1)
+        alvo = _alvo_da_condicao(method) or f"linha{chamador.f_lineno}"
+        etapa = f"{self.prefixo}.{chamador.f_code.co_name}.{alvo}"
+        self._timeout = self.politica.timeout(etapa, self.padrao, minimo=self.padrao)
+
+        inicio = time.monotonic()
+        valor = super().until(method, message)
+        self.politica.registrar(etapa, time.monotonic() - inicio)
+        return valor
@@ -1,43 +1,64 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.common.exceptions import WebDriverException, SessionNotCreatedException
 
 from contextlib import contextmanager
 import os
+import threading
 import time
 import psutil
 
 from .logger import logger
+from .chromedriver import obter_servico
+from .clientes_http import clientes_http
+from .rede import log_performance
+from .config import (
+    DRIVER_POOL_TAMANHO,
+    DRIVER_MAX_USOS,
+    DRIVER_QUENTE_MAX_USOS,
+    TIMEOUT_COMANDO_PADRAO,
+)
+
+
+def _processos_do_navegador(driver):
+    """
+    Localiza os processos do Chrome desta sessão entre os filhos do
+    chromedriver compartilhado, pelo diretório de perfil temporário.
+    """
+    pasta_perfil = driver.capabilities.get("chrome", {}).get("userDataDir")
+    servico = psutil.Process(driver.service.process.pid)
+    if not pasta_perfil:
+        return []
+
+    processos = []
+    for filho in servico.children(recursive=False):
+        try:
+            if any(pasta_perfil in arg for arg in filho.cmdline()):
+                processos.append(filho)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return processos
 
 
 def _kill_selenium_driver(driver):
     """
-    Encerra apenas o Chrome iniciado pelo Selenium.
-    Não interfere em outros navegadores abertos.
+    Encerra apenas o Chrome iniciado pelo Selenium para esta sessão.
+    Não interfere em outros navegadores abertos nem no chromedriver
+    compartilhado pelas demais sessões.
     """
     if not driver:
         logger.info("Driver não existe, nada para encerrar.")
         return
 
     try:
-        # Tenta pegar PID do processo do Chrome
-        driver_pid = getattr(driver, "_chrome_pid", None)
-        if driver_pid is None:
-            driver_pid = driver.service.process.pid
-            driver._chrome_pid = driver_pid
-
-        parent = psutil.Process(driver_pid)
-
-        # Mata todos os processos filhos (renderers, etc)
-        for child in parent.children(recursive=True):
-            child.kill()
-            logger.info(f"Processo filho do Chrome encerrado: {child.pid}")
+        for parent in _processos_do_navegador(driver):
+            # Mata todos os processos filhos (renderers, etc)
+            for child in parent.children(recursive=True):
+                child.kill()
+                logger.info(f"Processo filho do Chrome encerrado: {child.pid}")
 
-        # Mata o processo principal do driver
-        parent.kill()
-        logger.info(f"Processo principal do Chrome encerrado: {parent.pid}")
+            # Mata o processo principal do navegador
+            parent.kill()
+            logger.info(f"Processo principal do Chrome encerrado: {parent.pid}")
 
         time.sleep(1)
 
@@ -67,6 +88,9 @@ def criar_driver(
     chrome_options.add_experimental_option("excludeSwitches", ["enable-logging"])
     chrome_options.add_argument("--window-size=1920,1080")
 
+    # Eventos de rede do DevTools, usados para detectar ociosidade da página
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
     # Flag experimental
     if add_config:
         chrome_options.add_argument(
@@ -77,63 +101,271 @@ def criar_driver(
         chrome_options.add_argument(f"user-data-dir={caminho_perfil}")
         chrome_options.add_argument(f"--profile-directory={nome_perfil}")
 
+    prefs = {
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+        "plugins.always_open_pdf_externally": True,
+    }
     if pasta_indice:
-        prefs = {
-            "download.default_directory": os.path.abspath(pasta_indice),
-            "download.prompt_for_download": False,
-            "download.directory_upgrade": True,
-            "plugins.always_open_pdf_externally": True,
-        }
-        chrome_options.add_experimental_option("prefs", prefs)
-
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-
-    driver = webdriver.Chrome(options=chrome_options)
+        prefs["download.default_directory"] = os.path.abspath(pasta_indice)
+    chrome_options.add_experimental_option("prefs", prefs)
+
+    # Serviço chromedriver único, resolvido uma vez por execução
+    driver = webdriver.Chrome(service=obter_servico(), options=chrome_options)
+    definir_timeout_comando(driver, TIMEOUT_COMANDO_PADRAO)
     return driver
 
 
-@contextmanager
-def driver_context(pasta_indice, perfil=None, nome_perfil="Default", add_config=None):
+def definir_pasta_download(driver, pasta_download):
     """
-    Cria, usa e finaliza webdriver.
+    Altera a pasta de download de um driver já aberto (via CDP).
+
+    Cada download é gravado com o identificador (guid) do evento de
+    download do DevTools; o rastreador de downloads dá o nome final ao
+    arquivo quando ele é concluído.
     """
-    driver = None
-    try:
-        driver = criar_driver(
-            pasta_indice,
-            caminho_perfil=perfil,
-            nome_perfil=nome_perfil,
-            add_config=add_config,
-        )
-        yield driver
-    except SessionNotCreatedException as e:
-        logger.error(f"Falha ao criar sessão do Chrome no driver_context: {e}")
-        logger.info("Encerrando driver Selenium de forma segura para retry.")
-        _kill_selenium_driver(driver)
-        raise
-    except WebDriverException as e:
-        logger.error(f"Erro WebDriver no driver_context: {e}")
-        logger.info("Encerrando driver Selenium de forma segura para retry.")
-        _kill_selenium_driver(driver)
-        raise
-    except Exception as e:
-        logger.error(f"Erro inesperado no driver_context: {e}")
-        logger.info("Encerrando driver Selenium de forma segura para retry.")
-        _kill_selenium_driver(driver)
-        raise
-    finally:
-        if driver:
-            try:
-                driver.quit()
-                logger.info(
-                    "Driver encerrado normalmente no finally do context manager."
-                )
-            except Exception as e:
-                logger.warning(f"driver.quit() falhou no finally: {e}")
-                _kill_selenium_driver(driver)
-        else:
-            logger.info(
-                "Driver não foi criado, mas executando encerramento seguro por precaução."
+    driver.execute_cdp_cmd(
+        "Browser.setDownloadBehavior",
+        {
+            "behavior": "allowAndName",
+            "downloadPath": os.path.abspath(pasta_download),
+            "eventsEnabled": True,
+        },
+    )
+
+
+def definir_timeout_comando(driver, segundos):
+    """
+    Define o timeout HTTP dos comandos enviados a este driver.
+
+    Ao contrário de `RemoteConnection.set_timeout`, que altera o estado
+    compartilhado da classe, afeta apenas a conexão do próprio driver.
+    """
+    driver.command_executor.client_config.timeout = segundos
+
+
+class _SessaoPool:
+    """
+    Driver mantido pelo pool e seus metadados de uso.
+
+    Em sessões quentes, `estado` guarda o que o sistema quer reencontrar no
+    próximo empréstimo (objeto de automação, etapas já configuradas).
+    """
+
+    def __init__(self, driver, chave, quente=False):
+        self.driver = driver
+        self.chave = chave
+        self.quente = quente
+        self.usos = 0
+        self.falhou = False
+        self.estado = {}
+        self.devolvida_em = None
+
+
+class PoolDrivers:
+    """
+    Pool de sessões Chrome reaproveitadas entre sistemas, ICs e protocolos.
+
+    Cada sessão é verificada antes do empréstimo, limpa na devolução
+    (cookies, storage e janelas extras) e reciclada após `max_usos`
+    empréstimos ou em caso de falha. O total de sessões abertas,
+    emprestadas ou livres, nunca passa de `tamanho_max`: para abrir uma
+    nova, a sessão livre há mais tempo é encerrada.
+
+    Sessões quentes (`emprestar_quente`) não são limpas: voltam ao pool
+    logadas e na mesma página, reservadas ao sistema e usuário da chave.
+
+    Parâmetros:
+        tamanho_max (int): Número máximo de sessões abertas (emprestadas e livres).
+        max_usos (int): Número de empréstimos antes de reciclar a sessão.
+        max_usos_quente (int): O mesmo, para sessões quentes.
+    """
+
+    def __init__(
+        self,
+        tamanho_max=DRIVER_POOL_TAMANHO,
+        max_usos=DRIVER_MAX_USOS,
+        max_usos_quente=DRIVER_QUENTE_MAX_USOS,
+    ):
+        self.tamanho_max = tamanho_max
+        self.max_usos = max_usos
+        self.max_usos_quente = max_usos_quente
+        self._livres = {}
+        self._abertas = 0
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(tamanho_max)
+
+    @contextmanager
+    def emprestar(self, pasta_download, add_config=None):
+        """
+        Empresta um driver pronto para uso, com downloads em `pasta_download`.
+        """
+        with self._emprestimo(bool(add_config), add_config, pasta_download) as sessao:
+            yield sessao.driver
+
+    @contextmanager
+    def emprestar_quente(self, chave, pasta_download, add_config=None):
+        """
+        Empresta uma sessão mantida aberta entre empréstimos de mesma chave,
+        sem limpar cookies nem a página. Uma exceção dentro do bloco
+        descarta a sessão; o próximo empréstimo começa do zero.
+
+        Parâmetros:
+            chave (tuple): Identifica a sessão, ex. ("SISCTM", usuario).
+            pasta_download (str): Pasta de downloads deste empréstimo.
+
+        Retorna:
+            _SessaoPool: Sessão com `driver` e `estado` (vazio se nova).
+        """
+        with self._emprestimo(chave, add_config, pasta_download) as sessao:
+            yield sessao
+
+    @contextmanager
+    def _emprestimo(self, chave, add_config, pasta_download):
+        self._vagas.acquire()
+        sessao = None
+        try:
+            sessao = self._obter(chave, add_config)
+            definir_pasta_download(sessao.driver, pasta_download)
+            yield sessao
+        except Exception as e:
+            logger.error(f"Erro na sessão emprestada do pool: {e}")
+            if sessao:
+                sessao.falhou = True
+            raise
+        finally:
+            if sessao:
+                self._devolver(sessao)
+            self._vagas.release()
+
+    def encerrar(self):
+        """Encerra todas as sessões livres do pool."""
+        with self._lock:
+            sessoes = [s for lista in self._livres.values() for s in lista]
+            self._livres.clear()
+
+        for sessao in sessoes:
+            self._descartar(sessao)
+        logger.info(f"Pool de drivers encerrado ({len(sessoes)} sessões).")
+
+    def _obter(self, chave, add_config):
+        """Retorna uma sessão livre saudável ou cria uma nova."""
+        while True:
+            antiga = None
+            with self._lock:
+                livres = self._livres.get(chave, [])
+                sessao = livres.pop() if livres else None
+                if sessao is None:
+                    if self._abertas >= self.tamanho_max:
+                        antiga = self._retirar_mais_antiga()
+                    self._abertas += 1
+
+            if sessao is None:
+                if antiga:
+                    logger.info("Pool cheio, encerrando a sessão livre mais antiga.")
+                    self._descartar(antiga)
+                try:
+                    driver = criar_driver(add_config=add_config)
+                except Exception:
+                    with self._lock:
+                        self._abertas -= 1
+                    raise
+                return _SessaoPool(driver, chave, quente=not isinstance(chave, bool))
+
+            if self._saudavel(sessao):
+                return sessao
+
+            logger.warning("Sessão do pool não respondeu, descartando.")
+            self._descartar(sessao)
+
+    def _devolver(self, sessao):
+        """Limpa a sessão e a devolve ao pool, ou a recicla."""
+        sessao.usos += 1
+
+        if sessao.falhou:
+            logger.info("Reciclando sessão do pool após falha.")
+            self._descartar(sessao)
+            return
+
+        max_usos = self.max_usos_quente if sessao.quente else self.max_usos
+        if sessao.usos >= max_usos:
+            logger.info(f"Reciclando sessão do pool após {sessao.usos} usos.")
+            self._descartar(sessao)
+            return
+
+        limpa = self._fechar_janelas(sessao) if sessao.quente else self._resetar(sessao)
+        if not limpa:
+            self._descartar(sessao)
+            return
+
+        sessao.devolvida_em = time.monotonic()
+        with self._lock:
+            self._livres.setdefault(sessao.chave, []).append(sessao)
+
+    def _retirar_mais_antiga(self):
+        """
+        Remove do pool a sessão livre há mais tempo, de qualquer chave.
+        Chamado com o lock adquirido.
+        """
+        candidatas = [s for lista in self._livres.values() for s in lista]
+        if not candidatas:
+            return None
+        antiga = min(candidatas, key=lambda s: s.devolvida_em)
+        self._livres[antiga.chave].remove(antiga)
+        return antiga
+
+    def _saudavel(self, sessao):
+        """Verifica se o navegador ainda responde a comandos."""
+        try:
+            return bool(sessao.driver.window_handles)
+        except Exception:
+            return False
+
+    def _fechar_janelas(self, sessao):
+        """Fecha janelas extras, mantendo a página principal e o login."""
+        driver = sessao.driver
+        try:
+            janelas = driver.window_handles
+            for janela in janelas[1:]:
+                driver.switch_to.window(janela)
+                driver.close()
+            driver.switch_to.window(janelas[0])
+            driver.switch_to.default_content()
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao fechar janelas da sessão: {e}")
+            return False
+
+    def _resetar(self, sessao):
+        """Fecha janelas extras e apaga cookies e storage da sessão."""
+        clientes_http.invalidar(sessao.driver)
+        if not self._fechar_janelas(sessao):
+            return False
+        driver = sessao.driver
+        try:
+            driver.execute_script(
+                "try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}"
             )
-            _kill_selenium_driver(driver)
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.get("about:blank")
+            definir_timeout_comando(driver, TIMEOUT_COMANDO_PADRAO)
+            # Descarta eventos acumulados pelo uso anterior
+            log_performance(driver).descartar()
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao limpar sessão do pool: {e}")
+            return False
+
+    def _descartar(self, sessao):
+        """Encerra o driver da sessão, matando o processo se necessário."""
+        with self._lock:
+            self._abertas -= 1
+        clientes_http.invalidar(sessao.driver)
+        try:
+            sessao.driver.quit()
+        except Exception as e:
+            logger.warning(f"driver.quit() falhou ao descartar sessão: {e}")
+            _kill_selenium_driver(sessao.driver)
+
+
+pool_drivers = PoolDrivers()
@@ -0,0 +1,65 @@
+"""
+Benchmark do tempo até o primeiro driver (e dos seguintes).
+
+Compara a criação antiga, com `ChromeDriverManager().install()` e um
+chromedriver novo por sessão, com o resolvedor em cache e o serviço
+chromedriver compartilhado.
+
+Uso:
+    python benchmarks/tempo_primeiro_driver.py [quantidade_de_drivers]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+from utils.web_driver import criar_driver
+from utils.chromedriver import encerrar_servico
+
+
+def _opcoes():
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--window-size=1920,1080")
+    return chrome_options
+
+
+def _criar_driver_antigo():
+    """Reproduz a criação anterior: resolução online e serviço por sessão."""
+    service = Service(ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=_opcoes())
+
+
+def _medir(nome, fabrica, quantidade):
+    tempos = []
+    for _ in range(quantidade):
+        inicio = time.perf_counter()
+        driver = fabrica()
+        tempos.append(time.perf_counter() - inicio)
+        driver.quit()
+
+    print(
+        f"{nome:<28} primeiro: {tempos[0]:6.2f}s  "
+        f"média dos seguintes: {sum(tempos[1:]) / max(len(tempos) - 1, 1):6.2f}s"
+    )
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    _medir("antes (install por driver)", _criar_driver_antigo, quantidade)
+    try:
+        _medir("depois (cache + serviço)", criar_driver, quantidade)
+    finally:
+        encerrar_servico()
+
+
+if __name__ == "__main__":
+    main()
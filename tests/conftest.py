@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Os pacotes da aplicação (utils, core, pipeline, gui) ficam em app/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+# Caches, blobs, manifestos e histogramas dos testes ficam fora da pasta
+# de dados real; precisa ser definido antes de importar utils.config
+os.environ["TRIAGEM_PASTA_DADOS"] = tempfile.mkdtemp(prefix="triagem-testes-")
+os.environ.pop("TRIAGEM_PASTA_BLOBS", None)
@@ -0,0 +1,65 @@
+import os
+
+from utils.blobs import ArmazemBlobs, hash_arquivo
+
+
+def _escrever(caminho, conteudo):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    return str(caminho)
+
+
+def test_conteudo_repetido_vira_um_unico_blob(tmp_path):
+    armazem = ArmazemBlobs(str(tmp_path / "blobs"))
+    a = _escrever(tmp_path / "P1" / "IC1" / "anexo.pdf", b"%PDF mesmo")
+    b = _escrever(tmp_path / "P2" / "IC1" / "copia.pdf", b"%PDF mesmo")
+
+    digest = armazem.guardar(a)
+    assert digest == hash_arquivo(b)
+    assert armazem.guardar(b) == digest
+
+    blob = armazem.caminho_blob(digest)
+    assert os.path.samefile(a, blob)
+    assert os.path.samefile(b, blob)
+    assert os.stat(blob).st_nlink == 3
+
+
+def test_vincular_restaura_e_informa_blob_ausente(tmp_path):
+    armazem = ArmazemBlobs(str(tmp_path / "blobs"))
+    digest = armazem.guardar(_escrever(tmp_path / "origem.pdf", b"conteudo"))
+
+    destino = str(tmp_path / "nova" / "pasta" / "restaurado.pdf")
+    assert armazem.vincular(digest, destino)
+    with open(destino, "rb") as f:
+        assert f.read() == b"conteudo"
+    assert not armazem.vincular("0" * 64, str(tmp_path / "x.pdf"))
+
+
+def test_deduplicar_pasta_ignora_prints_e_prefixos(tmp_path):
+    armazem = ArmazemBlobs(str(tmp_path / "blobs"))
+    pasta = tmp_path / "IC1"
+    doc = _escrever(pasta / "planta.pdf", b"pdf")
+    relatorio = _escrever(pasta / "1. Relatório.pdf", b"relatorio")
+    _escrever(pasta / "print.png", b"png")
+
+    armazem.deduplicar_pasta(str(pasta), ignorar=("1. ",))
+
+    assert os.stat(doc).st_nlink == 2
+    assert os.stat(relatorio).st_nlink == 1
+    assert os.listdir(armazem.pasta) == [hash_arquivo(doc)[:2]]
+
+
+def test_gc_remove_apenas_blobs_sem_links(tmp_path):
+    armazem = ArmazemBlobs(str(tmp_path / "blobs"))
+    usado = _escrever(tmp_path / "IC1" / "usado.pdf", b"usado")
+    orfao = _escrever(tmp_path / "IC1" / "orfao.pdf", b"orfao")
+    digest_usado, digest_orfao = armazem.guardar(usado), armazem.guardar(orfao)
+    os.remove(orfao)
+
+    assert armazem.gc(simular=True) == (1, len(b"orfao"))
+    assert os.path.exists(armazem.caminho_blob(digest_orfao))
+
+    assert armazem.gc() == (1, len(b"orfao"))
+    assert not os.path.exists(armazem.caminho_blob(digest_orfao))
+    assert os.path.exists(armazem.caminho_blob(digest_usado))
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import utils.cache_ic as cache_ic
+from utils.cache_ic import CacheIndices
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheIndices(pasta=str(tmp_path / "cache"), ttl_dias={"SIATU": 2})
+
+
+def _arquivo(pasta, nome, conteudo=b"pdf"):
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    return caminho
+
+
+def test_entrada_valida_restaura_saidas_e_arquivos(cache, tmp_path):
+    origem = str(tmp_path / "P1" / "IC1")
+    saidas = {"dados_pb": {"exercicio": "2024"}, "anexos_count": 1}
+    cache.salvar("SIATU", "IC1", saidas, [_arquivo(origem, "Planta.pdf")])
+
+    destino = str(tmp_path / "P2" / "IC1")
+    assert cache.obter("SIATU", "IC1", destino) == saidas
+    assert os.path.samefile(
+        os.path.join(origem, "Planta.pdf"), os.path.join(destino, "Planta.pdf")
+    )
+
+
+def test_entrada_vencida(cache, tmp_path, monkeypatch):
+    cache.salvar("SIATU", "IC1", {"dados_pb": {"a": 1}}, [])
+    agora = cache_ic.time.time()
+
+    monkeypatch.setattr(cache_ic.time, "time", lambda: agora + 1.9 * 86400)
+    assert cache.obter("SIATU", "IC1", str(tmp_path)) == {"dados_pb": {"a": 1}}
+
+    monkeypatch.setattr(cache_ic.time, "time", lambda: agora + 2.1 * 86400)
+    assert cache.obter("SIATU", "IC1", str(tmp_path)) is None
+
+
+def test_sistema_sem_ttl_nao_usa_cache(cache, tmp_path):
+    cache.salvar("URBANO", "IC1", {"dados_projeto": {"a": 1}}, [])
+    assert not os.path.exists(os.path.join(cache.pasta, "URBANO"))
+    assert cache.obter("URBANO", "IC1", str(tmp_path)) is None
+
+
+def test_blob_removido_invalida_a_entrada(cache, tmp_path):
+    caminho = _arquivo(str(tmp_path / "P1"), "Anexo.pdf", b"unico")
+    cache.salvar("SIATU", "IC1", {"dados_pb": {"a": 1}}, [caminho])
+
+    digest = cache_ic.armazem_blobs.guardar(caminho)
+    os.remove(cache_ic.armazem_blobs.caminho_blob(digest))
+
+    assert cache.obter("SIATU", "IC1", str(tmp_path / "P2")) is None
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+import requests
+
+from utils.clientes_http import ClienteHttp, ConteudoInesperado, SessaoExpirada
+
+
+class RespostaFalsa:
+    def __init__(
+        self,
+        status=200,
+        partes=(b"%PDF",),
+        falha=None,
+        url="https://x/a.pdf",
+        tipo="application/pdf",
+    ):
+        self.status_code = status
+        self.history = []
+        self.url = url
+        self.headers = {"Content-Type": tipo}
+        self.partes = partes
+        self.falha = falha
+        self.fechada = False
+
+    def iter_content(self, bloco):
+        yield from self.partes
+        if self.falha:
+            raise self.falha
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}", response=self)
+
+    def close(self):
+        self.fechada = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+@pytest.fixture
+def cliente():
+    cliente = ClienteHttp("SIATU")
+    yield cliente
+    cliente.fechar()
+
+
+def test_download_interrompido_nao_deixa_part(cliente, tmp_path):
+    resposta = RespostaFalsa(falha=requests.ConnectionError("conexão caiu"))
+    cliente.sessao.get = lambda url, **kwargs: resposta
+
+    with pytest.raises(requests.ConnectionError):
+        cliente.baixar("https://x/a.pdf", str(tmp_path))
+    assert os.listdir(tmp_path) == []
+    assert resposta.fechada
+
+
+def test_download_concluido(cliente, tmp_path):
+    cliente.sessao.get = lambda url, **kwargs: RespostaFalsa(partes=(b"%PDF", b"-1"))
+
+    caminho = cliente.baixar("https://x/a.pdf", str(tmp_path))
+    assert os.listdir(tmp_path) == ["a.pdf"]
+    with open(caminho, "rb") as f:
+        assert f.read() == b"%PDF-1"
+
+
+@pytest.mark.parametrize(
+    "status, erro", [(404, requests.HTTPError), (403, SessaoExpirada)]
+)
+def test_resposta_de_erro_e_fechada(cliente, status, erro):
+    resposta = RespostaFalsa(status=status)
+    cliente.sessao.get = lambda url, **kwargs: resposta
+
+    with pytest.raises(erro):
+        cliente.get("https://x/a.pdf", stream=True)
+    assert resposta.fechada
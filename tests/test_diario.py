@@ -0,0 +1,53 @@
+from utils.diario import CONCLUIDA, INCOMPLETA, DiarioExecucao
+
+
+def test_retomada_pelo_diario(tmp_path):
+    pasta = str(tmp_path)
+    assert not DiarioExecucao.existe(pasta)
+
+    diario = DiarioExecucao(pasta)
+    diario.iniciar_execucao(["P2", "P1", "P3"])
+    diario.iniciar_protocolo("P2")
+    diario.concluir_protocolo("P2", ["IC-1", "IC-2"])
+    diario.iniciar_protocolo("P1")
+    diario.falhar_protocolo("P1", RuntimeError("SIGEDE fora"))
+    diario.iniciar_protocolo("P3")
+    diario.concluir_protocolo("P3", [])
+    diario.fechar()
+
+    assert DiarioExecucao.existe(pasta)
+    retomado = DiarioExecucao(pasta)
+    try:
+        # Protocolos novos não mudam a ordem dos já registrados
+        retomado.iniciar_execucao(["P1", "P4"])
+        assert retomado.protocolos() == ["P2", "P1", "P3", "P4"]
+        assert retomado.indices_capturados("P2") == ["IC-1", "IC-2"]
+        assert retomado.indices_capturados("P1") is None
+        # Sem ICs, o protocolo fica incompleto e é repetido
+        assert retomado.indices_capturados("P3") is None
+        assert retomado.indices_capturados("P4") is None
+    finally:
+        retomado.fechar()
+
+
+def test_etapas_do_indice(tmp_path):
+    diario = DiarioExecucao(str(tmp_path))
+    try:
+        registro = diario.do_indice("P1", "IC1")
+        registro.iniciar("Siatu")
+        registro.concluir("Siatu", {"dados_pb": {"area": "10"}, "anexos_count": 2})
+        registro.iniciar("Sisctm")
+        registro.concluir("Sisctm", {"dados_sisctm": {}})
+        registro.iniciar("Urbano")
+        registro.falhar("Urbano", TimeoutError("lento"))
+        registro.iniciar("Relatorio")
+        registro.concluir("Relatorio", {})
+
+        assert diario.do_indice("P1", "IC1").concluidas() == {
+            "Siatu": {"dados_pb": {"area": "10"}, "anexos_count": 2},
+            "Relatorio": {},
+        }
+        assert diario.do_indice("P2", "IC1").concluidas() == {}
+        assert diario.resumo() == {CONCLUIDA: 2, INCOMPLETA: 1, "falhou": 1}
+    finally:
+        diario.fechar()
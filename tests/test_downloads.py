@@ -0,0 +1,138 @@
+import itertools
+import json
+import os
+
+import pytest
+
+from utils.downloads import rastreador_downloads
+from utils.rede import log_performance
+
+_sessoes = itertools.count()
+
+
+class NavegadorFalso:
+    """Emite eventos de download no log de performance e grava o arquivo pelo guid."""
+
+    def __init__(self, pasta):
+        self.session_id = f"sessao-{next(_sessoes)}"
+        self.pasta = pasta
+        self._log = []
+
+    def get_log(self, tipo):
+        entradas, self._log = self._log, []
+        return entradas
+
+    def _evento(self, metodo, **params):
+        mensagem = {"message": {"method": metodo, "params": params}}
+        self._log.append({"message": json.dumps(mensagem)})
+
+    def iniciar(self, guid, nome):
+        self._evento("Page.downloadWillBegin", guid=guid, suggestedFilename=nome)
+
+    def concluir(self, guid, conteudo=b"%PDF"):
+        with open(os.path.join(self.pasta, guid), "wb") as f:
+            f.write(conteudo)
+        self._evento("Page.downloadProgress", guid=guid, state="completed")
+        # O mesmo evento pelo domínio Browser não deve ser tratado duas vezes
+        self._evento("Browser.downloadProgress", guid=guid, state="completed")
+
+    def cancelar(self, guid):
+        self._evento("Page.downloadProgress", guid=guid, state="canceled")
+
+
+def test_downloads_simultaneos_na_mesma_pasta(tmp_path):
+    pasta = str(tmp_path)
+    siatu, urbano = NavegadorFalso(pasta), NavegadorFalso(pasta)
+    rastreador_siatu = rastreador_downloads(siatu, pasta)
+    rastreador_urbano = rastreador_downloads(urbano, pasta)
+
+    planta = rastreador_siatu.registrar()
+    certidao = rastreador_urbano.registrar()
+    siatu.iniciar("g1", "Planta.pdf")
+    urbano.iniciar("g2", "certidao.pdf")
+    urbano.concluir("g2", b"%PDF certidao")
+    siatu.concluir("g1", b"%PDF planta")
+
+    assert rastreador_urbano.aguardar(certidao, timeout=1) == os.path.join(
+        pasta, "certidao.pdf"
+    )
+    assert rastreador_siatu.aguardar(planta, timeout=1) == os.path.join(
+        pasta, "Planta.pdf"
+    )
+    assert sorted(os.listdir(pasta)) == ["Planta.pdf", "certidao.pdf"]
+
+
+def test_nome_esperado_e_nomes_repetidos(tmp_path):
+    pasta = str(tmp_path)
+    navegador = NavegadorFalso(pasta)
+    rastreador = rastreador_downloads(navegador, pasta)
+    (tmp_path / "anexo.pdf").write_bytes(b"de outro sistema")
+
+    primeiro = rastreador.registrar("outro.pdf")
+    segundo = rastreador.registrar("anexo.pdf")
+    navegador.iniciar("g1", "anexo.pdf")
+    navegador.iniciar("g2", "outro.pdf")
+    navegador.concluir("g1")
+    navegador.concluir("g2")
+
+    assert rastreador.aguardar(segundo, timeout=1) == os.path.join(
+        pasta, "anexo (1).pdf"
+    )
+    assert rastreador.aguardar(primeiro, timeout=1) == os.path.join(pasta, "outro.pdf")
+
+
+def test_download_anterior_ao_registro_nao_e_do_clique(tmp_path):
+    pasta = str(tmp_path)
+    navegador = NavegadorFalso(pasta)
+    rastreador = rastreador_downloads(navegador, pasta)
+
+    navegador.iniciar("antigo", "antigo.pdf")
+    futuro = rastreador.registrar()
+    navegador.concluir("antigo")
+    assert rastreador.aguardar(futuro, timeout=0.3) is None
+    # O arquivo sem clique também recebe o nome final
+    assert os.listdir(pasta) == ["antigo.pdf"]
+
+
+def test_cancelado_e_timeout(tmp_path):
+    pasta = str(tmp_path)
+    navegador = NavegadorFalso(pasta)
+    rastreador = rastreador_downloads(navegador, pasta)
+    rastreador.intervalo = 0.01
+
+    cancelado = rastreador.registrar()
+    navegador.iniciar("g1", "a.pdf")
+    navegador.cancelar("g1")
+    assert rastreador.aguardar(cancelado, timeout=1) is None
+
+    lento = rastreador.registrar()
+    navegador.iniciar("g2", "b.pdf")
+    assert rastreador.aguardar(lento, timeout=0.05) is None
+    assert lento.cancelled()
+
+    # Concluído depois do timeout: o próximo clique não fica com ele
+    seguinte = rastreador.registrar()
+    navegador.concluir("g2")
+    navegador.iniciar("g3", "c.pdf")
+    navegador.concluir("g3")
+    assert rastreador.aguardar(seguinte, timeout=1) == os.path.join(pasta, "c.pdf")
+    assert sorted(os.listdir(pasta)) == ["b.pdf", "c.pdf"]
+
+
+def test_log_compartilhado_entre_consumidores(tmp_path):
+    navegador = NavegadorFalso(str(tmp_path))
+    log = log_performance(navegador)
+    assert log_performance(navegador) is log
+
+    navegador.iniciar("g1", "a.pdf")
+    eventos, cursor = log.ler()
+    assert [e["params"]["guid"] for e in eventos] == ["g1"]
+
+    navegador.iniciar("g2", "b.pdf")
+    # Outro consumidor ainda vê tudo; este, só o que é novo
+    assert len(log.ler()[0]) == 2
+    novos, _ = log.ler(cursor)
+    assert [e["params"]["guid"] for e in novos] == ["g2"]
+
+    log.descartar()
+    assert log.ler() == ([], 2)
@@ -0,0 +1,112 @@
+import threading
+
+import pytest
+
+from pipeline.grafo import etapas_pendentes, executar_grafo
+from pipeline.interface import SistemaAutomacao
+
+
+class Soma(SistemaAutomacao):
+    entradas = ("x",)
+    saidas = ("a",)
+
+    def executar(self, x):
+        return x + 1
+
+
+class Dobro(SistemaAutomacao):
+    entradas = ("a",)
+    saidas = ("b",)
+
+    def executar(self, a):
+        return a * 2
+
+
+class Texto(SistemaAutomacao):
+    entradas = ("x",)
+    saidas = ("c", "d")
+
+    def executar(self, x):
+        return str(x), f"<{x}>"
+
+
+class Junta(SistemaAutomacao):
+    entradas = ("b", "c")
+    saidas = ("fim",)
+
+    def executar(self, b, c):
+        return f"{b}-{c}"
+
+
+class Falha(SistemaAutomacao):
+    entradas = ("x",)
+    saidas = ("a",)
+
+    def executar(self, x):
+        raise RuntimeError("sistema fora do ar")
+
+
+class DiarioFalso:
+    def __init__(self):
+        self.eventos = []
+        self._lock = threading.Lock()
+
+    def iniciar(self, etapa):
+        with self._lock:
+            self.eventos.append(("iniciar", etapa))
+
+    def concluir(self, etapa, saidas):
+        with self._lock:
+            self.eventos.append(("concluir", etapa))
+
+    def falhar(self, etapa, erro):
+        with self._lock:
+            self.eventos.append(("falhar", etapa))
+
+
+def test_executa_na_ordem_das_dependencias():
+    contexto = executar_grafo([Junta(), Dobro(), Texto(), Soma()], {"x": 1})
+    assert contexto["a"] == 2
+    assert contexto["b"] == 4
+    assert (contexto["c"], contexto["d"]) == ("1", "<1>")
+    assert contexto["fim"] == "4-1"
+
+
+def test_entrada_sem_produtor():
+    with pytest.raises(ValueError, match="'b'"):
+        executar_grafo([Junta(), Texto()], {"x": 1})
+
+
+def test_falha_interrompe_dependentes_e_e_repassada():
+    diario = DiarioFalso()
+    with pytest.raises(RuntimeError, match="fora do ar"):
+        executar_grafo([Falha(), Dobro()], {"x": 1}, diario=diario)
+    assert ("falhar", "Falha") in diario.eventos
+    assert ("iniciar", "Dobro") not in diario.eventos
+
+
+def test_diario_registra_cada_etapa():
+    diario = DiarioFalso()
+    executar_grafo([Soma(), Dobro()], {"x": 1}, diario=diario)
+    assert diario.eventos == [
+        ("iniciar", "Soma"),
+        ("concluir", "Soma"),
+        ("iniciar", "Dobro"),
+        ("concluir", "Dobro"),
+    ]
+
+
+def test_retomada_repete_etapa_pendente_e_as_que_dependem_dela():
+    etapas = [Soma(), Dobro(), Texto(), Junta()]
+    concluidas = {
+        "Soma": {"a": 2},
+        "Texto": {"c": "1", "d": "<1>"},
+        "Junta": {"fim": "antigo"},
+    }
+    pendentes, reaproveitadas = etapas_pendentes(etapas, {"x": 1}, concluidas)
+
+    assert [type(e).__name__ for e in pendentes] == ["Dobro", "Junta"]
+    assert reaproveitadas == {"a": 2, "c": "1", "d": "<1>"}
+
+    contexto = executar_grafo(pendentes, {"x": 1, **reaproveitadas})
+    assert contexto["fim"] == "4-1"
@@ -0,0 +1,58 @@
+import os
+
+from utils.manifestos import ManifestoAnexos
+
+
+def _anexo(pasta, nome, conteudo):
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, nome)
+    with open(caminho, "wb") as f:
+        f.write(conteudo)
+    return caminho
+
+
+def test_anexo_inalterado_restaurado_na_proxima_execucao(tmp_path):
+    manifestos = str(tmp_path / "manifestos")
+    assinatura = ManifestoAnexos.assinatura("linha 1 | 01/01/2024", "exibe(1)")
+
+    manifesto = ManifestoAnexos("SIATU", "IC1", pasta=manifestos)
+    manifesto.registrar(
+        assinatura, _anexo(str(tmp_path / "exec1"), "Escritura.pdf", b"pdf")
+    )
+    manifesto.salvar(completo=True)
+
+    seguinte = ManifestoAnexos("SIATU", "IC1", pasta=manifestos)
+    restaurado = seguinte.restaurar(assinatura, str(tmp_path / "exec2"))
+    assert restaurado == os.path.join(str(tmp_path / "exec2"), "Escritura.pdf")
+    with open(restaurado, "rb") as f:
+        assert f.read() == b"pdf"
+
+    outra = ManifestoAnexos.assinatura("linha 1 | 02/01/2024", "exibe(1)")
+    assert seguinte.restaurar(outra, str(tmp_path / "exec2")) is None
+
+
+def test_tabela_completa_remove_anexos_que_sumiram(tmp_path):
+    manifestos = str(tmp_path / "manifestos")
+    pasta = str(tmp_path / "exec1")
+    manifesto = ManifestoAnexos("SIATU", "IC2", pasta=manifestos)
+    manifesto.registrar("fica", _anexo(pasta, "a.pdf", b"a"))
+    manifesto.registrar("sai", _anexo(pasta, "b.pdf", b"b"))
+    manifesto.salvar()
+
+    parcial = ManifestoAnexos("SIATU", "IC2", pasta=manifestos)
+    parcial.restaurar("fica", str(tmp_path / "exec2"))
+    # Tabela percorrida só em parte: nada é esquecido
+    parcial.salvar(completo=False)
+    assert len(ManifestoAnexos("SIATU", "IC2", pasta=manifestos).hashes()) == 2
+
+    parcial.salvar(completo=True)
+    assert len(ManifestoAnexos("SIATU", "IC2", pasta=manifestos).hashes()) == 1
+
+
+def test_manifesto_corrompido_e_ignorado(tmp_path):
+    caminho = tmp_path / "manifestos" / "SIATU" / "IC3.json"
+    caminho.parent.mkdir(parents=True)
+    caminho.write_text("{corrompido", encoding="utf-8")
+
+    manifesto = ManifestoAnexos("SIATU", "IC3", pasta=str(tmp_path / "manifestos"))
+    assert manifesto.restaurar("qualquer", str(tmp_path)) is None
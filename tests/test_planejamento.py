@@ -0,0 +1,46 @@
+import pipeline.planejamento as planejamento
+from pipeline.planejamento import PlanoLote
+
+
+def test_ic_repetido_coletado_uma_vez_e_primeiro():
+    plano = PlanoLote(
+        {
+            "P1": ["009009009-9", "001002003-4"],
+            "P2": ["0010020034"],
+            "P3": [],
+        }
+    )
+    assert plano.itens() == [
+        ("P1", "0010020034"),
+        ("P1", "0090090099"),
+        ("P2", "0010020034"),
+    ]
+    assert plano.total == 4
+
+
+def test_plano_salvo_sem_protocolos_pendentes(tmp_path):
+    pasta = str(tmp_path)
+    plano = PlanoLote({"P1": ["IC1"], "P2": [], "P3": ["IC1", "IC2"]}, pendentes={"P2"})
+    plano.salvar(pasta)
+
+    # Mesmos protocolos, em outra ordem e com outra pontuação
+    assert PlanoLote.carregar(["P-3", "P2", "P.1"], pasta) == {
+        "P.1": ["IC1"],
+        "P-3": ["IC1", "IC2"],
+    }
+    assert PlanoLote.carregar(["P1", "P2"], pasta) == {}
+
+
+def test_plano_vencido(tmp_path, monkeypatch):
+    PlanoLote({"P1": ["IC1"]}).salvar(str(tmp_path))
+    agora = planejamento.time.time()
+    monkeypatch.setattr(planejamento.time, "time", lambda: agora + 3 * 86400)
+    assert PlanoLote.carregar(["P1"], str(tmp_path), ttl_dias=7) == {"P1": ["IC1"]}
+    assert PlanoLote.carregar(["P1"], str(tmp_path), ttl_dias=2) == {}
+
+
+def test_plano_corrompido(tmp_path):
+    PlanoLote({"P1": ["IC1"]}).salvar(str(tmp_path))
+    (arquivo,) = tmp_path.iterdir()
+    arquivo.write_text("[1, 2]", encoding="utf-8")
+    assert PlanoLote.carregar(["P1"], str(tmp_path)) == {}
@@ -0,0 +1,69 @@
+import pytest
+
+from core.relatorios import classificar_anexo
+from core.siatu import _nome_livre, _nome_planta_basica, _url_do_link
+from utils import normalizar_nome
+
+BASE = "https://siatu-producao.pbh.gov.br/action/consultaPlantaBasica"
+
+
+@pytest.mark.parametrize(
+    "rotulo", ["Exercício Seguinte", "Recalculado", "Primeiro do Ano"]
+)
+def test_pb_http_classificada_como_o_download_pelo_clique(rotulo):
+    nome_http = _nome_planta_basica(rotulo)
+    assert nome_http.isascii()
+    assert normalizar_nome(nome_http) == nome_http
+    assert classificar_anexo(normalizar_nome(nome_http)) == "planta"
+    assert classificar_anexo(normalizar_nome("Planta_Basica_Resumida.pdf")) == (
+        "planta"
+    )
+
+
+def test_href_real():
+    assert _url_do_link("../doc.pdf", None, BASE) == (
+        "https://siatu-producao.pbh.gov.br/doc.pdf"
+    )
+
+
+def test_window_open_literal_no_onclick():
+    onclick = "window.open('/action/exibe.do?id=5', '_blank', 'w=1'); return false;"
+    assert _url_do_link("#", onclick, BASE) == (
+        "https://siatu-producao.pbh.gov.br/action/exibe.do?id=5"
+    )
+
+
+def test_funcao_da_pagina_com_argumentos_literais():
+    fonte = (
+        "function exibeDocumento(id, tipo) {"
+        " janela = window.open('exibeDocumento.do?id=' + id + '&tipo=' + tipo,"
+        " 'doc'); janela.focus(); }"
+    )
+    url = _url_do_link(
+        "javascript:void(0)",
+        "exibeDocumento('123', \"PDF\");",
+        BASE,
+        lambda nome: fonte if nome == "exibeDocumento" else None,
+    )
+    assert url == (
+        "https://siatu-producao.pbh.gov.br/action/exibeDocumento.do?id=123&tipo=PDF"
+    )
+
+
+@pytest.mark.parametrize(
+    "onclick",
+    [
+        "document.forms[0].submit()",
+        "exibeDocumento(this.id)",
+        "window.open(montarUrl())",
+    ],
+)
+def test_url_nao_determinavel_fica_para_o_clique(onclick):
+    fonte = "function exibeDocumento(id) { window.open(base + id); }"
+    assert _url_do_link("#", onclick, BASE, lambda nome: fonte) is None
+
+
+def test_nome_livre_desambigua_sem_diferenciar_caixa():
+    usados = {"anexo.pdf"}
+    assert _nome_livre("Anexo.pdf", usados) == "Anexo (1).pdf"
+    assert _nome_livre("anexo.pdf", usados) == "anexo (2).pdf"
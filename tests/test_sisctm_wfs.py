@@ -0,0 +1,194 @@
+import pytest
+
+from core.sisctm_wfs import (
+    ServicoFeicoesSisctm,
+    _contem,
+    _endereco_ows,
+    _mesmo_valor,
+    _ponto_interno,
+)
+
+EM_L = {
+    "type": "Polygon",
+    "coordinates": [[[0, 0], [10, 0], [10, 2], [2, 2], [2, 10], [0, 10], [0, 0]]],
+}
+
+COM_FURO = {
+    "type": "Polygon",
+    "coordinates": [
+        [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+        [[3, 3], [7, 3], [7, 7], [3, 7], [3, 3]],
+    ],
+}
+
+
+def _lote(x, y, lado=10):
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [[x, y], [x + lado, y], [x + lado, y + lado], [x, y + lado], [x, y]]
+        ],
+    }
+
+
+class ClienteWfs:
+    """Responde GetFeature com as feições da camada que casam com o filtro."""
+
+    def __init__(self, feicoes, ao_consultar=None):
+        self.feicoes = feicoes
+        self.ao_consultar = ao_consultar
+        self.consultas = []
+
+    def get_json(self, url, params=None, headers=None):
+        if params["request"] == "DescribeFeatureType":
+            return {
+                "featureTypes": [
+                    {"properties": [{"name": "GEOM", "type": "gml:MultiPolygon"}]}
+                ]
+            }
+        self.consultas.append(params)
+        if self.ao_consultar:
+            self.ao_consultar()
+        camada = self.feicoes.get(params["typeName"], [])
+        if params["typeName"] == "ctm:lote_cp":
+            return {"features": camada}
+        filtro = params["CQL_FILTER"]
+        return {
+            "features": [
+                f for f in camada if f["properties"]["_INDICE_CADASTRAL"] in filtro
+            ]
+        }
+
+
+def _iptu(indice, x, area):
+    return {
+        "properties": {"_INDICE_CADASTRAL": indice, "AREA": area, "CEP": "30000000"},
+        "geometry": _lote(x + 1, 1, lado=8),
+    }
+
+
+@pytest.fixture
+def servico(tmp_path):
+    servico = ServicoFeicoesSisctm(arquivo=str(tmp_path / "wfs.json"), tamanho_lote=3)
+    servico.endereco = "https://sisctm.pbh.gov.br/geoserver/ows"
+    servico.camada_iptu = "ctm:iptu"
+    servico.camada_lote_cp = "ctm:lote_cp"
+    servico.filtro = "_INDICE_CADASTRAL='{indice}'"
+    return servico
+
+
+@pytest.mark.parametrize("geometria", [EM_L, COM_FURO])
+def test_ponto_interno_em_lote_concavo_e_com_furo(geometria):
+    ponto = _ponto_interno(geometria)
+    assert _contem(geometria, ponto)
+
+
+def test_ponto_interno_usa_o_maior_poligono():
+    geometria = {
+        "type": "MultiPolygon",
+        "coordinates": [_lote(100, 100, 1)["coordinates"], EM_L["coordinates"]],
+    }
+    x, y = _ponto_interno(geometria)
+    assert x < 10 and y < 10
+    assert _ponto_interno({"type": "Point", "coordinates": [1, 2, 3]}) == (1, 2)
+    assert _ponto_interno(None) is None
+
+
+def test_endereco_ows():
+    url = "https://sisctm.pbh.gov.br/geoserver/ctm/wms?SERVICE=WMS&LAYERS=ctm:iptu"
+    assert _endereco_ows(url) == "https://sisctm.pbh.gov.br/geoserver/ctm/ows"
+    assert _endereco_ows("https://sisctm.pbh.gov.br/geoserver/gwc/service/wms") is None
+
+
+def test_mesmo_valor_compara_numeros_por_valor():
+    assert _mesmo_valor("360.5", "360,50")
+    assert not _mesmo_valor("", "")
+    assert not _mesmo_valor(None, "1")
+
+
+def test_aprender_requisicoes(tmp_path):
+    servico = ServicoFeicoesSisctm(arquivo=str(tmp_path / "wfs.json"))
+    url = (
+        "https://sisctm.pbh.gov.br/geoserver/ctm/wms?SERVICE=WMS&REQUEST=GetMap"
+        "&LAYERS=ctm:iptu,ctm:lotecp_ativo"
+        "&CQL_FILTER=_INDICE_CADASTRAL='0010010010';INCLUDE"
+    )
+    servico.aprender_requisicoes([(url, {})], "0010010010")
+
+    salvo = ServicoFeicoesSisctm(arquivo=str(tmp_path / "wfs.json"))
+    assert salvo.pronto
+    assert salvo.endereco == "https://sisctm.pbh.gov.br/geoserver/ctm/ows"
+    assert salvo.camada_iptu == "ctm:iptu"
+    assert salvo.camada_lote_cp == "ctm:lotecp_ativo"
+    assert salvo.filtro == "_INDICE_CADASTRAL='{indice}'"
+
+
+def test_atributo_gravado_so_quando_confirmado_em_outro_ic(servico):
+    feicoes = {"iptu": {"AREA_EDIF": "120,5", "NUM": "100", "TESTADA": "100"}}
+    valores = {"iptu_ctm_geo_area": "120.50", "numero_imovel": "100"}
+
+    servico.aprender_atributos("IC1", feicoes, valores)
+    servico.aprender_atributos("IC1", feicoes, valores)
+    assert servico.atributos == {}
+
+    servico.aprender_atributos("IC2", feicoes, valores)
+    # "100" é ambíguo (número ou testada) e nunca é associado
+    assert servico.atributos == {"iptu_ctm_geo_area": "AREA_EDIF"}
+    assert _recarregado(servico).atributos == {"iptu_ctm_geo_area": "AREA_EDIF"}
+
+
+def _recarregado(servico):
+    return ServicoFeicoesSisctm(arquivo=servico.arquivo)
+
+
+def test_lote_de_ics_em_uma_consulta(servico):
+    cliente = ClienteWfs(
+        {
+            "ctm:iptu": [_iptu("001001001", 0, "100"), _iptu("002002002", 20, "200")],
+            "ctm:lote_cp": [
+                {"properties": {"AREA_INFORMADA": "360"}, "geometry": _lote(0, 0)},
+                {"properties": {"AREA_INFORMADA": "720"}, "geometry": _lote(20, 0)},
+            ],
+        }
+    )
+    servico.agendar(["001001001", "002002002", "003003003"])
+
+    dados, feicoes = servico.consultar(cliente, "001001001")
+    assert dados["iptu_ctm_geo_area"] == "100"
+    assert dados["lote_cp_ativo_area_informada"] == "360"
+    assert feicoes["lote_cp"] == {"AREA_INFORMADA": "360"}
+
+    dados, _ = servico.consultar(cliente, "002002002")
+    assert dados["lote_cp_ativo_area_informada"] == "720"
+    assert servico.consultar(cliente, "003003003") is None
+    # Uma consulta IPTU para os três ICs e uma Lote CP
+    assert [c["typeName"] for c in cliente.consultas] == ["ctm:iptu", "ctm:lote_cp"]
+
+
+def test_descartar_cancela_lote_em_consulta(servico):
+    cliente = ClienteWfs(
+        {"ctm:iptu": [_iptu("001001001", 0, "100"), _iptu("002002002", 20, "200")]}
+    )
+    servico.camada_lote_cp = None
+    servico.agendar(["002002002"])
+    # O lote é descartado enquanto a requisição está em andamento
+    cliente.ao_consultar = servico.descartar_agendados
+
+    assert servico.consultar(cliente, "001001001")[0]["iptu_ctm_geo_area"] == "100"
+    cliente.ao_consultar = None
+    assert servico.consultar(cliente, "002002002")[0]["iptu_ctm_geo_area"] == "200"
+    assert len(cliente.consultas) == 2
+
+
+def test_falha_do_lote_repassada_a_quem_espera(servico):
+    class ClienteFora:
+        def get_json(self, *args, **kwargs):
+            raise ConnectionError("GeoServer fora")
+
+    servico.agendar(["002002002"])
+    with pytest.raises(ConnectionError):
+        servico.consultar(ClienteFora(), "001001001")
+
+    cliente = ClienteWfs({"ctm:iptu": [_iptu("002002002", 0, "200")]})
+    servico.camada_lote_cp = None
+    assert servico.consultar(cliente, "002002002")[0]["iptu_ctm_geo_area"] == "200"
@@ -0,0 +1,88 @@
+import pytest
+
+from selenium.webdriver.support import expected_conditions as EC
+
+from utils.timeouts import (
+    FAIXAS,
+    FOLGA,
+    MARGEM,
+    EsperaAdaptativa,
+    PoliticaTimeouts,
+    _faixa_do_percentil,
+)
+
+
+@pytest.fixture
+def politica():
+    politica = PoliticaTimeouts(percentil=90, min_amostras=10)
+    politica._histogramas.clear()
+    return politica
+
+
+def test_padrao_enquanto_faltam_amostras(politica):
+    for _ in range(9):
+        politica.registrar("SIATU.login", 1.5)
+    assert politica.timeout("SIATU.login", padrao=30) == 30
+    assert politica.estimativa("SIATU.login") is None
+
+
+def test_timeout_pelo_percentil_com_margem(politica):
+    for _ in range(95):
+        politica.registrar("SIATU.login", 1.5)
+    for _ in range(5):
+        politica.registrar("SIATU.login", 20)
+
+    # 1,5 s cai na faixa de 2 s, que contém o percentil 90
+    assert politica.timeout("SIATU.login", padrao=30) == 2 * MARGEM + FOLGA
+    assert politica.estimativa("SIATU.login") == 2
+
+
+def test_timeout_limitado(politica):
+    for _ in range(20):
+        politica.registrar("URBANO.projeto", 0.1)
+        politica.registrar("SISCTM.mapa", 500)
+    assert politica.timeout("URBANO.projeto", padrao=30, minimo=5) == 5
+    assert politica.timeout("SISCTM.mapa", padrao=30) == 120
+
+
+def test_ultima_faixa_aberta():
+    contagens = [0] * len(FAIXAS) + [3]
+    assert _faixa_do_percentil(contagens, 95) == FAIXAS[-1] * 2
+
+
+def test_histograma_acompanha_mudancas(politica):
+    for _ in range(600):
+        politica.registrar("SIGEDE.pesquisa", 1)
+    assert sum(politica._histogramas["SIGEDE.pesquisa"]) <= 500
+
+
+class DriverFalso:
+    def find_element(self, by, valor):
+        return valor
+
+
+def test_espera_tem_histograma_proprio_e_nunca_abaixo_do_padrao(politica):
+    espera = EsperaAdaptativa(
+        DriverFalso(), "SIATU.espera", padrao=5, politica=politica
+    )
+
+    def login():
+        return espera.until(EC.presence_of_element_located(("id", "senha")))
+
+    for _ in range(30):
+        assert login() == "senha"
+    etapa = "SIATU.espera.login.senha"
+    assert sum(politica._histogramas[etapa]) == 30
+    # Esperas rápidas não derrubam o timeout abaixo do padrão
+    assert politica.timeout(etapa, 5, minimo=5) == 5
+
+    # O timeout é recalculado a cada espera, pelo histograma dela
+    def tabela():
+        return espera.until(EC.presence_of_element_located(("id", "tabela")))
+
+    for _ in range(30):
+        politica.registrar("SIATU.espera.tabela.tabela", 9)
+    tabela()
+    assert espera._timeout == 20
+    login()
+    assert espera._timeout == 5
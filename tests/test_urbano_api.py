@@ -0,0 +1,197 @@
+import json
+import os
+
+import pytest
+
+from core.urbano_api import (
+    FONTE_API,
+    NAO_INFORMADO,
+    EndpointsUrbano,
+    UrbanoApi,
+    _link,
+    _lista_projetos,
+    _modelo,
+    _modelo_projeto,
+    _partes_indice,
+)
+
+PESQUISA = "https://urbano.pbh.gov.br/api/projetos?zona={zona}&quarteirao={quarteirao}&lote={lote}"
+PROJETO = "https://urbano.pbh.gov.br/api/projetos/{id}"
+
+
+class ClienteUrbano:
+    def __init__(self, respostas):
+        self.respostas = respostas
+        self.baixados = []
+
+    def get_json(self, url):
+        resposta = self.respostas[url]
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    def baixar(self, url, pasta, nome=None, documento=False):
+        assert documento
+        self.baixados.append((url, nome))
+        return os.path.join(pasta, nome or os.path.basename(url))
+
+
+@pytest.fixture
+def endpoints(tmp_path):
+    endpoints = EndpointsUrbano(arquivo=str(tmp_path / "urbano.json"))
+    endpoints.pesquisa, endpoints.projeto = PESQUISA, PROJETO
+    return endpoints
+
+
+def _url_pesquisa(indice):
+    return PESQUISA.format(**dict(_partes_indice(indice)))
+
+
+@pytest.mark.parametrize(
+    "resposta, esperado",
+    [
+        ([{"id": 1}], [{"id": 1}]),
+        ({"content": [{"id": 1}], "total": 1}, [{"id": 1}]),
+        ([], []),
+        ({"content": []}, []),
+        ({"erro": "Sessão expirada"}, None),
+        (["texto"], None),
+        ("<html>login</html>", None),
+        (None, None),
+    ],
+)
+def test_lista_projetos(resposta, esperado):
+    assert _lista_projetos(resposta) == esperado
+
+
+def test_modelos_de_endpoint():
+    partes = _partes_indice("00100200030")
+    assert _modelo(
+        "https://urbano.pbh.gov.br/api/p?zona=001&quarteirao=0020&lote=0030", partes
+    ) == (
+        "https://urbano.pbh.gov.br/api/p?zona={zona}&quarteirao={quarteirao}&lote={lote}"
+    )
+    assert (
+        _modelo("https://urbano.pbh.gov.br/api/indice/00100200030", partes)
+        == "https://urbano.pbh.gov.br/api/indice/{zona}{quarteirao}{lote}"
+    )
+    assert _modelo("https://urbano.pbh.gov.br/api/usuario", partes) is None
+    assert (
+        _modelo_projeto("https://urbano.pbh.gov.br/api/7/projeto/7", 7)
+        == "https://urbano.pbh.gov.br/api/7/projeto/{id}"
+    )
+
+
+def test_resposta_desconhecida_volta_para_a_interface(endpoints, tmp_path):
+    indice = "00100200030"
+    cliente = ClienteUrbano({_url_pesquisa(indice): {"mensagem": "Não autorizado"}})
+    api = UrbanoApi(cliente, str(tmp_path), endpoints=endpoints)
+    assert api.consultar(indice) is None
+    # A API mudou: os endpoints são aprendidos de novo pela interface
+    assert not endpoints.completo
+    assert not EndpointsUrbano(arquivo=endpoints.arquivo).completo
+
+
+def test_resposta_que_nao_e_json_descarta_endpoints(endpoints, tmp_path):
+    indice = "00100200030"
+    cliente = ClienteUrbano({_url_pesquisa(indice): ValueError("<html>")})
+    assert (
+        UrbanoApi(cliente, str(tmp_path), endpoints=endpoints).consultar(indice) is None
+    )
+    assert endpoints.pesquisa is None
+
+
+@pytest.mark.parametrize(
+    "valor, esperado",
+    [
+        ("/docs/certidao.pdf", "https://urbano.pbh.gov.br/docs/certidao.pdf"),
+        ("https://outro/a.pdf", "https://outro/a.pdf"),
+        ({"url": "/docs/p1.pdf"}, "https://urbano.pbh.gov.br/docs/p1.pdf"),
+        ("123.456", None),
+        ("alvara.pdf", None),
+        ("", None),
+        (12, None),
+    ],
+)
+def test_link_so_aceita_urls(valor, esperado):
+    assert _link(valor, "https://urbano.pbh.gov.br/api/projetos/7") == esperado
+
+
+def test_sem_projetos(endpoints, tmp_path):
+    indice = "00100200030"
+    cliente = ClienteUrbano({_url_pesquisa(indice): {"content": []}})
+    quantidade, dados, arquivos = UrbanoApi(
+        cliente, str(tmp_path), endpoints=endpoints
+    ).consultar(indice)
+    assert (quantidade, arquivos) == (0, [])
+    assert dados["tipo"] == NAO_INFORMADO
+    assert dados["fonte"] == FONTE_API
+
+
+def test_certidao_do_primeiro_projeto(endpoints, tmp_path):
+    indice = "00100200030"
+    cliente = ClienteUrbano(
+        {
+            _url_pesquisa(indice): [{"idProjeto": 7}, {"idProjeto": 8}],
+            PROJETO.format(id=7): {
+                "situacao": "Aprovado",
+                "dados": {"areaConstruida": "250,00", "areaLote": 360},
+                "certidaoDeBaixa": "/docs/certidao-7.pdf",
+            },
+            PROJETO.format(id=8): {"situacao": "Em análise"},
+        }
+    )
+    quantidade, dados, arquivos = UrbanoApi(
+        cliente, str(tmp_path), endpoints=endpoints
+    ).consultar(indice)
+
+    assert quantidade == 2
+    assert dados["tipo"] == "Certidão de Baixa"
+    assert (dados["area_lotes"], dados["area_construida"]) == ("360", "250,00")
+    assert [p["status"] for p in dados["projetos"]] == ["Aprovado", "Em análise"]
+    assert cliente.baixados == [("https://urbano.pbh.gov.br/docs/certidao-7.pdf", None)]
+    assert arquivos == [os.path.join(str(tmp_path), "certidao-7.pdf")]
+
+
+def test_projeto_sem_documento_volta_para_a_interface(endpoints, tmp_path):
+    indice = "00100200030"
+    cliente = ClienteUrbano(
+        {_url_pesquisa(indice): [{"id": 7}], PROJETO.format(id=7): {"status": "x"}}
+    )
+    assert (
+        UrbanoApi(cliente, str(tmp_path), endpoints=endpoints).consultar(indice) is None
+    )
+
+
+def test_endpoints_aprendidos_no_log_de_performance(tmp_path):
+    indice = "00100200030"
+
+    def resposta(url, request_id):
+        mensagem = {
+            "method": "Network.responseReceived",
+            "params": {
+                "requestId": request_id,
+                "response": {"url": url, "mimeType": "application/json"},
+            },
+        }
+        return {"message": json.dumps({"message": mensagem})}
+
+    class DriverFalso:
+        session_id = "urbano-aprender"
+
+        def get_log(self, tipo):
+            return [
+                resposta("https://urbano.pbh.gov.br/api/usuario", "1"),
+                resposta(_url_pesquisa(indice), "2"),
+                resposta(PROJETO.format(id=41), "3"),
+            ]
+
+        def execute_cdp_cmd(self, comando, parametros):
+            assert parametros == {"requestId": "2"}
+            return {"body": json.dumps({"content": [{"id": 41}]})}
+
+    EndpointsUrbano(arquivo=str(tmp_path / "urbano.json")).aprender(
+        DriverFalso(), indice
+    )
+    salvos = EndpointsUrbano(arquivo=str(tmp_path / "urbano.json"))
+    assert (salvos.pesquisa, salvos.projeto) == (PESQUISA, PROJETO)